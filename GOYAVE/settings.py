@@ -25,6 +25,17 @@ ALLOWED_HOSTS = []
 # seuil global pour alerte stock bas
 LOW_STOCK_THRESHOLD = env.int('LOW_STOCK_THRESHOLD', default=5)
 
+# export ZIP des factures depuis l'interface : au-delà, commande export_factures
+EXPORT_FACTURES_MAX = env.int('EXPORT_FACTURES_MAX', default=500)
+
+# cache des fiches produit (caisse) : LRU local par processus, ou cache
+# partagé entre workers si PRODUITS_CACHE_URL est défini (ex. redis://...)
+PRODUITS_CACHE_TAILLE = env.int('PRODUITS_CACHE_TAILLE', default=1000)
+CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+if env('PRODUITS_CACHE_URL', default=None):
+    CACHES['produits'] = env.cache('PRODUITS_CACHE_URL')
+    PRODUITS_CACHE_ALIAS = 'produits'
+
 
 # Application definition
 
@@ -45,6 +56,7 @@ INSTALLED_APPS = [
     'stocks',
     "fournisseurs",
     "alerts",
+    'documents',
 ]
 
 
@@ -88,6 +100,8 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # base de test sur fichier : nécessaire aux tests de concurrence (threads)
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
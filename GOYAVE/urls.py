@@ -12,5 +12,6 @@ urlpatterns = [
     path('stocks/', include('stocks.urls')),
     path('fournisseurs/', include('fournisseurs.urls')),
     path('alerts/', include('alerts.urls')),
+    path('documents/', include('documents.urls')),
 
 ] + (static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT) if settings.DEBUG else []) 
\ No newline at end of file
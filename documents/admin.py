@@ -0,0 +1,8 @@
+from django.contrib import admin
+from .models import TachePDF
+
+
+@admin.register(TachePDF)
+class TachePDFAdmin(admin.ModelAdmin):
+    list_display = ('type_document', 'objet_id', 'statut', 'worker', 'cree_le', 'terminee_le')
+    list_filter = ('type_document', 'statut')
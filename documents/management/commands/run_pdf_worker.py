@@ -0,0 +1,64 @@
+import multiprocessing
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import connections
+from documents.services import executer_tache, liberer_taches_bloquees, nom_worker, reserver_tache
+
+
+class Command(BaseCommand):
+    help = "Exécute les tâches de génération PDF en file (plusieurs processus possibles)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processus', type=int, default=1, help="Nombre de workers à lancer")
+        parser.add_argument('--attente', type=float, default=1.0, help="Pause (s) quand la file est vide")
+        parser.add_argument('--une-fois', action='store_true', help="Vide la file puis s'arrête")
+        parser.add_argument('--delai-blocage', type=int, default=600,
+                            help="Remet en file les tâches EN_COURS depuis plus de N secondes")
+
+    def handle(self, *args, **options):
+        remises = liberer_taches_bloquees(timedelta(seconds=options['delai_blocage']))
+        if remises:
+            self.stdout.write(f"{remises} tâche(s) bloquée(s) remise(s) en file")
+
+        if options['processus'] <= 1:
+            traitees = self.boucle(options['attente'], options['une_fois'])
+            self.stdout.write(self.style.SUCCESS(f"{traitees} tâche(s) traitée(s)"))
+            return
+
+        # les connexions ne doivent pas être partagées entre processus
+        connections.close_all()
+        contexte = multiprocessing.get_context('fork')
+        workers = [contexte.Process(target=self.processus, args=(options['attente'], options['une_fois']))
+                   for _ in range(options['processus'])]
+        for w in workers:
+            w.start()
+        try:
+            for w in workers:
+                w.join()
+        except KeyboardInterrupt:
+            for w in workers:
+                w.terminate()
+
+    def processus(self, attente, une_fois):
+        try:
+            self.boucle(attente, une_fois)
+        finally:
+            connections.close_all()
+
+    def boucle(self, attente, une_fois):
+        worker, traitees = nom_worker(), 0
+        try:
+            while True:
+                tache = reserver_tache(worker)
+                if tache is None:
+                    if une_fois:
+                        break
+                    time.sleep(attente)
+                    continue
+                tache = executer_tache(tache)
+                traitees += 1
+                self.stdout.write(f"[{worker}] {tache}")
+        except KeyboardInterrupt:
+            pass
+        return traitees
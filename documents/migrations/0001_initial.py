@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TachePDF',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type_document', models.CharField(choices=[('VENTE', 'Facture de vente'), ('COMMANDE', 'Bon de commande')], max_length=10, verbose_name='Document')),
+                ('objet_id', models.PositiveIntegerField(verbose_name='Objet')),
+                ('statut', models.CharField(choices=[('EN_ATTENTE', 'En attente'), ('EN_COURS', 'En cours'), ('TERMINEE', 'Terminée'), ('ECHEC', 'Échec')], default='EN_ATTENTE', max_length=10, verbose_name='Statut')),
+                ('fichier', models.CharField(blank=True, max_length=255, verbose_name='Fichier')),
+                ('erreur', models.TextField(blank=True, verbose_name='Erreur')),
+                ('worker', models.CharField(blank=True, max_length=100, verbose_name='Worker')),
+                ('cree_le', models.DateTimeField(auto_now_add=True, verbose_name='Créée le')),
+                ('demarree_le', models.DateTimeField(blank=True, null=True, verbose_name='Démarrée le')),
+                ('terminee_le', models.DateTimeField(blank=True, null=True, verbose_name='Terminée le')),
+            ],
+            options={
+                'verbose_name': 'Tâche PDF',
+                'verbose_name_plural': 'Tâches PDF',
+                'ordering': ['-cree_le', '-id'],
+                'indexes': [models.Index(fields=['statut', 'id'], name='tache_pdf_file_idx'), models.Index(fields=['type_document', 'objet_id', '-id'], name='tache_pdf_document_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('statut', 'EN_ATTENTE')), fields=('type_document', 'objet_id'), name='tache_pdf_en_attente_unique')],
+            },
+        ),
+    ]
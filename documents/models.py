@@ -0,0 +1,59 @@
+from django.db import models
+from django.db.models import Q
+
+
+class TachePDF(models.Model):
+    """
+    Génération différée d'un PDF (facture de vente, bon de commande),
+    exécutée par la commande run_pdf_worker.
+    """
+    VENTE    = 'VENTE'
+    COMMANDE = 'COMMANDE'
+    TYPE_CHOICES = [
+        (VENTE,    'Facture de vente'),
+        (COMMANDE, 'Bon de commande'),
+    ]
+
+    EN_ATTENTE = 'EN_ATTENTE'
+    EN_COURS   = 'EN_COURS'
+    TERMINEE   = 'TERMINEE'
+    ECHEC      = 'ECHEC'
+    STATUT_CHOICES = [
+        (EN_ATTENTE, 'En attente'),
+        (EN_COURS,   'En cours'),
+        (TERMINEE,   'Terminée'),
+        (ECHEC,      'Échec'),
+    ]
+
+    type_document = models.CharField('Document', max_length=10, choices=TYPE_CHOICES)
+    objet_id      = models.PositiveIntegerField('Objet')
+    statut        = models.CharField('Statut', max_length=10, choices=STATUT_CHOICES, default=EN_ATTENTE)
+    fichier       = models.CharField('Fichier', max_length=255, blank=True)
+    erreur        = models.TextField('Erreur', blank=True)
+    worker        = models.CharField('Worker', max_length=100, blank=True)
+    cree_le       = models.DateTimeField('Créée le', auto_now_add=True)
+    demarree_le   = models.DateTimeField('Démarrée le', null=True, blank=True)
+    terminee_le   = models.DateTimeField('Terminée le', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Tâche PDF'
+        verbose_name_plural = 'Tâches PDF'
+        ordering = ['-cree_le', '-id']
+        constraints = [
+            # une seule demande en attente par document : les doublons fusionnent
+            models.UniqueConstraint(
+                fields=['type_document', 'objet_id'], condition=Q(statut='EN_ATTENTE'),
+                name='tache_pdf_en_attente_unique',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['statut', 'id'], name='tache_pdf_file_idx'),
+            models.Index(fields=['type_document', 'objet_id', '-id'], name='tache_pdf_document_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_type_document_display()} #{self.objet_id} ({self.get_statut_display()})"
+
+    @property
+    def active(self):
+        return self.statut in (self.EN_ATTENTE, self.EN_COURS)
@@ -0,0 +1,92 @@
+# documents/services.py
+
+import os
+import socket
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import TachePDF
+
+
+def demander_pdf(type_document: str, objet_id: int) -> TachePDF:
+    """
+    Met en file la génération d'un PDF et rend la tâche correspondante.
+    Une demande déjà en attente pour le même document est réutilisée : les
+    clics répétés ne produisent qu'un seul rendu.
+    """
+    tache, _ = TachePDF.objects.get_or_create(
+        type_document=type_document, objet_id=objet_id, statut=TachePDF.EN_ATTENTE
+    )
+    return tache
+
+
+def derniere_tache(type_document: str, objet_id: int):
+    return (TachePDF.objects
+            .filter(type_document=type_document, objet_id=objet_id)
+            .order_by('-id').first())
+
+
+def nom_worker() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def reserver_tache(worker: str):
+    """
+    Prend la plus ancienne tâche en attente. L'UPDATE conditionnel sur le
+    statut garantit qu'une tâche n'est prise que par un seul worker, même
+    avec plusieurs processus sur la même file.
+    """
+    while True:
+        pk = (TachePDF.objects.filter(statut=TachePDF.EN_ATTENTE)
+              .order_by('id').values_list('pk', flat=True).first())
+        if pk is None:
+            return None
+        pris = TachePDF.objects.filter(pk=pk, statut=TachePDF.EN_ATTENTE).update(
+            statut=TachePDF.EN_COURS, worker=worker, demarree_le=timezone.now()
+        )
+        if pris:
+            return TachePDF.objects.get(pk=pk)
+
+
+def _generer(tache: TachePDF) -> str:
+    from services.pdf import generate_commande_pdf, generate_vente_pdf
+    if tache.type_document == TachePDF.VENTE:
+        from ventes.models import Vente
+        return generate_vente_pdf(Vente.objects.select_related('client').get(pk=tache.objet_id))
+    from fournisseurs.models import CommandeFournisseur
+    return generate_commande_pdf(
+        CommandeFournisseur.objects.select_related('fournisseur').get(pk=tache.objet_id)
+    )
+
+
+def executer_tache(tache: TachePDF) -> TachePDF:
+    try:
+        tache.fichier = _generer(tache)
+        tache.statut = TachePDF.TERMINEE
+        tache.erreur = ''
+    except Exception as e:
+        tache.statut = TachePDF.ECHEC
+        tache.erreur = f"{type(e).__name__}: {e}"
+    tache.terminee_le = timezone.now()
+    tache.save(update_fields=['fichier', 'statut', 'erreur', 'terminee_le'])
+    return tache
+
+
+def liberer_taches_bloquees(delai: timedelta) -> int:
+    """
+    Remet en attente les tâches restées EN_COURS trop longtemps (worker
+    arrêté en plein rendu). Si une nouvelle demande attend déjà pour le même
+    document, la tâche bloquée passe simplement en échec.
+    """
+    limite = timezone.now() - delai
+    remises = 0
+    for pk in TachePDF.objects.filter(statut=TachePDF.EN_COURS, demarree_le__lt=limite).values_list('pk', flat=True):
+        bloquee = TachePDF.objects.filter(pk=pk, statut=TachePDF.EN_COURS)
+        try:
+            with transaction.atomic():
+                remises += bloquee.update(statut=TachePDF.EN_ATTENTE, worker='', demarree_le=None)
+        except IntegrityError:
+            bloquee.update(statut=TachePDF.ECHEC, erreur="Worker interrompu", terminee_le=timezone.now())
+    return remises
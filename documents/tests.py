@@ -0,0 +1,116 @@
+import os
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from clients.models import Client
+from produits.models import Produit
+from services.pdf import generate_vente_pdf
+from ventes.models import PaiementVente, Vente, VenteDetail
+from .models import TachePDF
+from .services import demander_pdf, liberer_taches_bloquees, reserver_tache
+
+
+class FilePDFTests(TestCase):
+    def setUp(self):
+        client = Client.objects.create(nom="Client", email="client@test.com")
+        produit = Produit.objects.create(nom="P1", code="P1", prix_vente=Decimal('10.00'))
+        self.vente = Vente.objects.create(client=client, montant_total=Decimal('20.00'))
+        VenteDetail.objects.create(vente=self.vente, produit=produit, quantite=2, prix_unitaire=Decimal('10.00'))
+
+    def tearDown(self):
+        self.vente.refresh_from_db()
+        if self.vente.facture_pdf and os.path.exists(self.vente.facture_pdf.path):
+            os.remove(self.vente.facture_pdf.path)
+
+    def test_vue_met_en_file_sans_rendu(self):
+        url = reverse('ventes:facture', args=[self.vente.pk])
+        self.client.get(url)
+        self.client.get(url)
+        # les doublons fusionnent en une seule tâche en attente
+        self.assertEqual(TachePDF.objects.filter(statut=TachePDF.EN_ATTENTE).count(), 1)
+        self.vente.refresh_from_db()
+        self.assertFalse(self.vente.facture_pdf)
+
+    def test_worker(self):
+        demander_pdf(TachePDF.VENTE, self.vente.pk)
+        call_command('run_pdf_worker', une_fois=True, stdout=StringIO())
+        tache = TachePDF.objects.get()
+        self.assertEqual(tache.statut, TachePDF.TERMINEE)
+        self.vente.refresh_from_db()
+        self.assertEqual(tache.fichier, self.vente.facture_pdf.name)
+        response = self.client.get(reverse('ventes:detail', args=[self.vente.pk]))
+        self.assertContains(response, "Télécharger le PDF")
+
+    def test_document_introuvable(self):
+        demander_pdf(TachePDF.COMMANDE, 9999)
+        call_command('run_pdf_worker', une_fois=True, stdout=StringIO())
+        self.assertEqual(TachePDF.objects.get().statut, TachePDF.ECHEC)
+
+    def test_reservation_unique(self):
+        tache = demander_pdf(TachePDF.VENTE, self.vente.pk)
+        self.assertEqual(reserver_tache("w1").pk, tache.pk)
+        self.assertIsNone(reserver_tache("w2"))
+        # une nouvelle demande pendant le rendu reste en attente
+        self.assertNotEqual(demander_pdf(TachePDF.VENTE, self.vente.pk).pk, tache.pk)
+
+    def test_taches_bloquees(self):
+        demander_pdf(TachePDF.VENTE, self.vente.pk)
+        reserver_tache("w1")
+        TachePDF.objects.update(demarree_le=timezone.now() - timedelta(hours=1))
+        self.assertEqual(liberer_taches_bloquees(timedelta(minutes=10)), 1)
+        self.assertEqual(TachePDF.objects.get().statut, TachePDF.EN_ATTENTE)
+
+
+class EmpreintePDFTests(TestCase):
+    def setUp(self):
+        client = Client.objects.create(nom="Client", email="client@test.com")
+        produit = Produit.objects.create(nom="P1", code="P1", prix_vente=Decimal('10.00'))
+        self.vente = Vente.objects.create(client=client, montant_total=Decimal('20.00'))
+        VenteDetail.objects.create(vente=self.vente, produit=produit, quantite=2, prix_unitaire=Decimal('10.00'))
+
+    def tearDown(self):
+        self.vente.refresh_from_db()
+        if self.vente.facture_pdf and os.path.exists(self.vente.facture_pdf.path):
+            os.remove(self.vente.facture_pdf.path)
+
+    def test_fichier_reutilise_si_inchange(self):
+        premier = generate_vente_pdf(self.vente)
+        empreinte = self.vente.facture_empreinte
+        self.assertEqual(generate_vente_pdf(self.vente), premier)
+        self.assertEqual(self.vente.facture_empreinte, empreinte)
+
+    def test_nouveau_rendu_si_modifie(self):
+        generate_vente_pdf(self.vente)
+        empreinte = self.vente.facture_empreinte
+        PaiementVente.objects.create(vente=self.vente, montant=Decimal('5.00'))
+        generate_vente_pdf(self.vente)
+        self.assertNotEqual(self.vente.facture_empreinte, empreinte)
+        self.assertTrue(os.path.exists(self.vente.facture_pdf.path))
+
+    def test_telechargement_conditionnel(self):
+        url = reverse('ventes:facture_pdf', args=[self.vente.pk])
+        self.assertEqual(self.client.get(url).status_code, 404)
+        generate_vente_pdf(self.vente)
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(response['ETag'], f'"{self.vente.facture_empreinte}"')
+        self.assertIn('Last-Modified', response)
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_apercu_sans_fichier(self):
+        response = self.client.get(reverse('ventes:facture_apercu', args=[self.vente.pk]))
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+        self.vente.refresh_from_db()
+        self.assertFalse(self.vente.facture_pdf)
+
+    def test_apercu_n_enregistre_jamais(self):
+        response = self.client.get(reverse('ventes:facture_apercu', args=[self.vente.pk]), {'enregistrer': '1'})
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+        self.vente.refresh_from_db()
+        self.assertFalse(self.vente.facture_pdf)
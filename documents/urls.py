@@ -0,0 +1,7 @@
+from django.urls import path
+from .views import tache_statut
+
+app_name = 'documents'
+urlpatterns = [
+    path('taches/<int:pk>/', tache_statut, name='tache_statut'),
+]
@@ -0,0 +1,61 @@
+import os
+from io import BytesIO
+from datetime import datetime, timezone as dt_timezone
+from django.http import FileResponse, Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import condition
+from .models import TachePDF
+
+
+def tache_statut(request, pk):
+    """Statut d'une tâche PDF (suivi depuis les pages de détail)."""
+    tache = get_object_or_404(TachePDF, pk=pk)
+    return JsonResponse({
+        'statut': tache.statut,
+        'libelle': tache.get_statut_display(),
+        'fichier': tache.fichier or None,
+        'erreur': tache.erreur or None,
+    })
+
+
+def telechargement_pdf(model):
+    """
+    Vue servant le PDF stocké sur model.facture_pdf avec ETag (empreinte
+    des données) et Last-Modified (date du fichier) : un navigateur qui a
+    déjà la dernière version reçoit un 304 sans relecture du fichier.
+    """
+    def objet(request, pk):
+        if getattr(request, '_objet_pdf', None) is None:
+            obj = get_object_or_404(model.objects.only('pk', 'facture_pdf', 'facture_empreinte'), pk=pk)
+            if not obj.facture_pdf or not os.path.exists(obj.facture_pdf.path):
+                raise Http404("Aucun PDF généré")
+            request._objet_pdf = obj
+        return request._objet_pdf
+
+    def etag(request, pk):
+        return objet(request, pk).facture_empreinte or None
+
+    def derniere_modification(request, pk):
+        mtime = os.path.getmtime(objet(request, pk).facture_pdf.path)
+        return datetime.fromtimestamp(mtime, tz=dt_timezone.utc)
+
+    @condition(etag_func=etag, last_modified_func=derniere_modification)
+    def vue(request, pk):
+        obj = objet(request, pk)
+        return FileResponse(open(obj.facture_pdf.path, 'rb'), content_type='application/pdf',
+                            filename=os.path.basename(obj.facture_pdf.name))
+    return vue
+
+
+def apercu_pdf(model, rendre):
+    """
+    Vue rendant le PDF en mémoire et le renvoyant directement (affichage dans
+    le navigateur), sans fichier ni redirection. Un GET n'écrit jamais sur
+    disque : l'enregistrement passe par la génération classique.
+    """
+    def vue(request, pk):
+        obj = get_object_or_404(model, pk=pk)
+        contenu = rendre(obj)
+        return FileResponse(BytesIO(contenu), content_type='application/pdf',
+                            filename=f"{model._meta.model_name}_{obj.pk}.pdf")
+    return vue
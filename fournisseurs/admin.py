@@ -21,6 +21,7 @@ class FournisseurAdmin(admin.ModelAdmin):
     list_filter = ['actif']
     search_fields = ['nom', 'email']
     ordering = ['nom']
+    list_select_related = ['solde']
 
 @admin.register(CommandeFournisseur)
 class CommandeFournisseurAdmin(admin.ModelAdmin):
@@ -30,6 +31,10 @@ class CommandeFournisseurAdmin(admin.ModelAdmin):
     inlines = [LigneCommandeInline, ReceptionApproInline, PaiementFournisseurInline]
     readonly_fields = ['date_commande', 'montant_total']
     ordering = ['-date_commande']
+    list_select_related = ['fournisseur']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).avec_totaux()
 
     def has_delete_permission(self, request, obj=None):
         if obj and obj.statut != CommandeFournisseur.EN_ATTENTE:
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class FournisseursConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'fournisseurs'
+
+    def ready(self):
+        import fournisseurs.signals
@@ -1,7 +1,8 @@
 from django import forms
-from django.forms import inlineformset_factory
+from django.forms import BaseInlineFormSet, inlineformset_factory
 from .models import Fournisseur, CommandeFournisseur, LigneCommande, ReceptionAppro, PaiementFournisseur
 from django.core.exceptions import ValidationError
+from produits.models import Produit
 
 class FournisseurForm(forms.ModelForm):
     class Meta:
@@ -26,15 +27,79 @@ class CommandeFournisseurForm(forms.ModelForm):
             raise ValidationError("Ce fournisseur n'est plus actif")
         return fournisseur
 
+class ProduitChoiceField(forms.ModelChoiceField):
+    """ModelChoiceField qui résout le produit dans un dictionnaire préchargé s'il est fourni."""
+    produits = None
+
+    def to_python(self, value):
+        if self.produits is None or value in self.empty_values:
+            return super().to_python(value)
+        try:
+            return self.produits[int(value)]
+        except (KeyError, TypeError, ValueError):
+            raise ValidationError(self.error_messages['invalid_choice'], code='invalid_choice')
+
+
 class LigneCommandeForm(forms.ModelForm):
+    produit = ProduitChoiceField(queryset=Produit.objects.all())
+
     class Meta:
         model = LigneCommande
         fields = ['produit','quantite','prix_achat']
 
+    def _get_validation_exclusions(self):
+        # produit déjà résolu par le champ : inutile de revérifier la clé étrangère
+        exclusions = super()._get_validation_exclusions()
+        exclusions.add('produit')
+        return exclusions
+
+    def validate_unique(self):
+        # l'unicité (commande, produit) est vérifiée en mémoire par le
+        # formset (BaseLigneCommandeFormSet.clean) : pas de requête par ligne
+        pass
+
+
+class BaseLigneCommandeFormSet(BaseInlineFormSet):
+    """
+    Charge en une requête tous les produits postés, pour toutes les lignes,
+    et refuse les produits en double sans interroger la base.
+    """
+
+    def clean(self):
+        super().clean()
+        vus = set()
+        for form in self.forms:
+            if not form.cleaned_data or self._should_delete_form(form):
+                continue
+            produit = form.cleaned_data.get('produit')
+            if produit is None:
+                continue
+            if produit.pk in vus:
+                raise ValidationError(f"Le produit {produit.nom} apparaît plusieurs fois dans la commande")
+            vus.add(produit.pk)
+
+    def produits_postes(self):
+        if not hasattr(self, '_produits_postes'):
+            ids = set()
+            for i in range(self.total_form_count()):
+                valeur = self.data.get(f"{self.add_prefix(i)}-produit")
+                if valeur and str(valeur).isdigit():
+                    ids.add(int(valeur))
+            self._produits_postes = Produit.objects.in_bulk(ids)
+        return self._produits_postes
+
+    def _construct_form(self, i, **kwargs):
+        form = super()._construct_form(i, **kwargs)
+        if self.is_bound:
+            form.fields['produit'].produits = self.produits_postes()
+        return form
+
+
 CommandeLigneFormSet = inlineformset_factory(
     parent_model=CommandeFournisseur,
     model=LigneCommande,
     form=LigneCommandeForm,
+    formset=BaseLigneCommandeFormSet,
     extra=1, can_delete=True
 )
 
@@ -56,7 +121,7 @@ class ReceptionApproForm(forms.ModelForm):
         disabled=True,
     )
     # On cache le champ produit en HiddenInput pour qu'il soit reposté
-    produit = forms.ModelChoiceField(
+    produit = ProduitChoiceField(
         queryset=Produit.objects.all(),
         widget=forms.HiddenInput()
     )
@@ -65,6 +130,27 @@ class ReceptionApproForm(forms.ModelForm):
         model = ReceptionAppro
         fields = ['produit', 'quantite_commandee', 'quantite_livree', 'reference']
 
+    def __init__(self, *args, produits=None, controle_groupe=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        # produits de la commande déjà chargés par la vue
+        self.fields['produit'].produits = produits
+        # controle_groupe : la vue contrôle et enregistre les lignes ensemble
+        # par receptionner_commande ; le formulaire ne peut plus être enregistré
+        self.controle_groupe = controle_groupe
+        if controle_groupe:
+            self.instance.controle_groupe = True
+
+    def save(self, commit=True):
+        if self.controle_groupe:
+            raise ValueError("Réception contrôlée en groupe : à enregistrer par receptionner_commande")
+        return super().save(commit)
+
+    def _get_validation_exclusions(self):
+        # commande et produit déjà résolus : pas de requête de clé étrangère par ligne
+        exclusions = super()._get_validation_exclusions()
+        exclusions.update({'commande', 'produit'})
+        return exclusions
+
 
 # InlineFormSet par défaut extra=0
 BaseReceptionFormSet = inlineformset_factory(
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from fournisseurs.scores import FENETRE_JOURS, rafraichir_scores, rafraichir_scores_modifies
+
+
+class Command(BaseCommand):
+    help = "Met à jour les scores fournisseurs (délais, taux de service, dépense)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--complet', action='store_true',
+                            help="Recalcule tous les fournisseurs (défaut : ceux ayant eu de l'activité)")
+        parser.add_argument('--fenetre', type=int, default=FENETRE_JOURS,
+                            help=f"Fenêtre d'analyse en jours (défaut : {FENETRE_JOURS})")
+
+    def handle(self, *args, **options):
+        if options['complet']:
+            n = rafraichir_scores(fenetre_jours=options['fenetre'])
+        else:
+            n = rafraichir_scores_modifies(fenetre_jours=options['fenetre'])
+        self.stdout.write(f"{n} score(s) recalculé(s)")
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from fournisseurs.prix import recalculer_historique
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'historique des prix d'achat depuis les lignes de commande"
+
+    def handle(self, *args, **options):
+        n = recalculer_historique()
+        self.stdout.write(f"{n} couple(s) produit / fournisseur recalculé(s)")
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from fournisseurs.soldes import reconstruire_soldes
+
+
+class Command(BaseCommand):
+    help = "Recalcule les soldes fournisseurs depuis les commandes et paiements"
+
+    def add_arguments(self, parser):
+        parser.add_argument('fournisseurs', nargs='*', type=int, help="Identifiants (défaut : tous)")
+
+    def handle(self, *args, **options):
+        n = reconstruire_soldes(options['fournisseurs'] or None)
+        self.stdout.write(f"{n} solde(s) recalculé(s)")
@@ -0,0 +1,36 @@
+import time
+from django.core.management.base import BaseCommand
+from fournisseurs.reappro import (
+    BROUILLON_JOURS, COUVERTURE_JOURS, DELAI_DEFAUT, HISTORIQUE_JOURS, calculer_suggestions, creer_brouillons,
+)
+
+
+class Command(BaseCommand):
+    help = "Calcule les points de commande et crée des commandes fournisseur brouillon"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--historique', type=int, default=HISTORIQUE_JOURS,
+                            help=f"Jours de sorties analysés (défaut : {HISTORIQUE_JOURS})")
+        parser.add_argument('--couverture', type=int, default=COUVERTURE_JOURS,
+                            help=f"Jours de demande couverts au-delà du point de commande (défaut : {COUVERTURE_JOURS})")
+        parser.add_argument('--delai-defaut', type=float, default=DELAI_DEFAUT,
+                            help=f"Délai en jours d'un fournisseur sans score (défaut : {DELAI_DEFAUT})")
+        parser.add_argument('--brouillon-jours', type=int, default=BROUILLON_JOURS,
+                            help=f"Âge au-delà duquel un brouillon non validé est ignoré (défaut : {BROUILLON_JOURS})")
+        parser.add_argument('--simulation', action='store_true', help="Affiche les suggestions sans rien créer")
+
+    def handle(self, *args, **options):
+        debut = time.perf_counter()
+        suggestions = calculer_suggestions(
+            historique_jours=options['historique'], couverture_jours=options['couverture'],
+            delai_defaut=options['delai_defaut'], brouillon_jours=options['brouillon_jours'],
+        )
+        calcul = time.perf_counter() - debut
+        self.stdout.write(f"{len(suggestions)} produit(s) à réapprovisionner (calcul : {calcul:.2f} s)")
+        if options['simulation']:
+            for s in suggestions:
+                self.stdout.write(f"  produit #{s.produit_id} : {s.quantite} chez fournisseur #{s.fournisseur_id} "
+                                  f"(demande {s.demande_jour}/j, point {s.point_commande})")
+            return
+        commandes = creer_brouillons(suggestions)
+        self.stdout.write(f"{len(commandes)} commande(s) brouillon créée(s)")
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fournisseurs', '0003_commandefournisseur_montant_total_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='commandefournisseur',
+            name='facture_empreinte',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:30
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def remplir_soldes(apps, schema_editor):
+    Fournisseur = apps.get_model('fournisseurs', 'Fournisseur')
+    FournisseurSolde = apps.get_model('fournisseurs', 'FournisseurSolde')
+    CommandeFournisseur = apps.get_model('fournisseurs', 'CommandeFournisseur')
+    PaiementFournisseur = apps.get_model('fournisseurs', 'PaiementFournisseur')
+
+    commandes = {
+        c['fournisseur']: c for c in CommandeFournisseur.objects.order_by().values('fournisseur').annotate(
+            total=Sum('montant_total'), nb=Count('pk'), en_cours=Count('pk', filter=~Q(statut='RECEPTIONNEE')),
+        )
+    }
+    paiements = dict(
+        PaiementFournisseur.objects.order_by().values('commande__fournisseur').annotate(total=Sum('montant'))
+        .values_list('commande__fournisseur', 'total')
+    )
+    soldes = []
+    for pk in Fournisseur.objects.values_list('pk', flat=True):
+        c = commandes.get(pk, {})
+        total = c.get('total') or Decimal('0.00')
+        paye = paiements.get(pk) or Decimal('0.00')
+        soldes.append(FournisseurSolde(
+            fournisseur_id=pk, total_commandes=total, total_paye=paye, reste_a_payer=total - paye,
+            nb_commandes=c.get('nb', 0), nb_commandes_en_cours=c.get('en_cours', 0),
+        ))
+    FournisseurSolde.objects.bulk_create(soldes, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fournisseurs', '0004_commandefournisseur_facture_empreinte'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FournisseurSolde',
+            fields=[
+                ('fournisseur', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='solde', serialize=False, to='fournisseurs.fournisseur')),
+                ('total_commandes', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Total commandé')),
+                ('total_paye', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Total payé')),
+                ('reste_a_payer', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Reste à payer')),
+                ('nb_commandes', models.IntegerField(default=0, verbose_name='Commandes')),
+                ('nb_commandes_en_cours', models.IntegerField(default=0, verbose_name='Commandes en cours')),
+                ('maj_le', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Solde fournisseur',
+                'verbose_name_plural': 'Soldes fournisseurs',
+            },
+        ),
+        migrations.RunPython(remplir_soldes, migrations.RunPython.noop),
+    ]
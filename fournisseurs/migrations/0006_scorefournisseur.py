@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:45
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fournisseurs', '0005_fournisseursolde'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScoreFournisseur',
+            fields=[
+                ('fournisseur', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='score', serialize=False, to='fournisseurs.fournisseur')),
+                ('nb_commandes', models.IntegerField(default=0, verbose_name='Commandes livrées')),
+                ('delai_moyen', models.FloatField(blank=True, null=True, verbose_name='Délai moyen (j)')),
+                ('delai_p90', models.FloatField(blank=True, null=True, verbose_name='Délai p90 (j)')),
+                ('taux_service', models.FloatField(blank=True, help_text='Quantité reçue / quantité commandée', null=True, verbose_name='Taux de service')),
+                ('taux_partielles', models.FloatField(blank=True, help_text='Part des commandes livrées en plusieurs fois ou incomplètes', null=True, verbose_name='Livraisons partielles')),
+                ('depense', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Dépense')),
+                ('calcule_le', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Score fournisseur',
+                'verbose_name_plural': 'Scores fournisseurs',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fournisseurs', '0006_scorefournisseur'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='commandefournisseur',
+            name='statut',
+            field=models.CharField(choices=[('BROUILLON', 'Brouillon'), ('EN_ATTENTE', 'En attente'), ('PARTIEL', 'Partiellement livré'), ('RECEPTIONNEE', 'Réceptionnée')], default='EN_ATTENTE', max_length=12),
+        ),
+    ]
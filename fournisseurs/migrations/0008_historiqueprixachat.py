@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, Max, Min, OuterRef, Subquery, Sum
+
+
+def remplir_historique(apps, schema_editor):
+    LigneCommande = apps.get_model('fournisseurs', 'LigneCommande')
+    HistoriquePrixAchat = apps.get_model('fournisseurs', 'HistoriquePrixAchat')
+
+    lignes = LigneCommande.objects.order_by().exclude(commande__statut='BROUILLON')
+    dernier = (lignes.filter(produit=OuterRef('produit'), commande__fournisseur=OuterRef('commande__fournisseur'))
+               .order_by('-commande__date_commande', '-pk').values('prix_achat')[:1])
+    HistoriquePrixAchat.objects.bulk_create([
+        HistoriquePrixAchat(
+            produit_id=r['produit'], fournisseur_id=r['commande__fournisseur'], dernier_prix=r['dernier_prix'],
+            dernier_achat=r['dernier_achat'], prix_min=r['prix_min'], montant_total=r['montant'],
+            quantite_totale=r['quantite'], nb_lignes=r['nb'],
+        )
+        for r in lignes.values('produit', 'commande__fournisseur').annotate(
+            dernier_prix=Subquery(dernier), dernier_achat=Max('commande__date_commande'),
+            prix_min=Min('prix_achat'), montant=Sum(F('quantite') * F('prix_achat')),
+            quantite=Sum('quantite'), nb=Count('pk'),
+        )
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fournisseurs', '0007_commandefournisseur_brouillon'),
+        ('produits', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HistoriquePrixAchat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dernier_prix', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Dernier prix')),
+                ('dernier_achat', models.DateTimeField(verbose_name='Dernier achat')),
+                ('prix_min', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Prix minimum')),
+                ('montant_total', models.DecimalField(decimal_places=2, max_digits=16, verbose_name='Montant acheté')),
+                ('quantite_totale', models.PositiveBigIntegerField(verbose_name='Quantité achetée')),
+                ('nb_lignes', models.PositiveIntegerField(verbose_name="Lignes d'achat")),
+                ('fournisseur', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='historique_prix', to='fournisseurs.fournisseur')),
+                ('produit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='historique_prix', to='produits.produit')),
+            ],
+            options={
+                'verbose_name': "Historique de prix d'achat",
+                'verbose_name_plural': "Historiques de prix d'achat",
+                'indexes': [models.Index(fields=['fournisseur', 'produit'], name='historique_prix_fourn_idx')],
+                'constraints': [models.UniqueConstraint(fields=('produit', 'fournisseur'), name='historique_prix_unique')],
+            },
+        ),
+        migrations.RunPython(remplir_historique, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,10 @@
-from django.db import models
+from django.db import models, transaction
 from produits.models import Produit
 from stocks.models import MouvementStock
 from decimal import Decimal
-from django.core.exceptions import ValidationError
-from django.db.models import Sum
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 
 class Fournisseur(models.Model):
     nom     = models.CharField(max_length=255)
@@ -31,9 +32,18 @@ class Fournisseur(models.Model):
         self.full_clean()
         super().save(*args, **kwargs)
 
+    def _solde(self):
+        try:
+            return self.solde
+        except ObjectDoesNotExist:
+            return None
+
     @property
     def total_commandes(self):
         """Retourne le montant total des commandes pour ce fournisseur"""
+        solde = self._solde()
+        if solde is not None:
+            return solde.total_commandes
         return self.commandes.aggregate(
             total=models.Sum('montant_total')
         )['total'] or Decimal('0.00')
@@ -41,19 +51,87 @@ class Fournisseur(models.Model):
     @property
     def total_non_paye(self):
         """Retourne le montant total non payé pour ce fournisseur"""
-        from django.db.models import Sum, F
-        commandes = self.commandes.annotate(
-            total_paye=Sum('paiements__montant')
-        ).aggregate(
-            total_du=Sum(F('montant_total') - F('total_paye'))
+        solde = self._solde()
+        if solde is not None:
+            return solde.reste_a_payer
+        return self.commandes.avec_totaux().aggregate(
+            total_du=Sum('reste_annote')
+        )['total_du'] or Decimal('0.00')
+
+
+class FournisseurSolde(models.Model):
+    """
+    Soldes d'un fournisseur, tenus à jour à chaque modification de commande
+    ou paiement par fournisseurs.soldes (pas d'agrégat à la lecture).
+    """
+    fournisseur      = models.OneToOneField(Fournisseur, on_delete=models.CASCADE, primary_key=True, related_name='solde')
+    total_commandes  = models.DecimalField('Total commandé', max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    total_paye       = models.DecimalField('Total payé', max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    reste_a_payer    = models.DecimalField('Reste à payer', max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    nb_commandes     = models.IntegerField('Commandes', default=0)
+    nb_commandes_en_cours = models.IntegerField('Commandes en cours', default=0)
+    maj_le           = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Solde fournisseur'
+        verbose_name_plural = 'Soldes fournisseurs'
+
+    def __str__(self):
+        return f"{self.fournisseur} : {self.reste_a_payer}"
+
+
+class ScoreFournisseur(models.Model):
+    """
+    Indicateurs de performance d'un fournisseur sur une fenêtre glissante,
+    calculés en bloc par fournisseurs.scores et relus tels quels.
+    Délais en jours, de la commande à sa première réception.
+    """
+    fournisseur       = models.OneToOneField(Fournisseur, on_delete=models.CASCADE, primary_key=True, related_name='score')
+    nb_commandes      = models.IntegerField('Commandes livrées', default=0)
+    delai_moyen       = models.FloatField('Délai moyen (j)', null=True, blank=True)
+    delai_p90         = models.FloatField('Délai p90 (j)', null=True, blank=True)
+    taux_service      = models.FloatField('Taux de service', null=True, blank=True,
+                                          help_text="Quantité reçue / quantité commandée")
+    taux_partielles   = models.FloatField('Livraisons partielles', null=True, blank=True,
+                                          help_text="Part des commandes livrées en plusieurs fois ou incomplètes")
+    depense           = models.DecimalField('Dépense', max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    calcule_le        = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Score fournisseur'
+        verbose_name_plural = 'Scores fournisseurs'
+
+    def __str__(self):
+        return f"{self.fournisseur} : {self.taux_service}"
+
+class CommandeFournisseurQuerySet(models.QuerySet):
+    def avec_totaux(self):
+        """
+        Annote total payé, reste à payer et quantité reçue en une seule
+        requête (sous-requêtes corrélées : pas de produit croisé entre
+        paiements et réceptions).
+        """
+        paye = (PaiementFournisseur.objects.filter(commande=OuterRef('pk')).order_by()
+                .values('commande').annotate(total=Sum('montant')).values('total'))
+        recu = (ReceptionAppro.objects.filter(commande=OuterRef('pk')).order_by()
+                .values('commande').annotate(total=Sum('quantite_livree')).values('total'))
+        montant = DecimalField(max_digits=12, decimal_places=2)
+        return self.annotate(
+            total_paye_annote=Coalesce(Subquery(paye, output_field=montant), Value(Decimal('0.00')),
+                                       output_field=montant),
+            total_recu_annote=Coalesce(Subquery(recu), Value(0)),
+        ).annotate(
+            reste_annote=F('montant_total') - F('total_paye_annote'),
         )
-        return commandes['total_du'] or Decimal('0.00')
+
 
 class CommandeFournisseur(models.Model):
+    BROUILLON  = 'BROUILLON'
     EN_ATTENTE = 'EN_ATTENTE'
     PARTIEL    = 'PARTIEL'
     RECEP      = 'RECEPTIONNEE'
     STATUT_CHOICES = [
+        (BROUILLON, 'Brouillon'),
         (EN_ATTENTE, 'En attente'),
         (PARTIEL, 'Partiellement livré'),
         (RECEP, 'Réceptionnée')
@@ -63,8 +141,11 @@ class CommandeFournisseur(models.Model):
     date_commande = models.DateTimeField(auto_now_add=True)
     statut        = models.CharField(max_length=12, choices=STATUT_CHOICES, default=EN_ATTENTE)
     facture_pdf   = models.FileField(upload_to='factures/', blank=True, null=True)
+    facture_empreinte = models.CharField(max_length=64, blank=True, editable=False)
     montant_total = models.DecimalField("Montant total", max_digits=12, decimal_places=2, default=Decimal('0.00'))
-    
+
+    objects = CommandeFournisseurQuerySet.as_manager()
+
     class Meta:
         ordering = ['-date_commande']
         indexes = [
@@ -84,7 +165,9 @@ class CommandeFournisseur(models.Model):
 
     def save(self, *args, **kwargs):
         self.full_clean()
-        super().save(*args, **kwargs)
+        # le solde du fournisseur (fournisseurs.signals) suit la même transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     def generate_pdf(self):
         from services.pdf import generate_commande_pdf
@@ -94,6 +177,8 @@ class CommandeFournisseur(models.Model):
     @property
     def total_paye(self):
         """Retourne le montant total payé pour cette commande"""
+        if hasattr(self, 'total_paye_annote'):
+            return self.total_paye_annote
         return self.paiements.aggregate(
             total=models.Sum('montant')
         )['total'] or Decimal('0.00')
@@ -101,6 +186,8 @@ class CommandeFournisseur(models.Model):
     @property
     def reste_a_payer(self):
         """Retourne le montant restant à payer"""
+        if hasattr(self, 'reste_annote'):
+            return self.reste_annote
         return self.montant_total - self.total_paye
 
     @property
@@ -111,20 +198,44 @@ class CommandeFournisseur(models.Model):
     @property
     def total_recu(self):
         """Retourne la quantité totale reçue"""
+        if hasattr(self, 'total_recu_annote'):
+            return self.total_recu_annote
         return self.receptions.aggregate(
             total=models.Sum('quantite_livree')
         )['total'] or 0
 
     def update_statut(self):
         """Met à jour le statut de la commande en fonction des réceptions"""
-        total_cmd = sum(l.quantite for l in self.lignes.all())
-        if self.total_recu >= total_cmd:
+        # quantités commandées et reçues lues ensemble, en une requête
+        commandee = (LigneCommande.objects.filter(commande=OuterRef('pk')).order_by()
+                     .values('commande').annotate(total=Sum('quantite')).values('total'))
+        fournisseur_id, ancien, montant, total_cmd, total_recu = (
+            CommandeFournisseur.objects.filter(pk=self.pk).avec_totaux()
+            .annotate(total_commande=Coalesce(Subquery(commandee), Value(0)))
+            .values_list('fournisseur_id', 'statut', 'montant_total', 'total_commande', 'total_recu_annote').get()
+        )
+        if total_recu >= total_cmd:
             self.statut = self.RECEP
-        elif self.total_recu > 0:
+        elif total_recu > 0:
             self.statut = self.PARTIEL
         else:
             self.statut = self.EN_ATTENTE
-        self.save(update_fields=['statut'])
+        # UPDATE direct : le statut est calculé, full_clean() n'apporte rien ici
+        from .soldes import ajuster_commande, part_commande
+        if part_commande(ancien, montant) == part_commande(self.statut, montant):
+            CommandeFournisseur.objects.filter(pk=self.pk).update(statut=self.statut)
+            return
+        # commande ouverte, close ou sortie de brouillon : le solde suit, dans la même transaction
+        with transaction.atomic():
+            CommandeFournisseur.objects.filter(pk=self.pk).update(statut=self.statut)
+            ajuster_commande(fournisseur_id, avant=(ancien, montant), apres=(self.statut, montant))
+
+class LigneCommandeQuerySet(models.QuerySet):
+    def avec_receptions(self):
+        """Annote la quantité reçue de chaque ligne (réceptions groupées par produit)."""
+        recu = (ReceptionAppro.objects.filter(commande=OuterRef('commande'), produit=OuterRef('produit'))
+                .order_by().values('commande', 'produit').annotate(total=Sum('quantite_livree')).values('total'))
+        return self.annotate(quantite_recue_annotee=Coalesce(Subquery(recu), Value(0)))
 
 class LigneCommande(models.Model):
     commande   = models.ForeignKey(CommandeFournisseur, on_delete=models.CASCADE, related_name='lignes')
@@ -132,6 +243,8 @@ class LigneCommande(models.Model):
     quantite   = models.PositiveIntegerField()
     prix_achat = models.DecimalField(max_digits=10, decimal_places=2)
 
+    objects = LigneCommandeQuerySet.as_manager()
+
     class Meta:
         unique_together = ['commande', 'produit']
         ordering = ['produit__nom']
@@ -148,21 +261,29 @@ class LigneCommande(models.Model):
             raise ValidationError({
                 'prix_achat': "Le prix d'achat doit être supérieur à 0"
             })
-        # Vérifier si le produit n'est pas déjà dans la commande
-        if self.pk is None and LigneCommande.objects.filter(
-            commande=self.commande, 
-            produit=self.produit
-        ).exists():
-            raise ValidationError({
-                'produit': "Ce produit est déjà dans la commande"
-            })
+
+    def unique_error_message(self, model_class, unique_check):
+        # produit déjà présent : contrôlé par validate_unique (full_clean dans save)
+        if tuple(unique_check) == ('commande', 'produit'):
+            return ValidationError("Ce produit est déjà dans la commande", code='unique_together')
+        return super().unique_error_message(model_class, unique_check)
 
     def save(self, *args, **kwargs):
         self.full_clean()
-        super().save(*args, **kwargs)
-        # Recalculer le montant total de la commande
-        from .services import recalc_commande_total
-        recalc_commande_total(self.commande)
+        from .prix import enregistrer_achats, recalculer_historique
+        ancien_produit = None
+        if not self._state.adding:
+            ancien_produit = LigneCommande.objects.filter(pk=self.pk).values_list('produit_id', flat=True).first()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            # Recalculer le montant total de la commande
+            from .services import recalc_commande_total
+            recalc_commande_total(self.commande)
+            # historique des prix : ajout incrémental, recalcul du couple sur modification
+            if ancien_produit is None:
+                enregistrer_achats([self])
+            else:
+                recalculer_historique({(pid, self.commande.fournisseur_id) for pid in (ancien_produit, self.produit_id)})
 
     @property
     def montant_total(self):
@@ -172,6 +293,8 @@ class LigneCommande(models.Model):
     @property
     def quantite_recue(self):
         """Retourne la quantité déjà reçue pour cette ligne"""
+        if hasattr(self, 'quantite_recue_annotee'):
+            return self.quantite_recue_annotee
         return self.commande.receptions.filter(
             produit=self.produit
         ).aggregate(
@@ -183,6 +306,41 @@ class LigneCommande(models.Model):
         """Retourne la quantité restant à livrer"""
         return self.quantite - self.quantite_recue
 
+class HistoriquePrixAchat(models.Model):
+    """
+    Prix d'achat d'un produit chez un fournisseur : dernier prix, minimum et
+    moyenne pondérée par les quantités. Tenu à jour par fournisseurs.prix à
+    l'enregistrement des lignes de commande (brouillons exclus), lu par index.
+    """
+    produit         = models.ForeignKey(Produit, on_delete=models.CASCADE, related_name='historique_prix')
+    fournisseur     = models.ForeignKey(Fournisseur, on_delete=models.CASCADE, related_name='historique_prix')
+    dernier_prix    = models.DecimalField('Dernier prix', max_digits=10, decimal_places=2)
+    dernier_achat   = models.DateTimeField('Dernier achat')
+    prix_min        = models.DecimalField('Prix minimum', max_digits=10, decimal_places=2)
+    montant_total   = models.DecimalField('Montant acheté', max_digits=16, decimal_places=2)
+    quantite_totale = models.PositiveBigIntegerField('Quantité achetée')
+    nb_lignes       = models.PositiveIntegerField("Lignes d'achat")
+
+    class Meta:
+        verbose_name = "Historique de prix d'achat"
+        verbose_name_plural = "Historiques de prix d'achat"
+        constraints = [
+            models.UniqueConstraint(fields=['produit', 'fournisseur'], name='historique_prix_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['fournisseur', 'produit'], name='historique_prix_fourn_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.produit} / {self.fournisseur} : {self.dernier_prix}"
+
+    @property
+    def prix_moyen(self):
+        """Prix moyen pondéré par les quantités achetées"""
+        if not self.quantite_totale:
+            return self.dernier_prix
+        return (self.montant_total / self.quantite_totale).quantize(Decimal('0.01'))
+
 class ReceptionAppro(models.Model):
     commande        = models.ForeignKey(CommandeFournisseur, on_delete=models.PROTECT, related_name='receptions')
     produit         = models.ForeignKey(Produit, on_delete=models.PROTECT)
@@ -196,9 +354,16 @@ class ReceptionAppro(models.Model):
             raise ValidationError({
                 'quantite_livree': "La quantité livrée doit être supérieure à 0"
             })
-        
+        if self.commande.statut == CommandeFournisseur.BROUILLON:
+            raise ValidationError("Commande en brouillon : à valider avant réception")
+        if getattr(self, 'controle_groupe', False):
+            # formulaire de réception de la vue : commande et cumul vérifiés
+            # pour toutes les lignes à la fois par services.receptionner_commande
+            return
+
         # Récupérer la ligne de commande correspondante pour vérifier la quantité commandée
         ligne_commande = self.commande.lignes.filter(produit=self.produit).first()
+        self._ligne_commande = ligne_commande
         if not ligne_commande:
             raise ValidationError({
                 'produit': "Ce produit n'est pas dans la commande d'origine"
@@ -219,6 +384,9 @@ class ReceptionAppro(models.Model):
             })
 
     def save(self, *args, **kwargs):
+        if getattr(self, 'controle_groupe', False):
+            # clean() n'a rien vérifié : seul receptionner_commande enregistre ces lignes
+            raise ValueError("Réception contrôlée en groupe : à enregistrer par receptionner_commande")
         self.full_clean()  # Appelle clean() avant la sauvegarde
         is_new = self.pk is None
         super().save(*args, **kwargs)
@@ -227,14 +395,13 @@ class ReceptionAppro(models.Model):
                 produit=self.produit,
                 type=MouvementStock.ENTREE,
                 quantite=self.quantite_livree,
-                reference=f"Réception #{self.pk} (Cmd #{self.commande.pk})"
-            )
-            total_cmd = sum(l.quantite for l in self.commande.lignes.all())
-            total_rec = sum(r.quantite_livree for r in self.commande.receptions.all())
-            self.commande.statut = (
-                self.commande.RECEP if total_rec >= total_cmd else self.commande.PARTIEL
+                reference=f"Réception #{self.pk} (Cmd #{self.commande.pk})",
+                source_type=MouvementStock.RECEPTION,
+                source_id=self.pk,
+                # valorisation au prix d'achat de la ligne (lue dans clean())
+                cout_unitaire=self._ligne_commande.prix_achat
             )
-            self.commande.save(update_fields=['statut'])
+            self.commande.update_statut()
 
 class PaiementFournisseur(models.Model):
     commande      = models.ForeignKey(CommandeFournisseur, on_delete=models.CASCADE, related_name='paiements')
@@ -243,3 +410,8 @@ class PaiementFournisseur(models.Model):
 
     def __str__(self):
         return f"Paiement {self.montant} le {self.date_paiement:%d/%m/%Y}"
+
+    def save(self, *args, **kwargs):
+        # le solde du fournisseur (fournisseurs.signals) suit la même transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
@@ -0,0 +1,114 @@
+# fournisseurs/prix.py
+
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, OuterRef, Q, Subquery, Sum
+from .models import CommandeFournisseur, HistoriquePrixAchat, LigneCommande
+
+# --------------------------------------------------
+#  Historique des prix d'achat par (produit, fournisseur) : une ligne par
+#  couple, mise à jour à l'enregistrement des lignes de commande. Les
+#  lignes nouvelles s'ajoutent (min, cumuls, dernier prix) ; une ligne
+#  modifiée ou supprimée fait recalculer son couple depuis LigneCommande.
+#  Les brouillons n'y entrent qu'une fois validés.
+# --------------------------------------------------
+
+
+def enregistrer_achats(lignes) -> None:
+    """
+    Ajoute des lignes nouvellement enregistrées à l'historique : une lecture
+    verrouillée des couples concernés, puis insertions et mises à jour groupées.
+    """
+    lignes = [l for l in lignes if l.commande.statut != CommandeFournisseur.BROUILLON]
+    if not lignes:
+        return
+    produits = {l.produit_id for l in lignes}
+    fournisseurs = {l.commande.fournisseur_id for l in lignes}
+    with transaction.atomic():
+        historiques = {
+            (h.produit_id, h.fournisseur_id): h
+            for h in HistoriquePrixAchat.objects.select_for_update()
+            .filter(produit__in=produits, fournisseur__in=fournisseurs)
+        }
+        existants, nouveaux = list(historiques.values()), []
+        for l in lignes:
+            cle = (l.produit_id, l.commande.fournisseur_id)
+            date = l.commande.date_commande
+            h = historiques.get(cle)
+            if h is None:
+                h = historiques[cle] = HistoriquePrixAchat(
+                    produit_id=cle[0], fournisseur_id=cle[1], dernier_prix=l.prix_achat, dernier_achat=date,
+                    prix_min=l.prix_achat, montant_total=Decimal('0.00'), quantite_totale=0, nb_lignes=0,
+                )
+                nouveaux.append(h)
+            if date >= h.dernier_achat:
+                h.dernier_prix, h.dernier_achat = l.prix_achat, date
+            h.prix_min = min(h.prix_min, l.prix_achat)
+            h.montant_total += l.quantite * l.prix_achat
+            h.quantite_totale += l.quantite
+            h.nb_lignes += 1
+        HistoriquePrixAchat.objects.bulk_create(nouveaux)
+        HistoriquePrixAchat.objects.bulk_update(
+            existants, ['dernier_prix', 'dernier_achat', 'prix_min', 'montant_total', 'quantite_totale', 'nb_lignes']
+        )
+
+
+def recalculer_historique(paires=None) -> int:
+    """
+    Reconstruit l'historique des couples (produit_id, fournisseur_id) donnés,
+    ou de tous, en un agrégat groupé sur LigneCommande. Renvoie le nombre de
+    couples écrits.
+    """
+    lignes = LigneCommande.objects.order_by().exclude(commande__statut=CommandeFournisseur.BROUILLON)
+    anciens = HistoriquePrixAchat.objects.all()
+    if paires is not None:
+        paires = {p for p in paires if None not in p}
+        if not paires:
+            return 0
+        lignes = lignes.filter(reduce(or_, (Q(produit=p, commande__fournisseur=f) for p, f in paires)))
+        anciens = anciens.filter(reduce(or_, (Q(produit=p, fournisseur=f) for p, f in paires)))
+
+    dernier = (LigneCommande.objects.exclude(commande__statut=CommandeFournisseur.BROUILLON)
+               .filter(produit=OuterRef('produit'), commande__fournisseur=OuterRef('commande__fournisseur'))
+               .order_by('-commande__date_commande', '-pk').values('prix_achat')[:1])
+    historiques = [
+        HistoriquePrixAchat(
+            produit_id=r['produit'], fournisseur_id=r['commande__fournisseur'], dernier_prix=r['dernier_prix'],
+            dernier_achat=r['dernier_achat'], prix_min=r['prix_min'], montant_total=r['montant'],
+            quantite_totale=r['quantite'], nb_lignes=r['nb'],
+        )
+        for r in lignes.values('produit', 'commande__fournisseur').annotate(
+            dernier_prix=Subquery(dernier), dernier_achat=Max('commande__date_commande'),
+            prix_min=Min('prix_achat'), montant=Sum(F('quantite') * F('prix_achat')),
+            quantite=Sum('quantite'), nb=Count('pk'),
+        )
+    ]
+    with transaction.atomic():
+        anciens.delete()
+        HistoriquePrixAchat.objects.bulk_create(historiques, batch_size=1000)
+    return len(historiques)
+
+
+def prix_achat(produit_id: int, fournisseur_id: int):
+    """Historique d'un couple (lecture par index unique), ou None."""
+    return HistoriquePrixAchat.objects.filter(produit=produit_id, fournisseur=fournisseur_id).first()
+
+
+def prix_par_fournisseur(produit_id: int) -> list:
+    """Historiques d'un produit chez tous ses fournisseurs, du moins cher au plus cher."""
+    return list(HistoriquePrixAchat.objects.filter(produit=produit_id)
+                .select_related('fournisseur').order_by('dernier_prix', 'fournisseur__nom'))
+
+
+def donnees_prix(h) -> dict:
+    """Chiffres d'un historique pour les réponses JSON."""
+    return {
+        'fournisseur': h.fournisseur_id,
+        'dernier_prix': str(h.dernier_prix),
+        'dernier_achat': h.dernier_achat.isoformat(),
+        'prix_min': str(h.prix_min),
+        'prix_moyen': str(h.prix_moyen),
+        'nb_lignes': h.nb_lignes,
+    }
@@ -0,0 +1,166 @@
+# fournisseurs/reappro.py
+
+from dataclasses import dataclass
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from produits.models import Produit
+from stocks.models import MouvementStock
+from .models import CommandeFournisseur, LigneCommande, ScoreFournisseur
+
+# --------------------------------------------------
+#  Suggestions de réapprovisionnement : demande journalière (moyenne et
+#  écart type) tirée des sorties, point de commande tenant compte du délai
+#  observé du fournisseur (p90 des scores), puis commandes brouillon
+#  regroupées par fournisseur le moins cher récemment. Une requête par
+#  source de données, calculs vectorisés sur tous les produits à la fois.
+# --------------------------------------------------
+HISTORIQUE_JOURS = 90
+PRIX_JOURS       = 180
+COUVERTURE_JOURS = 14      # stock visé au-delà du point de commande
+DELAI_DEFAUT     = 7.0     # fournisseur sans délai mesuré
+Z_SERVICE        = 1.65    # stock de sécurité pour ~95 % de service
+BROUILLON_JOURS  = 14      # au-delà, un brouillon non validé est tenu pour abandonné
+
+STATUTS_OUVERTS = (CommandeFournisseur.EN_ATTENTE, CommandeFournisseur.PARTIEL)
+
+
+@dataclass
+class Suggestion:
+    produit_id: int
+    fournisseur_id: int
+    quantite: int
+    prix_achat: Decimal
+    demande_jour: float
+    point_commande: float
+
+
+def _positions(ids_tries, ids):
+    """Position de chaque id dans le tableau trié ids_tries, -1 si absent."""
+    if not len(ids_tries):
+        return np.full(len(ids), -1, dtype=np.int64)
+    pos = np.minimum(np.searchsorted(ids_tries, ids), len(ids_tries) - 1)
+    return np.where(ids_tries[pos] == ids, pos, -1)
+
+
+def _cumuler(positions, valeurs, n):
+    """Somme des valeurs par position (positions -1 ignorées)."""
+    garde = positions >= 0
+    return np.bincount(positions[garde], weights=valeurs[garde], minlength=n)
+
+
+def calculer_suggestions(historique_jours: int = HISTORIQUE_JOURS, couverture_jours: int = COUVERTURE_JOURS,
+                         delai_defaut: float = DELAI_DEFAUT, z: float = Z_SERVICE, maintenant=None,
+                         brouillon_jours: int = BROUILLON_JOURS) -> list:
+    """
+    Produits dont le stock disponible (stock + quantités en commande, brouillons
+    de moins de `brouillon_jours` compris) est passé sous le point de commande :
+        point = demande × délai + z × écart type × √délai
+        quantité = point + demande × couverture − disponible
+    """
+    maintenant = maintenant or timezone.now()
+    produits = np.array(list(Produit.objects.order_by('pk').values_list('pk', 'stock')), dtype=np.int64).reshape(-1, 2)
+    ids, stock = produits[:, 0], produits[:, 1].astype(float)
+    n = len(ids)
+
+    # sorties par produit et par jour, une requête
+    sorties = np.array(list(
+        MouvementStock.objects.order_by()
+        .filter(type=MouvementStock.SORTIE, date__gte=maintenant - timedelta(days=historique_jours))
+        .values('produit', jour=TruncDate('date')).annotate(q=Sum('quantite'))
+        .values_list('produit', 'q')),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    pos = _positions(ids, sorties[:, 0])
+    q = sorties[:, 1].astype(float)
+    demande = _cumuler(pos, q, n) / historique_jours
+    ecart = np.sqrt(np.maximum(_cumuler(pos, q * q, n) / historique_jours - demande ** 2, 0))
+
+    # quantités encore attendues sur les commandes ouvertes ; un brouillon
+    # ancien jamais validé ne bloque plus le réapprovisionnement
+    ouvertes = Q(commande__statut__in=STATUTS_OUVERTS) | Q(
+        commande__statut=CommandeFournisseur.BROUILLON,
+        commande__date_commande__gte=maintenant - timedelta(days=brouillon_jours),
+    )
+    attendues = np.array(list(
+        LigneCommande.objects.order_by().filter(ouvertes).avec_receptions()
+        .values('produit').annotate(reste=Sum(F('quantite') - F('quantite_recue_annotee')))
+        .values_list('produit', 'reste')),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    disponible = stock + _cumuler(_positions(ids, attendues[:, 0]), attendues[:, 1].astype(float), n)
+
+    # fournisseur le moins cher (puis le plus récent) par produit
+    lignes = list(
+        LigneCommande.objects.order_by()
+        .filter(commande__date_commande__gte=maintenant - timedelta(days=PRIX_JOURS),
+                commande__fournisseur__actif=True)
+        .exclude(commande__statut=CommandeFournisseur.BROUILLON)
+        .values_list('produit', 'commande__fournisseur', 'prix_achat', 'commande__date_commande')
+    )
+    fournisseur = np.full(n, -1, dtype=np.int64)
+    prix = np.zeros(n, dtype=object)
+    if lignes:
+        l_produit = np.array([l[0] for l in lignes], dtype=np.int64)
+        l_prix = np.array([float(l[2]) for l in lignes])
+        l_date = np.array([l[3].timestamp() for l in lignes])
+        ordre = np.lexsort((-l_date, l_prix, l_produit))
+        _, premiers = np.unique(l_produit[ordre], return_index=True)
+        retenues = ordre[premiers]
+        pos = _positions(ids, l_produit[retenues])
+        garde = pos >= 0
+        fournisseur[pos[garde]] = [lignes[i][1] for i in retenues[garde]]
+        prix[pos[garde]] = [lignes[i][2] for i in retenues[garde]]
+
+    # délai observé du fournisseur retenu
+    delais = dict(ScoreFournisseur.objects.filter(delai_p90__isnull=False).values_list('fournisseur', 'delai_p90'))
+    uniques, inverse = np.unique(fournisseur, return_inverse=True)
+    delai = np.array([delais.get(f, delai_defaut) for f in uniques.tolist()], dtype=float)[inverse.ravel()]
+
+    point = demande * delai + z * ecart * np.sqrt(delai)
+    quantite = np.ceil(point + demande * couverture_jours - disponible)
+    a_commander = np.flatnonzero((fournisseur >= 0) & (demande > 0) & (disponible <= point) & (quantite > 0))
+
+    return [
+        Suggestion(produit_id=int(ids[i]), fournisseur_id=int(fournisseur[i]), quantite=int(quantite[i]),
+                   prix_achat=prix[i], demande_jour=round(float(demande[i]), 3),
+                   point_commande=round(float(point[i]), 1))
+        for i in a_commander
+    ]
+
+
+def creer_brouillons(suggestions: list) -> list:
+    """
+    Une commande brouillon par fournisseur, lignes comprises, en insertions
+    groupées. Les brouillons ne comptent dans le solde qu'une fois validés.
+    """
+    par_fournisseur = {}
+    for s in suggestions:
+        par_fournisseur.setdefault(s.fournisseur_id, []).append(s)
+    if not par_fournisseur:
+        return []
+
+    with transaction.atomic():
+        commandes = CommandeFournisseur.objects.bulk_create([
+            CommandeFournisseur(
+                fournisseur_id=fid, statut=CommandeFournisseur.BROUILLON,
+                montant_total=sum((s.quantite * s.prix_achat for s in lignes), Decimal('0.00')),
+            )
+            for fid, lignes in par_fournisseur.items()
+        ])
+        LigneCommande.objects.bulk_create([
+            LigneCommande(commande=cmd, produit_id=s.produit_id, quantite=s.quantite, prix_achat=s.prix_achat)
+            for cmd, lignes in zip(commandes, par_fournisseur.values())
+            for s in lignes
+        ], batch_size=1000)
+    return commandes
+
+
+def suggerer_reappro(**parametres) -> list:
+    """Calcule les suggestions et crée les commandes brouillon correspondantes."""
+    return creer_brouillons(calculer_suggestions(**parametres))
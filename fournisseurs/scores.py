@@ -0,0 +1,119 @@
+# fournisseurs/scores.py
+
+import math
+from datetime import timedelta
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Count, Exists, F, Min, OuterRef, Sum
+from django.db.models.functions import Least
+from django.utils import timezone
+from .models import CommandeFournisseur, Fournisseur, LigneCommande, ReceptionAppro, ScoreFournisseur
+
+# --------------------------------------------------
+#  Scores fournisseurs : délais de livraison (commande -> première
+#  réception), taux de service, livraisons partielles et dépense, sur les
+#  commandes passées dans une fenêtre glissante. Calculés en trois requêtes
+#  groupées pour tous les fournisseurs à la fois et stockés dans
+#  ScoreFournisseur ; les pages ne lisent que cette table.
+# --------------------------------------------------
+FENETRE_JOURS = 365
+
+
+def _p90(valeurs: list):
+    """90e centile (rang le plus proche) d'une liste non vide."""
+    valeurs = sorted(valeurs)
+    return valeurs[math.ceil(0.9 * len(valeurs)) - 1]
+
+
+def calculer_scores(fournisseurs=None, fenetre_jours: int = FENETRE_JOURS, maintenant=None) -> list:
+    """
+    ScoreFournisseur (non enregistrés) de tous les fournisseurs, ou des ids
+    donnés. Un fournisseur sans commande livrée sur la fenêtre a des
+    indicateurs vides et sa seule dépense.
+    """
+    maintenant = maintenant or timezone.now()
+    commandes = CommandeFournisseur.objects.order_by().filter(
+        date_commande__gte=maintenant - timedelta(days=fenetre_jours)
+    ).exclude(statut=CommandeFournisseur.BROUILLON)
+    ids = Fournisseur.objects.values_list('pk', flat=True)
+    if fournisseurs is not None:
+        commandes = commandes.filter(fournisseur__in=fournisseurs)
+        ids = ids.filter(pk__in=fournisseurs)
+
+    # une ligne par commande livrée : première réception et nombre de réceptions
+    livrees = {}
+    for c in (commandes.values('pk', 'fournisseur', 'date_commande', 'statut')
+              .annotate(premiere=Min('receptions__date_reception'), nb_receptions=Count('receptions'))
+              .filter(premiere__isnull=False)):
+        livrees.setdefault(c['fournisseur'], []).append(c)
+
+    # quantités commandées et reçues (plafonnées à la ligne) des commandes livrées
+    quantites = {
+        q['commande__fournisseur']: q for q in (
+            LigneCommande.objects.order_by()
+            .filter(commande__in=commandes.filter(Exists(ReceptionAppro.objects.filter(commande=OuterRef('pk')))))
+            .avec_receptions()
+            .values('commande__fournisseur')
+            .annotate(commandee=Sum('quantite'), recue=Sum(Least(F('quantite'), F('quantite_recue_annotee'))))
+        )
+    }
+
+    depenses = dict(commandes.values('fournisseur').annotate(total=Sum('montant_total'))
+                    .values_list('fournisseur', 'total'))
+
+    scores = []
+    for pk in ids:
+        score = ScoreFournisseur(fournisseur_id=pk, depense=depenses.get(pk) or Decimal('0.00'),
+                                 calcule_le=maintenant)
+        cmds = livrees.get(pk)
+        if cmds:
+            delais = [(c['premiere'] - c['date_commande']).total_seconds() / 86400 for c in cmds]
+            partielles = sum(1 for c in cmds if c['nb_receptions'] > 1 or c['statut'] != CommandeFournisseur.RECEP)
+            score.nb_commandes = len(cmds)
+            score.delai_moyen = round(sum(delais) / len(delais), 2)
+            score.delai_p90 = round(_p90(delais), 2)
+            score.taux_partielles = round(partielles / len(cmds), 4)
+            q = quantites.get(pk)
+            if q and q['commandee']:
+                score.taux_service = round(q['recue'] / q['commandee'], 4)
+        scores.append(score)
+    return scores
+
+
+def rafraichir_scores(fournisseurs=None, fenetre_jours: int = FENETRE_JOURS) -> int:
+    """Recalcule et enregistre les scores ; renvoie le nombre de scores écrits."""
+    scores = calculer_scores(fournisseurs, fenetre_jours)
+    anciens = ScoreFournisseur.objects.all()
+    if fournisseurs is not None:
+        anciens = anciens.filter(pk__in=fournisseurs)
+    with transaction.atomic():
+        anciens.delete()
+        ScoreFournisseur.objects.bulk_create(scores)
+    return len(scores)
+
+
+def fournisseurs_modifies() -> set:
+    """
+    Fournisseurs dont le score est absent ou antérieur à leur dernière
+    commande ou réception.
+    """
+    ids = set(Fournisseur.objects.filter(score__isnull=True).values_list('pk', flat=True))
+    ids.update(CommandeFournisseur.objects.order_by()
+               .filter(date_commande__gt=F('fournisseur__score__calcule_le'))
+               .values_list('fournisseur', flat=True).distinct())
+    ids.update(ReceptionAppro.objects.order_by()
+               .filter(date_reception__gt=F('commande__fournisseur__score__calcule_le'))
+               .values_list('commande__fournisseur', flat=True).distinct())
+    return ids
+
+
+def rafraichir_scores_modifies(fenetre_jours: int = FENETRE_JOURS) -> int:
+    """
+    Rafraîchissement incrémental : seuls les fournisseurs ayant eu de
+    l'activité depuis leur dernier calcul sont recalculés. Un calcul complet
+    périodique fait en plus glisser la fenêtre pour les fournisseurs inactifs.
+    """
+    ids = fournisseurs_modifies()
+    if not ids:
+        return 0
+    return rafraichir_scores(ids, fenetre_jours)
@@ -1,24 +1,145 @@
 from decimal import Decimal
-from django.db.models import Sum, F
-from .models import CommandeFournisseur, PaiementFournisseur
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from stocks.models import MouvementStock
+from stocks.services import enregistrer_mouvements
+from .models import CommandeFournisseur, FournisseurSolde, LigneCommande, PaiementFournisseur, ReceptionAppro
+from .prix import enregistrer_achats, recalculer_historique
+from .soldes import ajuster_commande, reconstruire_soldes
 
 def recalc_commande_total(cmd: CommandeFournisseur):
-    """Recalcule le montant total d'une commande"""
-    total = sum(
-        ligne.quantite * ligne.prix_achat
-        for ligne in cmd.lignes.all()
-    ) or Decimal('0.00')
-    cmd.montant_total = total
-    cmd.save(update_fields=['montant_total'])
+    """Recalcule le montant total d'une commande (un UPDATE avec agrégat SQL)"""
+    montant = DecimalField(max_digits=12, decimal_places=2)
+    total = (LigneCommande.objects.filter(commande=OuterRef('pk')).order_by()
+             .values('commande')
+             .annotate(total=Sum(F('quantite') * F('prix_achat'), output_field=montant))
+             .values('total'))
+    with transaction.atomic():
+        fournisseur_id, statut, ancien = (CommandeFournisseur.objects.select_for_update().filter(pk=cmd.pk)
+                                          .values_list('fournisseur_id', 'statut', 'montant_total').get())
+        CommandeFournisseur.objects.filter(pk=cmd.pk).update(
+            montant_total=Coalesce(Subquery(total, output_field=montant), Value(Decimal('0.00')), output_field=montant)
+        )
+        cmd.refresh_from_db(fields=['montant_total'])
+        ajuster_commande(fournisseur_id, avant=(statut, ancien), apres=(statut, cmd.montant_total))
+
+def enregistrer_lignes_commande(formset):
+    """
+    Enregistre un CommandeLigneFormSet validé en bloc : un DELETE pour les
+    lignes supprimées, un bulk_update, un bulk_create, puis un seul recalcul
+    du total (au lieu d'un recalcul par ligne via LigneCommande.save).
+    Les doublons de produit ont déjà été refusés en mémoire par le formset.
+    L'historique des prix reçoit les nouvelles lignes ; les couples des
+    lignes modifiées sont recalculés (ceux des lignes supprimées le sont par
+    le signal post_delete de LigneCommande).
+    """
+    lignes = formset.save(commit=False)
+    supprimees = [l.pk for l in formset.deleted_objects if l.pk]
+    if supprimees:
+        LigneCommande.objects.filter(pk__in=supprimees).delete()
+    nouvelles, modifiees = [], []
+    for ligne in lignes:
+        ligne.commande = formset.instance
+        (modifiees if ligne.pk else nouvelles).append(ligne)
+    LigneCommande.objects.bulk_update(modifiees, ['produit', 'quantite', 'prix_achat'])
+    LigneCommande.objects.bulk_create(nouvelles)
+    recalc_commande_total(formset.instance)
+
+    enregistrer_achats(nouvelles)
+    # produits touchés : actuels et initiaux (un produit remplacé quitte son couple)
+    touches = {l.produit_id for l in modifiees}
+    touches |= {f.initial.get('produit') for f in formset.initial_forms if f.has_changed()}
+    if touches:
+        fournisseur_id = formset.instance.fournisseur_id
+        recalculer_historique({(produit_id, fournisseur_id) for produit_id in touches})
+
+def receptionner_commande(commande: CommandeFournisseur, lignes) -> list:
+    """
+    Réception groupée d'une commande. lignes : itérable de
+    (produit, quantite_livree, reference).
+    - quantités commandées et déjà reçues par produit lues en une requête,
+      toutes les lignes sont contrôlées contre cette table (sommes par produit)
+    - réceptions et mouvements ENTREE (valorisés au prix d'achat) créés en bloc,
+      stock ajusté en un seul UPDATE groupé
+    - statut de la commande recalculé une fois
+    Lève une ValidationError (liste des erreurs) sans rien enregistrer.
+    """
+    with transaction.atomic():
+        # verrouille la commande : deux réceptions simultanées ne peuvent pas
+        # dépasser ensemble la quantité commandée
+        statut = CommandeFournisseur.objects.select_for_update().filter(pk=commande.pk).values_list('statut', flat=True).get()
+        if statut == CommandeFournisseur.BROUILLON:
+            raise ValidationError("Commande en brouillon : à valider avant réception")
+        table = {
+            produit_id: [quantite, recue, prix_achat]
+            for produit_id, quantite, recue, prix_achat in
+            commande.lignes.order_by().avec_receptions()
+            .values_list('produit_id', 'quantite', 'quantite_recue_annotee', 'prix_achat')
+        }
+
+        erreurs, receptions = [], []
+        for produit, quantite_livree, reference in lignes:
+            produit_id = getattr(produit, 'pk', produit)
+            if quantite_livree <= 0:
+                erreurs.append(f"Produit #{produit_id} : la quantité livrée doit être supérieure à 0")
+                continue
+            ligne = table.get(produit_id)
+            if ligne is None:
+                erreurs.append(f"Produit #{produit_id} : ce produit n'est pas dans la commande d'origine")
+                continue
+            ligne[1] += quantite_livree
+            receptions.append(ReceptionAppro(
+                commande=commande, produit_id=produit_id, quantite_commandee=ligne[0],
+                quantite_livree=quantite_livree, reference=reference or '',
+            ))
+        for produit_id, (quantite, recue, _) in table.items():
+            if recue > quantite:
+                erreurs.append(
+                    f"Produit #{produit_id} : la quantité totale reçue ({recue}) "
+                    f"ne peut pas dépasser la quantité commandée ({quantite})"
+                )
+        if erreurs:
+            raise ValidationError(erreurs)
+        if not receptions:
+            return []
+
+        ReceptionAppro.objects.bulk_create(receptions)
+        enregistrer_mouvements([
+            MouvementStock(
+                produit_id=r.produit_id, type=MouvementStock.ENTREE, quantite=r.quantite_livree,
+                reference=f"Réception #{r.pk} (Cmd #{commande.pk})",
+                source_type=MouvementStock.RECEPTION, source_id=r.pk,
+                cout_unitaire=table[r.produit_id][2],
+            )
+            for r in receptions
+        ])
+        commande.update_statut()
+    return receptions
+
+def valider_brouillon(commande: CommandeFournisseur) -> None:
+    """Passe une commande brouillon en attente ; son montant entre alors dans le solde."""
+    if commande.statut != CommandeFournisseur.BROUILLON:
+        raise ValidationError("Cette commande n'est pas un brouillon")
+    commande.statut = CommandeFournisseur.EN_ATTENTE
+    with transaction.atomic():
+        commande.save(update_fields=['statut'])
+        lignes = list(commande.lignes.all())
+        for ligne in lignes:
+            ligne.commande = commande
+        enregistrer_achats(lignes)
 
 def process_paiement(commande: CommandeFournisseur, montant: Decimal) -> PaiementFournisseur:
     """
     Traite un paiement pour une commande
     Retourne le paiement créé
-    Lève une ValidationError si le montant est invalide
+    Lève une ValidationError si le montant est invalide ou si la commande est un brouillon
     """
-    from django.core.exceptions import ValidationError
-    
+    # un brouillon n'est pas encore dû au fournisseur
+    if commande.statut == CommandeFournisseur.BROUILLON:
+        raise ValidationError("Commande en brouillon : à valider avant paiement")
+
     # Vérifier que le montant est positif
     if montant <= 0:
         raise ValidationError("Le montant du paiement doit être supérieur à 0")
@@ -38,25 +159,20 @@ def process_paiement(commande: CommandeFournisseur, montant: Decimal) -> Paiemen
 
 def get_fournisseur_stats(fournisseur_id: int) -> dict:
     """
-    Retourne des statistiques pour un fournisseur
+    Retourne des statistiques pour un fournisseur (lues dans son solde)
     """
     from .models import Fournisseur
-    fournisseur = Fournisseur.objects.get(pk=fournisseur_id)
-    
-    commandes = fournisseur.commandes.all()
-    commandes_stats = commandes.aggregate(
-        total_commandes=Sum('montant_total'),
-        total_paye=Sum('paiements__montant'),
-        nb_commandes=Count('id'),
-        nb_commandes_en_cours=Count('id', filter=~Q(statut=CommandeFournisseur.RECEP))
-    )
-    
+    fournisseur = Fournisseur.objects.select_related('solde').get(pk=fournisseur_id)
+    solde = fournisseur._solde()
+    if solde is None:
+        reconstruire_soldes([fournisseur_id])
+        solde = FournisseurSolde.objects.get(pk=fournisseur_id)
+
     return {
         'fournisseur': fournisseur,
-        'total_commandes': commandes_stats['total_commandes'] or Decimal('0.00'),
-        'total_paye': commandes_stats['total_paye'] or Decimal('0.00'),
-        'reste_a_payer': (commandes_stats['total_commandes'] or Decimal('0.00')) - 
-                        (commandes_stats['total_paye'] or Decimal('0.00')),
-        'nb_commandes': commandes_stats['nb_commandes'],
-        'nb_commandes_en_cours': commandes_stats['nb_commandes_en_cours']
+        'total_commandes': solde.total_commandes,
+        'total_paye': solde.total_paye,
+        'reste_a_payer': solde.reste_a_payer,
+        'nb_commandes': solde.nb_commandes,
+        'nb_commandes_en_cours': solde.nb_commandes_en_cours,
     }
@@ -0,0 +1,91 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .models import CommandeFournisseur, Fournisseur, FournisseurSolde, LigneCommande, PaiementFournisseur
+from .prix import recalculer_historique
+from .soldes import ajuster_commande, ajuster_solde
+
+
+@receiver(post_save, sender=Fournisseur)
+def creer_solde(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        FournisseurSolde.objects.get_or_create(fournisseur=instance)
+
+
+@receiver(pre_save, sender=CommandeFournisseur)
+@receiver(pre_save, sender=PaiementFournisseur)
+def memoriser_avant(sender, instance, raw=False, **kwargs):
+    # valeurs en base avant une modification : le solde reçoit la différence
+    instance._avant_solde = None
+    if not raw and not instance._state.adding:
+        champs = ('fournisseur_id', 'montant_total', 'statut') if sender is CommandeFournisseur \
+            else ('commande__fournisseur_id', 'montant')
+        instance._avant_solde = sender.objects.filter(pk=instance.pk).values_list(*champs).first()
+
+
+@receiver(post_save, sender=CommandeFournisseur)
+def solde_commande(sender, instance, created, raw=False, **kwargs):
+    avant = getattr(instance, '_avant_solde', None)
+    if raw or not (created or avant):
+        return
+    apres = (instance.statut, instance.montant_total)
+    if created:
+        ajuster_commande(instance.fournisseur_id, apres=apres)
+        return
+    fournisseur_id, montant, statut = avant
+    if fournisseur_id == instance.fournisseur_id:
+        ajuster_commande(fournisseur_id, avant=(statut, montant), apres=apres)
+        return
+    # commande transférée à un autre fournisseur : ses paiements et ses prix la suivent
+    paye = instance.total_paye
+    ajuster_commande(fournisseur_id, avant=(statut, montant), paye=-paye)
+    ajuster_commande(instance.fournisseur_id, apres=apres, paye=paye)
+    produits = list(instance.lignes.values_list('produit_id', flat=True))
+    recalculer_historique({(p, f) for p in produits for f in (fournisseur_id, instance.fournisseur_id)})
+
+
+@receiver(pre_delete, sender=CommandeFournisseur)
+def memoriser_produits(sender, instance, **kwargs):
+    # lignes supprimées en cascade : couples à recalculer après suppression
+    instance._produits_lignes = list(instance.lignes.values_list('produit_id', flat=True))
+
+
+@receiver(post_delete, sender=CommandeFournisseur)
+def solde_commande_supprimee(sender, instance, **kwargs):
+    # les paiements supprimés en cascade sont déduits par solde_paiement_supprime
+    ajuster_commande(instance.fournisseur_id, avant=(instance.statut, instance.montant_total))
+    recalculer_historique({(p, instance.fournisseur_id) for p in getattr(instance, '_produits_lignes', ())})
+
+
+@receiver(post_delete, sender=LigneCommande)
+def historique_ligne_supprimee(sender, instance, origin=None, **kwargs):
+    # suppression en cascade d'une commande : recalculée par solde_commande_supprimee
+    if isinstance(origin, CommandeFournisseur) or getattr(origin, 'model', None) is CommandeFournisseur:
+        return
+    fournisseur_id = (CommandeFournisseur.objects.filter(pk=instance.commande_id)
+                      .values_list('fournisseur_id', flat=True).first())
+    if fournisseur_id is not None:
+        recalculer_historique({(instance.produit_id, fournisseur_id)})
+
+
+@receiver(post_save, sender=PaiementFournisseur)
+def solde_paiement(sender, instance, created, raw=False, **kwargs):
+    avant = getattr(instance, '_avant_solde', None)
+    if raw or not (created or avant):
+        return
+    fournisseur_id = instance.commande.fournisseur_id
+    if created:
+        ajuster_solde(fournisseur_id, paye=instance.montant)
+    elif avant[0] == fournisseur_id:
+        ajuster_solde(fournisseur_id, paye=instance.montant - avant[1])
+    else:
+        ajuster_solde(avant[0], paye=-avant[1])
+        ajuster_solde(fournisseur_id, paye=instance.montant)
+
+
+@receiver(post_delete, sender=PaiementFournisseur)
+def solde_paiement_supprime(sender, instance, **kwargs):
+    fournisseur_id = (CommandeFournisseur.objects.filter(pk=instance.commande_id)
+                      .values_list('fournisseur_id', flat=True).first())
+    if fournisseur_id is not None:
+        ajuster_solde(fournisseur_id, paye=-instance.montant)
@@ -0,0 +1,98 @@
+# fournisseurs/soldes.py
+
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+from .models import CommandeFournisseur, Fournisseur, FournisseurSolde, PaiementFournisseur
+
+# --------------------------------------------------
+#  Soldes fournisseurs, incrémentaux : chaque écriture (commande, montant,
+#  statut, paiement) applique sa variation à la ligne FournisseurSolde du
+#  fournisseur, dans la même transaction. Listes et fiches lisent cette
+#  ligne au lieu d'agréger commandes et paiements.
+# --------------------------------------------------
+
+
+def ajuster_solde(fournisseur_id: int, montant=0, paye=0, commandes: int = 0, en_cours: int = 0) -> None:
+    """
+    Applique des variations au solde d'un fournisseur en un seul UPDATE.
+    À appeler après l'écriture, dans sa transaction : un solde absent
+    (fournisseur antérieur au registre) est reconstruit depuis les
+    commandes, écriture comprise.
+    """
+    montant, paye = Decimal(montant), Decimal(paye)
+    if not (montant or paye or commandes or en_cours):
+        return
+    maj = FournisseurSolde.objects.filter(pk=fournisseur_id).update(
+        total_commandes=F('total_commandes') + montant,
+        total_paye=F('total_paye') + paye,
+        reste_a_payer=F('reste_a_payer') + (montant - paye),
+        nb_commandes=F('nb_commandes') + commandes,
+        nb_commandes_en_cours=F('nb_commandes_en_cours') + en_cours,
+        maj_le=timezone.now(),
+    )
+    if not maj:
+        reconstruire_soldes([fournisseur_id])
+
+
+def part_commande(statut: str, montant) -> tuple:
+    """(montant, commandes, en cours) d'une commande dans le solde ; un brouillon ne compte pas."""
+    if statut == CommandeFournisseur.BROUILLON:
+        return Decimal('0'), 0, 0
+    return montant, 1, int(statut != CommandeFournisseur.RECEP)
+
+
+def ajuster_commande(fournisseur_id: int, avant=None, apres=None, paye=0) -> None:
+    """
+    Reporte sur le solde le passage d'une commande de l'état avant à l'état
+    apres, chacun (statut, montant_total) ou None (commande absente).
+    """
+    a = part_commande(*avant) if avant else (Decimal('0'), 0, 0)
+    b = part_commande(*apres) if apres else (Decimal('0'), 0, 0)
+    ajuster_solde(fournisseur_id, montant=b[0] - a[0], paye=paye, commandes=b[1] - a[1], en_cours=b[2] - a[2])
+
+
+def reconstruire_soldes(fournisseurs=None) -> int:
+    """
+    Recalcule les soldes (de tous les fournisseurs, ou des ids donnés) en
+    deux agrégats groupés : commandes par fournisseur (hors brouillons),
+    paiements par fournisseur. Pas de jointure commandes × paiements.
+    Renvoie le nombre de soldes écrits.
+    """
+    ids = Fournisseur.objects.values_list('pk', flat=True)
+    commandes = CommandeFournisseur.objects.order_by().exclude(statut=CommandeFournisseur.BROUILLON)
+    paiements = PaiementFournisseur.objects.order_by()
+    if fournisseurs is not None:
+        ids = ids.filter(pk__in=fournisseurs)
+        commandes = commandes.filter(fournisseur__in=fournisseurs)
+        paiements = paiements.filter(commande__fournisseur__in=fournisseurs)
+
+    par_commandes = {
+        c['fournisseur']: c for c in commandes.values('fournisseur').annotate(
+            total=Sum('montant_total'),
+            nb=Count('pk'),
+            en_cours=Count('pk', filter=~Q(statut=CommandeFournisseur.RECEP)),
+        )
+    }
+    par_paiements = dict(
+        paiements.values('commande__fournisseur').annotate(total=Sum('montant'))
+        .values_list('commande__fournisseur', 'total')
+    )
+
+    soldes = []
+    for pk in ids:
+        c = par_commandes.get(pk, {})
+        total = c.get('total') or Decimal('0.00')
+        paye = par_paiements.get(pk) or Decimal('0.00')
+        soldes.append(FournisseurSolde(
+            fournisseur_id=pk, total_commandes=total, total_paye=paye, reste_a_payer=total - paye,
+            nb_commandes=c.get('nb', 0), nb_commandes_en_cours=c.get('en_cours', 0),
+        ))
+    anciens = FournisseurSolde.objects.all()
+    if fournisseurs is not None:
+        anciens = anciens.filter(pk__in=fournisseurs)
+    with transaction.atomic():
+        anciens.delete()
+        FournisseurSolde.objects.bulk_create(soldes)
+    return len(soldes)
@@ -1,9 +1,27 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import skipUnless
+from django.core.management import call_command
 from django.test import TestCase
+from django.utils import timezone
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 from django.core.exceptions import ValidationError
 from decimal import Decimal
-from .models import Fournisseur, CommandeFournisseur, LigneCommande, ReceptionAppro, PaiementFournisseur
+from .models import Fournisseur, FournisseurSolde, HistoriquePrixAchat, CommandeFournisseur, LigneCommande, ReceptionAppro, PaiementFournisseur
+from .forms import ReceptionApproForm
+from .prix import prix_achat, recalculer_historique
+from .scores import calculer_scores, fournisseurs_modifies, rafraichir_scores
+from .soldes import reconstruire_soldes
 from produits.models import Produit
-from .services import recalc_commande_total, process_paiement, get_fournisseur_stats
+from stocks.models import MouvementStock
+from .services import recalc_commande_total, process_paiement, get_fournisseur_stats, receptionner_commande
+
+try:
+    import numpy
+except ImportError:  # moteur de réapprovisionnement optionnel
+    numpy = None
 
 class FournisseurTests(TestCase):
     def setUp(self):
@@ -68,6 +86,14 @@ class CommandeTests(TestCase):
         with self.assertRaises(ValidationError):
             process_paiement(self.commande, Decimal('30.00'))
 
+    def test_paiement_refuse_sur_brouillon(self):
+        CommandeFournisseur.objects.filter(pk=self.commande.pk).update(statut=CommandeFournisseur.BROUILLON)
+        self.commande.refresh_from_db()
+        with self.assertRaises(ValidationError):
+            process_paiement(self.commande, Decimal('10.00'))
+        self.client.post(reverse('fournisseurs:commande_paiement', args=[self.commande.pk]), {'montant': '10.00'})
+        self.assertFalse(self.commande.paiements.exists())
+
 class StatsTests(TestCase):
     def setUp(self):
         self.fournisseur = Fournisseur.objects.create(nom="Test Fournisseur")
@@ -91,3 +117,422 @@ class StatsTests(TestCase):
         self.assertEqual(stats['total_paye'], Decimal('0.00'))
         self.assertEqual(stats['nb_commandes'], 1)
         self.assertEqual(stats['nb_commandes_en_cours'], 1)
+
+
+class CommandeTotauxTests(TestCase):
+    def setUp(self):
+        self.fournisseur = Fournisseur.objects.create(nom="Test Fournisseur")
+        self.produit = Produit.objects.create(nom="Test Produit", code="TP", prix_vente=Decimal('10.00'))
+        for i in range(3):
+            commande = CommandeFournisseur.objects.create(fournisseur=self.fournisseur)
+            LigneCommande.objects.create(commande=commande, produit=self.produit, quantite=5, prix_achat=Decimal('8.00'))
+            ReceptionAppro.objects.create(commande=commande, produit=self.produit, quantite_livree=2)
+            ReceptionAppro.objects.create(commande=commande, produit=self.produit, quantite_livree=1)
+            process_paiement(commande, Decimal('10.00'))
+            process_paiement(commande, Decimal('5.00'))
+
+    def test_annotations_identiques_aux_proprietes(self):
+        for commande in CommandeFournisseur.objects.avec_totaux():
+            brute = CommandeFournisseur.objects.get(pk=commande.pk)
+            self.assertEqual(commande.total_paye, brute.total_paye)
+            self.assertEqual(commande.reste_a_payer, brute.reste_a_payer)
+            self.assertEqual(commande.total_recu, brute.total_recu)
+        self.assertEqual((commande.total_paye, commande.reste_a_payer, commande.total_recu),
+                         (Decimal('15.00'), Decimal('25.00'), 3))
+
+    def test_liste_requetes_constantes(self):
+        # count de pagination, page de commandes annotées, context processor des alertes
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('fournisseurs:commandes'))
+        self.assertContains(response, "15.00 €", count=3)
+
+
+class LignesCommandeFormsetTests(TestCase):
+    def setUp(self):
+        self.fournisseur = Fournisseur.objects.create(nom="Test Fournisseur")
+        self.produits = [Produit.objects.create(nom=f"P{i}", code=f"P{i}", prix_vente=Decimal('10.00'))
+                         for i in range(30)]
+
+    def donnees(self, produits, initiales=()):
+        data = {'fournisseur': self.fournisseur.pk,
+                'lignes-TOTAL_FORMS': len(initiales) + len(produits), 'lignes-INITIAL_FORMS': len(initiales),
+                'lignes-MIN_NUM_FORMS': 0, 'lignes-MAX_NUM_FORMS': 1000}
+        for i, ligne in enumerate(initiales):
+            data.update({f'lignes-{i}-id': ligne.pk, f'lignes-{i}-produit': ligne.produit_id,
+                         f'lignes-{i}-quantite': ligne.quantite, f'lignes-{i}-prix_achat': ligne.prix_achat})
+        for i, produit in enumerate(produits, start=len(initiales)):
+            data.update({f'lignes-{i}-produit': produit.pk, f'lignes-{i}-quantite': 2,
+                         f'lignes-{i}-prix_achat': '3.00'})
+        return data
+
+    def creer(self, produits):
+        with CaptureQueriesContext(connection) as requetes:
+            self.client.post(reverse('fournisseurs:commande_create'), self.donnees(produits))
+        return len(requetes)
+
+    def test_requetes_independantes_du_nombre_de_lignes(self):
+        self.assertEqual(self.creer(self.produits[:2]), self.creer(self.produits[2:30]))
+        commande = CommandeFournisseur.objects.latest('pk')
+        self.assertEqual(commande.lignes.count(), 28)
+        self.assertEqual(commande.montant_total, Decimal('168.00'))
+
+    def test_doublon_refuse_en_memoire(self):
+        self.client.post(reverse('fournisseurs:commande_create'), self.donnees([self.produits[0], self.produits[0]]))
+        self.assertFalse(LigneCommande.objects.exists())
+
+    def test_modification(self):
+        self.creer(self.produits[:3])
+        commande = CommandeFournisseur.objects.get()
+        initiales = list(commande.lignes.order_by('pk'))
+        data = self.donnees([self.produits[3]], initiales)
+        data['lignes-0-quantite'] = 10
+        data['lignes-1-DELETE'] = 'on'
+        self.client.post(reverse('fournisseurs:commande_update', args=[commande.pk]), data)
+        commande.refresh_from_db()
+        self.assertEqual(commande.lignes.count(), 3)
+        # 10*3 + 2*3 + 2*3
+        self.assertEqual(commande.montant_total, Decimal('42.00'))
+
+
+class CommandeDetailTests(TestCase):
+    def setUp(self):
+        self.fournisseur = Fournisseur.objects.create(nom="Test Fournisseur")
+        self.commande = CommandeFournisseur.objects.create(fournisseur=self.fournisseur)
+
+    def ajouter_lignes(self, n, debut=0):
+        for i in range(debut, debut + n):
+            produit = Produit.objects.create(nom=f"P{i}", code=f"P{i}", prix_vente=Decimal('10.00'))
+            LigneCommande.objects.create(commande=self.commande, produit=produit, quantite=4, prix_achat=Decimal('2.00'))
+            ReceptionAppro.objects.create(commande=self.commande, produit=produit, quantite_livree=1)
+            ReceptionAppro.objects.create(commande=self.commande, produit=produit, quantite_livree=2)
+
+    def afficher(self):
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.get(reverse('fournisseurs:commande_detail', args=[self.commande.pk]))
+        return response, len(requetes)
+
+    def test_requetes_independantes_du_nombre_de_lignes(self):
+        self.ajouter_lignes(2)
+        _, avant = self.afficher()
+        self.ajouter_lignes(20, debut=2)
+        response, apres = self.afficher()
+        self.assertEqual(avant, apres)
+        ligne = response.context['lignes'][0]
+        self.assertEqual((ligne.quantite_recue, ligne.reste_a_livrer), (3, 1))
+
+    def test_statut_en_une_requete(self):
+        self.ajouter_lignes(3)
+        self.assertEqual(self.commande.statut, CommandeFournisseur.PARTIEL)
+        with self.assertNumQueries(2):    # totaux + UPDATE du statut
+            self.commande.update_statut()
+
+
+class ReceptionGroupeeTests(TestCase):
+    def setUp(self):
+        self.fournisseur = Fournisseur.objects.create(nom="Test Fournisseur")
+        self.commande = CommandeFournisseur.objects.create(fournisseur=self.fournisseur)
+        self.produits = []
+        for i in range(30):
+            produit = Produit.objects.create(nom=f"P{i}", code=f"P{i}", prix_vente=Decimal('10.00'))
+            LigneCommande.objects.create(commande=self.commande, produit=produit, quantite=5, prix_achat=Decimal('4.00'))
+            self.produits.append(produit)
+
+    def poster(self, quantites):
+        data = {'receptions-TOTAL_FORMS': len(self.produits), 'receptions-INITIAL_FORMS': 0,
+                'receptions-MIN_NUM_FORMS': 0, 'receptions-MAX_NUM_FORMS': 1000}
+        # même ordre que les lignes affichées par le formulaire
+        for i, produit_id in enumerate(self.commande.lignes.values_list('produit_id', flat=True)):
+            data[f'receptions-{i}-produit'] = produit_id
+            if i < len(quantites) and quantites[i]:
+                data[f'receptions-{i}-quantite_livree'] = quantites[i]
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.post(reverse('fournisseurs:reception_commande', args=[self.commande.pk]), data)
+        return response, len(requetes)
+
+    def test_requetes_independantes_du_nombre_de_lignes(self):
+        _, peu = self.poster([1, 1])
+        # produits distincts : même chemin de valorisation (créations seules)
+        _, beaucoup = self.poster([None, None] + [1] * 28)
+        self.assertEqual(peu, beaucoup)
+        self.commande.refresh_from_db()
+        self.assertEqual(self.commande.statut, CommandeFournisseur.PARTIEL)
+        self.assertEqual(Produit.objects.filter(stock=1).count(), 30)
+        mouvement = MouvementStock.objects.filter(source_type=MouvementStock.RECEPTION).latest('pk')
+        self.assertEqual(mouvement.cout_unitaire, Decimal('4.00'))
+
+    def test_reception_complete(self):
+        response, _ = self.poster([5] * 30)
+        self.assertRedirects(response, reverse('fournisseurs:receptions'))
+        self.commande.refresh_from_db()
+        self.assertEqual(self.commande.statut, CommandeFournisseur.RECEP)
+
+    def test_depassement_refuse_sans_rien_enregistrer(self):
+        receptionner_commande(self.commande, [(self.produits[0], 4, '')])
+        with self.assertRaises(ValidationError):
+            # deux lignes du même produit : 4 + 1 + 1 > 5
+            receptionner_commande(self.commande, [(self.produits[0], 1, ''), (self.produits[0], 1, ''),
+                                                  (self.produits[1], 2, '')])
+        self.assertEqual(ReceptionAppro.objects.count(), 1)
+        self.produits[1].refresh_from_db()
+        self.assertEqual(self.produits[1].stock, 0)
+
+    def test_formulaire_seul_garde_les_controles(self):
+        form = ReceptionApproForm({'produit': self.produits[0].pk, 'quantite_livree': 9},
+                                  instance=ReceptionAppro(commande=self.commande))
+        self.assertFalse(form.is_valid())
+        self.assertIn('quantite_livree', form.errors)
+        groupe = ReceptionApproForm({'produit': self.produits[0].pk, 'quantite_livree': 9},
+                                    instance=ReceptionAppro(commande=self.commande), controle_groupe=True)
+        self.assertTrue(groupe.is_valid())
+        with self.assertRaises(ValueError):
+            groupe.save()
+        self.assertFalse(ReceptionAppro.objects.exists())
+
+
+class SoldeFournisseurTests(TestCase):
+    def setUp(self):
+        self.fournisseur = Fournisseur.objects.create(nom="Test Fournisseur")
+        self.produit = Produit.objects.create(nom="Test Produit", code="TP", prix_vente=Decimal('10.00'))
+        self.commande = CommandeFournisseur.objects.create(fournisseur=self.fournisseur)
+        LigneCommande.objects.create(commande=self.commande, produit=self.produit, quantite=5, prix_achat=Decimal('8.00'))
+
+    def solde(self, fournisseur=None):
+        return FournisseurSolde.objects.get(fournisseur=fournisseur or self.fournisseur)
+
+    def assertSoldesCoherents(self):
+        champs = ('pk', 'total_commandes', 'total_paye', 'reste_a_payer', 'nb_commandes', 'nb_commandes_en_cours')
+        soldes = list(FournisseurSolde.objects.order_by('pk').values_list(*champs))
+        reconstruire_soldes()
+        self.assertEqual(soldes, list(FournisseurSolde.objects.order_by('pk').values_list(*champs)))
+
+    def test_solde_incremental(self):
+        solde = self.solde()
+        self.assertEqual((solde.total_commandes, solde.nb_commandes, solde.nb_commandes_en_cours),
+                         (Decimal('40.00'), 1, 1))
+        paiement = process_paiement(self.commande, Decimal('15.00'))
+        self.assertEqual(self.solde().reste_a_payer, Decimal('25.00'))
+        ReceptionAppro.objects.create(commande=self.commande, produit=self.produit, quantite_livree=5)
+        self.assertEqual(self.solde().nb_commandes_en_cours, 0)
+        paiement.delete()
+        self.assertEqual(self.solde().total_paye, Decimal('0.00'))
+        self.assertSoldesCoherents()
+
+    def test_transfert_et_suppression(self):
+        autre = Fournisseur.objects.create(nom="Autre")
+        process_paiement(self.commande, Decimal('10.00'))
+        self.commande.fournisseur = autre
+        self.commande.save()
+        self.assertEqual(self.solde().total_commandes, Decimal('0.00'))
+        self.assertEqual(self.solde(autre).reste_a_payer, Decimal('30.00'))
+        self.assertSoldesCoherents()
+        self.commande.delete()
+        self.assertEqual(self.solde(autre).nb_commandes, 0)
+        self.assertEqual(self.solde(autre).total_paye, Decimal('0.00'))
+        self.assertSoldesCoherents()
+
+    def test_solde_absent_reconstruit(self):
+        FournisseurSolde.objects.all().delete()
+        process_paiement(self.commande, Decimal('5.00'))
+        self.assertEqual(self.solde().reste_a_payer, Decimal('35.00'))
+
+    def test_liste_sans_agregat(self):
+        for i in range(5):
+            fournisseur = Fournisseur.objects.create(nom=f"F{i}")
+            commande = CommandeFournisseur.objects.create(fournisseur=fournisseur)
+            PaiementFournisseur.objects.create(commande=commande, montant=Decimal('1.00'))
+        with self.assertNumQueries(3):    # pagination, alertes de stock, fournisseurs + soldes
+            response = self.client.get(reverse('fournisseurs:liste'))
+        self.assertContains(response, "40.00 €")
+        response = self.client.get(reverse('fournisseurs:detail', args=[self.fournisseur.pk]))
+        self.assertContains(response, "dont 1 en cours")
+
+
+class ScoreFournisseurTests(TestCase):
+    def setUp(self):
+        self.fournisseur = Fournisseur.objects.create(nom="Test Fournisseur")
+        self.produit = Produit.objects.create(nom="Test Produit", code="TP", prix_vente=Decimal('10.00'))
+        maintenant = timezone.now()
+        # délais de 2, 4 et 10 jours ; la dernière commande est livrée en deux fois, incomplète
+        for delai, livraisons in ((2, [4]), (4, [4]), (10, [1, 2])):
+            commande = CommandeFournisseur.objects.create(fournisseur=self.fournisseur)
+            LigneCommande.objects.create(commande=commande, produit=self.produit, quantite=4, prix_achat=Decimal('5.00'))
+            CommandeFournisseur.objects.filter(pk=commande.pk).update(
+                date_commande=maintenant - timedelta(days=30 + delai))
+            for quantite in livraisons:
+                ReceptionAppro.objects.create(commande=commande, produit=self.produit, quantite_livree=quantite)
+            commande.receptions.update(date_reception=maintenant - timedelta(days=30))
+        # commande non livrée : dépense seulement
+        commande = CommandeFournisseur.objects.create(fournisseur=self.fournisseur)
+        LigneCommande.objects.create(commande=commande, produit=self.produit, quantite=2, prix_achat=Decimal('5.00'))
+
+    def test_indicateurs(self):
+        score, = calculer_scores()
+        self.assertEqual(score.nb_commandes, 3)
+        self.assertAlmostEqual(score.delai_moyen, 5.33, places=2)
+        self.assertAlmostEqual(score.delai_p90, 10, places=2)
+        self.assertAlmostEqual(score.taux_service, 11 / 12, places=4)
+        self.assertAlmostEqual(score.taux_partielles, 1 / 3, places=4)
+        self.assertEqual(score.depense, Decimal('70.00'))
+
+    def test_requetes_groupees(self):
+        for i in range(5):
+            Fournisseur.objects.create(nom=f"F{i}")
+        with self.assertNumQueries(4):
+            self.assertEqual(len(calculer_scores()), 6)
+
+    def test_rafraichissement_incremental(self):
+        autre = Fournisseur.objects.create(nom="Autre")
+        self.assertEqual(fournisseurs_modifies(), {self.fournisseur.pk, autre.pk})
+        rafraichir_scores()
+        self.assertEqual(fournisseurs_modifies(), set())
+        CommandeFournisseur.objects.create(fournisseur=autre)
+        self.assertEqual(fournisseurs_modifies(), {autre.pk})
+        call_command('rafraichir_scores', stdout=StringIO())
+        self.assertEqual(fournisseurs_modifies(), set())
+
+    def test_fiche(self):
+        rafraichir_scores()
+        response = self.client.get(reverse('fournisseurs:detail', args=[self.fournisseur.pk]))
+        self.assertContains(response, "5.3 j")
+        self.assertContains(response, "92 %")
+
+
+@skipUnless(numpy, "Nécessite numpy")
+class ReapproTests(TestCase):
+    def setUp(self):
+        from .reappro import calculer_suggestions, suggerer_reappro
+        self.calculer_suggestions, self.suggerer_reappro = calculer_suggestions, suggerer_reappro
+        self.cher = Fournisseur.objects.create(nom="Cher")
+        self.moins_cher = Fournisseur.objects.create(nom="Moins cher")
+        self.vendu = Produit.objects.create(nom="Vendu", code="V", prix_vente=Decimal('10.00'))
+        self.sans_fournisseur = Produit.objects.create(nom="Sans fournisseur", code="S", prix_vente=Decimal('10.00'))
+        self.bien_stocke = Produit.objects.create(nom="Bien stocké", code="B", prix_vente=Decimal('10.00'))
+        for fournisseur, prix in ((self.cher, '6.00'), (self.moins_cher, '5.00')):
+            commande = CommandeFournisseur.objects.create(fournisseur=fournisseur)
+            for produit in (self.vendu, self.bien_stocke):
+                LigneCommande.objects.create(commande=commande, produit=produit, quantite=10, prix_achat=Decimal(prix))
+                ReceptionAppro.objects.create(commande=commande, produit=produit, quantite_livree=10)
+        Produit.objects.filter(pk=self.bien_stocke.pk).update(stock=500)
+        # 3 unités par jour sur 30 jours pour chaque produit
+        maintenant = timezone.now()
+        sorties = MouvementStock.objects.bulk_create([
+            MouvementStock(produit=produit, type=MouvementStock.SORTIE, quantite=3, source_type=MouvementStock.VENTE)
+            for produit in (self.vendu, self.sans_fournisseur, self.bien_stocke) for _ in range(30)
+        ])
+        for jour, mouvement in enumerate(sorties):
+            MouvementStock.objects.filter(pk=mouvement.pk).update(date=maintenant - timedelta(days=jour % 30))
+        self.solde_initial = FournisseurSolde.objects.get(pk=self.moins_cher.pk).total_commandes
+
+    def test_suggestions(self):
+        suggestion, = self.calculer_suggestions(historique_jours=30)
+        self.assertEqual((suggestion.produit_id, suggestion.fournisseur_id), (self.vendu.pk, self.moins_cher.pk))
+        self.assertEqual(suggestion.prix_achat, Decimal('5.00'))
+        self.assertAlmostEqual(suggestion.demande_jour, 3)
+        # point = 3 × 7 j (délai par défaut), stock visé = point + 3 × 14 j, stock actuel 20
+        self.assertEqual(suggestion.quantite, 21 + 42 - 20)
+
+    def test_brouillons(self):
+        commande, = self.suggerer_reappro(historique_jours=30)
+        self.assertEqual(commande.statut, CommandeFournisseur.BROUILLON)
+        self.assertEqual(commande.montant_total, Decimal('215.00'))
+        self.assertEqual(commande.lignes.get().produit, self.vendu)
+        # brouillon hors solde ; quantités déjà en commande : pas de doublon
+        self.assertEqual(FournisseurSolde.objects.get(pk=self.moins_cher.pk).total_commandes, self.solde_initial)
+        self.assertEqual(self.suggerer_reappro(historique_jours=30), [])
+        with self.assertRaises(ValidationError):
+            receptionner_commande(commande, [(self.vendu, 1, '')])
+
+        self.client.post(reverse('fournisseurs:commande_valider', args=[commande.pk]))
+        commande.refresh_from_db()
+        self.assertEqual(commande.statut, CommandeFournisseur.EN_ATTENTE)
+        self.assertEqual(FournisseurSolde.objects.get(pk=self.moins_cher.pk).total_commandes,
+                         self.solde_initial + Decimal('215.00'))
+
+    def test_brouillon_non_receptionnable_par_le_modele(self):
+        commande, = self.suggerer_reappro(historique_jours=30)
+        with self.assertRaises(ValidationError):
+            ReceptionAppro.objects.create(commande=commande, produit=self.vendu, quantite_livree=1)
+        commande.refresh_from_db()
+        self.assertEqual(commande.statut, CommandeFournisseur.BROUILLON)
+
+    def test_brouillon_abandonne_ignore(self):
+        commande, = self.suggerer_reappro(historique_jours=30)
+        CommandeFournisseur.objects.filter(pk=commande.pk).update(date_commande=timezone.now() - timedelta(days=30))
+        self.assertEqual(len(self.calculer_suggestions(historique_jours=30)), 1)
+        self.assertEqual(self.calculer_suggestions(historique_jours=30, brouillon_jours=60), [])
+
+
+class HistoriquePrixTests(TestCase):
+    def setUp(self):
+        self.fournisseur = Fournisseur.objects.create(nom="Test Fournisseur")
+        self.savon = Produit.objects.create(nom="Savon", code="SAV1", prix_vente=Decimal('10.00'))
+        self.sucre = Produit.objects.create(nom="Sucre", code="SUC1", prix_vente=Decimal('10.00'))
+        for quantite, prix in ((5, '8.00'), (15, '6.00')):
+            commande = CommandeFournisseur.objects.create(fournisseur=self.fournisseur)
+            LigneCommande.objects.create(commande=commande, produit=self.savon, quantite=quantite, prix_achat=Decimal(prix))
+
+    def historique(self, produit=None):
+        return HistoriquePrixAchat.objects.get(produit=produit or self.savon, fournisseur=self.fournisseur)
+
+    def assertHistoriqueCoherent(self):
+        champs = ('produit', 'fournisseur', 'dernier_prix', 'prix_min', 'montant_total', 'quantite_totale', 'nb_lignes')
+        avant = list(HistoriquePrixAchat.objects.order_by('produit', 'fournisseur').values_list(*champs))
+        recalculer_historique()
+        self.assertEqual(avant, list(HistoriquePrixAchat.objects.order_by('produit', 'fournisseur').values_list(*champs)))
+
+    def test_enregistrement_incremental(self):
+        h = self.historique()
+        self.assertEqual((h.dernier_prix, h.prix_min, h.prix_moyen, h.nb_lignes),
+                         (Decimal('6.00'), Decimal('6.00'), Decimal('6.50'), 2))
+        with self.assertNumQueries(1):
+            self.assertEqual(prix_achat(self.savon.pk, self.fournisseur.pk).pk, h.pk)
+        self.assertHistoriqueCoherent()
+
+    def test_formulaire_de_commande(self):
+        data = {'fournisseur': self.fournisseur.pk, 'lignes-TOTAL_FORMS': 1, 'lignes-INITIAL_FORMS': 0,
+                'lignes-MIN_NUM_FORMS': 0, 'lignes-MAX_NUM_FORMS': 1000,
+                'lignes-0-produit': self.sucre.pk, 'lignes-0-quantite': 4, 'lignes-0-prix_achat': '2.00'}
+        self.client.post(reverse('fournisseurs:commande_create'), data)
+        self.assertEqual(self.historique(self.sucre).dernier_prix, Decimal('2.00'))
+
+        # prix corrigé puis ligne retirée : le couple est recalculé
+        commande = CommandeFournisseur.objects.latest('pk')
+        ligne = commande.lignes.get()
+        data.update({'lignes-INITIAL_FORMS': 1, 'lignes-0-id': ligne.pk, 'lignes-0-prix_achat': '3.00'})
+        self.client.post(reverse('fournisseurs:commande_update', args=[commande.pk]), data)
+        self.assertEqual(self.historique(self.sucre).prix_min, Decimal('3.00'))
+        self.assertHistoriqueCoherent()
+        data['lignes-0-DELETE'] = 'on'
+        self.client.post(reverse('fournisseurs:commande_update', args=[commande.pk]), data)
+        self.assertFalse(HistoriquePrixAchat.objects.filter(produit=self.sucre).exists())
+        commande.delete()
+        self.assertHistoriqueCoherent()
+
+    def test_suppression_de_ligne(self):
+        LigneCommande.objects.filter(prix_achat=Decimal('6.00')).get().delete()
+        h = self.historique()
+        self.assertEqual((h.dernier_prix, h.prix_min, h.nb_lignes), (Decimal('8.00'), Decimal('8.00'), 1))
+        self.assertHistoriqueCoherent()
+        LigneCommande.objects.filter(produit=self.savon).delete()
+        self.assertFalse(HistoriquePrixAchat.objects.exists())
+
+    def test_brouillon_pris_en_compte_a_la_validation(self):
+        from .services import valider_brouillon
+        brouillon = CommandeFournisseur.objects.create(fournisseur=self.fournisseur, statut=CommandeFournisseur.BROUILLON)
+        LigneCommande.objects.create(commande=brouillon, produit=self.savon, quantite=10, prix_achat=Decimal('5.00'))
+        self.assertEqual(self.historique().prix_min, Decimal('6.00'))
+        valider_brouillon(brouillon)
+        self.assertEqual(self.historique().prix_min, Decimal('5.00'))
+        self.assertHistoriqueCoherent()
+
+    def test_api(self):
+        url = reverse('fournisseurs:prix_achat', args=[self.savon.pk])
+        self.assertEqual(self.client.get(url, {'fournisseur': self.fournisseur.pk}).json()['prix_moyen'], '6.50')
+        self.assertEqual(self.client.get(url).json()['fournisseurs'][0]['nom'], "Test Fournisseur")
+        self.assertEqual(self.client.get(url, {'fournisseur': 9999}).status_code, 404)
+
+        url = reverse('fournisseurs:prix_autocomplete')
+        resultats = self.client.get(url, {'q': 's', 'fournisseur': self.fournisseur.pk}).json()['resultats']
+        self.assertEqual([(r['nom'], r['dernier_prix']) for r in resultats], [("Savon", '6.00'), ("Sucre", None)])
+        self.assertEqual(self.client.get(url, {'q': 's'}).status_code, 400)
+
@@ -10,10 +10,15 @@ from .views import (
     commande_create,
     commande_update,
     commande_generate_pdf,
+    commande_valider,
+    telecharger_commande_pdf,
+    apercu_commande_pdf,
     commande_paiement,
     ReceptionListView,
     ReceptionCreateView,
     PaiementListView,
+    prix_achat_produit,
+    autocomplete_prix,
     #PaiementCreateView
 )
 
@@ -31,7 +36,10 @@ urlpatterns = [
     path('commandes/nouveau/', commande_create, name='commande_create'),
     path('commandes/<int:pk>/', CommandeDetailView.as_view(), name='commande_detail'),
     path('commandes/<int:pk>/modifier/', commande_update, name='commande_update'),
+    path('commandes/<int:pk>/valider/', commande_valider, name='commande_valider'),
     path('commandes/<int:pk>/pdf/', commande_generate_pdf, name='commande_generate_pdf'),
+    path('commandes/<int:pk>/commande.pdf', telecharger_commande_pdf, name='commande_pdf'),
+    path('commandes/<int:pk>/apercu/', apercu_commande_pdf, name='commande_apercu'),
 
     # Réceptions
     path('receptions/', ReceptionListView.as_view(), name='receptions'),
@@ -39,6 +47,10 @@ urlpatterns = [
 
     # Paiements fournisseurs
     path('paiements/', PaiementListView.as_view(), name='paiements'),
+    # Prix d'achat
+    path('api/prix/<int:produit>/', prix_achat_produit, name='prix_achat'),
+    path('api/prix/autocomplete/', autocomplete_prix, name='prix_autocomplete'),
+
     #path('paiements/nouveau/', PaiementCreateView.as_view(), name='paiement_create'),
     path('commandes/<int:pk>/paiement/', commande_paiement,     name='commande_paiement'),
 ]
\ No newline at end of file
@@ -1,9 +1,14 @@
+from decimal import Decimal
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse_lazy
 from django import forms
 from django.views.generic import View, ListView, CreateView, UpdateView, DeleteView, DetailView
 from django.forms import inlineformset_factory
 from django.contrib import messages
+from django.views.decorators.http import require_POST
+from django.http import JsonResponse
+from django.db.models import FilteredRelation, Q
+from produits.models import Produit
 from django.db import transaction
 from django.core.exceptions import ValidationError
 from .models import (
@@ -20,7 +25,12 @@ from .forms import (
     ReceptionApproForm, 
     PaiementFournisseurForm
 )
-from .services import recalc_commande_total
+from .prix import donnees_prix, prix_achat, prix_par_fournisseur
+from .services import enregistrer_lignes_commande, receptionner_commande, valider_brouillon, process_paiement
+from documents.models import TachePDF
+from documents.services import demander_pdf, derniere_tache
+from documents.views import apercu_pdf, telechargement_pdf
+from services.pdf import rendre_commande_pdf
 from django.db.models.deletion import ProtectedError
 from django.db.utils import IntegrityError
 from django.db.transaction import atomic
@@ -32,6 +42,8 @@ class FournisseurListView(ListView):
     template_name = 'fournisseurs/liste.html'
     context_object_name = 'fournisseurs'
     paginate_by = 8
+    # soldes lus dans FournisseurSolde : une jointure, pas d'agrégat par fournisseur
+    queryset = Fournisseur.objects.select_related('solde')
 
 class FournisseurCreateView(CreateView):
     model = Fournisseur
@@ -55,6 +67,7 @@ class FournisseurDetailView(DetailView):
     model = Fournisseur
     template_name = 'fournisseurs/detail.html'
     context_object_name = 'fournisseur'
+    queryset = Fournisseur.objects.select_related('solde', 'score')
 
 
 
@@ -64,17 +77,23 @@ class CommandeListView(ListView):
     template_name = 'fournisseurs/commandes.html'
     context_object_name = 'commandes'
     paginate_by = 8
-    
+    # fournisseur joint et totaux annotés : nombre de requêtes fixe par page
+    queryset = CommandeFournisseur.objects.select_related('fournisseur').avec_totaux()
 
 
 class CommandeDetailView(DetailView):
     model = CommandeFournisseur
     template_name = 'fournisseurs/commande_detail.html'
     context_object_name = 'commande'
-    
+    queryset = CommandeFournisseur.objects.select_related('fournisseur').avec_totaux()
+
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
         ctx['paiement_form'] = PaiementFournisseurForm()
+        ctx['tache_pdf'] = derniere_tache(TachePDF.COMMANDE, self.object.pk)
+        # quantités reçues de toutes les lignes en une requête
+        ctx['lignes'] = self.object.lignes.select_related('produit').avec_receptions()
+        ctx['receptions'] = self.object.receptions.select_related('produit')
         return ctx
 
 
@@ -101,11 +120,8 @@ def commande_create(request):
                         ):
                             raise ValidationError("La commande doit contenir au moins une ligne")
                         
-                        # Sauvegarder les lignes
-                        formset.save()
-                        
-                        # Recalculer le montant total
-                        recalc_commande_total(cmd)
+                        # Sauvegarder les lignes en bloc et recalculer le total une fois
+                        enregistrer_lignes_commande(formset)
                         messages.success(request, "Commande créée avec succès.")
                         return redirect('fournisseurs:commandes')
                     else:
@@ -143,10 +159,9 @@ def commande_update(request, pk):
     form = CommandeFournisseurForm(request.POST or None, instance=cmd)
     formset = CommandeLigneFormSet(request.POST or None, instance=cmd)
     if request.method=='POST' and form.is_valid() and formset.is_valid():
-        form.save()
-        formset.save()
-        from .services import recalc_commande_total
-        recalc_commande_total(cmd)
+        with transaction.atomic():
+            form.save()
+            enregistrer_lignes_commande(formset)
         return redirect('fournisseurs:commandes')
     return render(request,'fournisseurs/commande_form.html',{'form':form,'formset':formset})
 
@@ -155,14 +170,31 @@ def commande_generate_pdf(request, pk):
     """
     Vue appelée par le bouton "Générer PDF" :
     - Récupère la commande
-    - Appelle la méthode generate_pdf() du modèle
+    - Met la génération du PDF en file (run_pdf_worker)
     - Redirige vers la page de détail de la commande
     """
     cmd = get_object_or_404(CommandeFournisseur, pk=pk)
-    cmd.generate_pdf()
+    demander_pdf(TachePDF.COMMANDE, cmd.pk)
+    messages.info(request, "Le bon de commande est en cours de génération.")
     return redirect('fournisseurs:commande_detail', pk=pk)
 
 
+@require_POST
+def commande_valider(request, pk):
+    """Valide une commande brouillon (suggestion de réapprovisionnement)."""
+    cmd = get_object_or_404(CommandeFournisseur, pk=pk)
+    try:
+        valider_brouillon(cmd)
+    except ValidationError as e:
+        messages.error(request, e.messages[0])
+    else:
+        messages.success(request, "Commande validée.")
+    return redirect('fournisseurs:commande_detail', pk=pk)
+
+
+telecharger_commande_pdf = telechargement_pdf(CommandeFournisseur)
+apercu_commande_pdf = apercu_pdf(CommandeFournisseur, rendre_commande_pdf)
+
 
 # Réceptions
 class ReceptionListView(ListView):
@@ -188,7 +220,8 @@ class ReceptionCreateView(View):
     def _make_formset(self, cmd, post_data=None):
         # Prépare l'initial et le label du produit
         initial = []
-        for lg in cmd.lignes.all():
+        lignes = list(cmd.lignes.select_related('produit'))
+        for lg in lignes:
             initial.append({
                 'produit': lg.produit.pk,
                 'quantite_commandee': lg.quantite,
@@ -205,7 +238,9 @@ class ReceptionCreateView(View):
         kwargs = dict(
             instance=cmd,
             initial=initial,
-            queryset=ReceptionAppro.objects.none()
+            queryset=ReceptionAppro.objects.none(),
+            # lignes contrôlées et enregistrées ensemble par receptionner_commande
+            form_kwargs={'produits': {lg.produit_id: lg.produit for lg in lignes}, 'controle_groupe': True},
         )
         if post_data is not None:
             kwargs['data'] = post_data
@@ -224,8 +259,17 @@ class ReceptionCreateView(View):
         cmd = get_object_or_404(CommandeFournisseur, pk=pk)
         formset = self._make_formset(cmd, post_data=request.POST)
         if formset.is_valid():
-            formset.save()
-            return redirect('fournisseurs:receptions')
+            lignes = [
+                (f.cleaned_data['produit'], f.cleaned_data['quantite_livree'], f.cleaned_data.get('reference'))
+                for f in formset.forms if f.cleaned_data
+            ]
+            try:
+                receptionner_commande(cmd, lignes)
+            except ValidationError as e:
+                for erreur in e.messages:
+                    messages.error(request, erreur)
+            else:
+                return redirect('fournisseurs:receptions')
         # si invalide, on ré‐affiche avec le même initial
         return render(request, self.template_name, {
             'commande': cmd,
@@ -269,12 +313,63 @@ def commande_paiement(request, pk):
     if request.method == 'POST':
         form = PaiementFournisseurForm(request.POST)
         if form.is_valid():
-            pay = form.save(commit=False)
-            pay.commande = cmd
-            pay.save()
-            # on ne change pas le statut ici
-            messages.success(request, "Paiement enregistré.")
-            # pas de recalc_commande_total ici : on ne touche qu'à montant_total de la commande
+            try:
+                process_paiement(cmd, form.cleaned_data['montant'])
+            except ValidationError as e:
+                messages.error(request, e.messages[0])
+            else:
+                # on ne change pas le statut ici
+                messages.success(request, "Paiement enregistré.")
         else:
             messages.error(request, "Erreur dans le formulaire de paiement.")
     return redirect('fournisseurs:commande_detail', pk=pk)
+
+
+# Prix d'achat (formulaire de commande)
+def _entier(valeur):
+    try:
+        return int(valeur)
+    except (TypeError, ValueError):
+        return None
+
+
+def prix_achat_produit(request, produit):
+    """Prix d'achat d'un produit chez un fournisseur (?fournisseur=) ou chez tous."""
+    fournisseur = request.GET.get('fournisseur')
+    if fournisseur is not None:
+        if _entier(fournisseur) is None:
+            return JsonResponse({'erreur': "Fournisseur invalide"}, status=400)
+        historique = prix_achat(produit, int(fournisseur))
+        if historique is None:
+            return JsonResponse({'erreur': "Aucun achat de ce produit chez ce fournisseur"}, status=404)
+        return JsonResponse(donnees_prix(historique))
+    return JsonResponse({'produit': produit, 'fournisseurs': [
+        dict(donnees_prix(h), nom=h.fournisseur.nom) for h in prix_par_fournisseur(produit)
+    ]})
+
+
+def autocomplete_prix(request):
+    """
+    Produits dont le code ou le nom commence par ?q=, avec leurs prix
+    d'achat chez ?fournisseur= (jointure sur l'index unique de l'historique).
+    """
+    q = request.GET.get('q', '').strip()
+    fournisseur = _entier(request.GET.get('fournisseur'))
+    if not q or fournisseur is None:
+        return JsonResponse({'erreur': "Paramètres q et fournisseur requis"}, status=400)
+    produits = (Produit.objects.filter(Q(code__startswith=q) | Q(nom__istartswith=q))
+                .annotate(h=FilteredRelation('historique_prix',
+                                             condition=Q(historique_prix__fournisseur=fournisseur)))
+                .order_by('nom')
+                .values('pk', 'code', 'nom', 'h__dernier_prix', 'h__prix_min', 'h__montant_total', 'h__quantite_totale')[:10])
+    resultats = []
+    for p in produits:
+        ligne = {'id': p['pk'], 'code': p['code'], 'nom': p['nom'],
+                 'dernier_prix': None, 'prix_min': None, 'prix_moyen': None}
+        if p['h__dernier_prix'] is not None:
+            moyen = p['h__montant_total'] / p['h__quantite_totale'] if p['h__quantite_totale'] else p['h__dernier_prix']
+            ligne.update(dernier_prix=str(p['h__dernier_prix']), prix_min=str(p['h__prix_min']),
+                         prix_moyen=str(moyen.quantize(Decimal('0.01'))))
+        resultats.append(ligne)
+    return JsonResponse({'resultats': resultats})
+
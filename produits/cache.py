@@ -0,0 +1,178 @@
+# produits/cache.py
+
+"""
+Cache des fiches produit pour la caisse (lecture par code-barres).
+
+Les fiches (prix, devise, nom, stock indicatif) sont gardées dans un LRU
+borné par processus, indexé par code et par pk. Si PRODUITS_CACHE_ALIAS
+désigne un cache Django partagé (memcached, redis...), les fiches y sont
+stockées à la place du LRU local : tous les workers voient alors les mêmes
+invalidations. L'invalidation est faite par les signaux post_save /
+post_delete de Produit (produits/signals.py), au commit de la transaction.
+
+Sans cache partagé, un worker ne voit pas les invalidations des autres :
+l'encaissement (ventes.services.encaisser_panier) lit donc les prix en base.
+
+Le stock est une indication : les ajustements de stock passent par des
+UPDATE directs (stocks.services) qui ne déclenchent pas de signal.
+"""
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import Produit
+
+
+@dataclass(frozen=True)
+class FicheProduit:
+    pk: int
+    code: str
+    nom: str
+    prix_vente: Decimal
+    monnaie: str
+    stock: int
+
+    @classmethod
+    def depuis_produit(cls, produit):
+        return cls(produit.pk, produit.code, produit.nom, produit.prix_vente, produit.monnaie, produit.stock)
+
+
+CHAMPS = ('pk', 'code', 'nom', 'prix_vente', 'monnaie', 'stock')
+
+
+class CacheProduits:
+    def __init__(self, taille=1000, alias=None):
+        self.taille = taille
+        self.alias = alias
+        self._fiches = OrderedDict()     # code -> FicheProduit
+        self._codes = {}                 # pk -> code
+        self._verrou = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def partage(self):
+        return caches[self.alias] if self.alias else None
+
+    # --- stockage -------------------------------------------------------
+
+    def _lire_code(self, code):
+        if self.partage is not None:
+            return self.partage.get(f"produit:code:{code}")
+        with self._verrou:
+            fiche = self._fiches.get(code)
+            if fiche is not None:
+                self._fiches.move_to_end(code)
+            return fiche
+
+    def _lire_pk(self, pk):
+        if self.partage is not None:
+            return self.partage.get(f"produit:pk:{pk}")
+        with self._verrou:
+            code = self._codes.get(pk)
+        return self._lire_code(code) if code is not None else None
+
+    def _ecrire(self, fiches):
+        if self.partage is not None:
+            valeurs = {}
+            for f in fiches:
+                valeurs[f"produit:code:{f.code}"] = f
+                valeurs[f"produit:pk:{f.pk}"] = f
+            self.partage.set_many(valeurs, timeout=None)
+            return
+        with self._verrou:
+            for f in fiches:
+                self._fiches[f.code] = f
+                self._fiches.move_to_end(f.code)
+                self._codes[f.pk] = f.code
+            while len(self._fiches) > self.taille:
+                _, ancienne = self._fiches.popitem(last=False)
+                self._codes.pop(ancienne.pk, None)
+
+    def _compter(self, hits=0, misses=0):
+        with self._verrou:
+            self.hits += hits
+            self.misses += misses
+
+    # --- lecture --------------------------------------------------------
+
+    def par_codes(self, codes):
+        """Fiches {code: FicheProduit} ; les absents sont lus en une requête."""
+        fiches, manquants = {}, []
+        for code in set(codes):
+            fiche = self._lire_code(code)
+            if fiche is None:
+                manquants.append(code)
+            else:
+                fiches[code] = fiche
+        self._compter(hits=len(fiches), misses=len(manquants))
+        if manquants:
+            nouvelles = [FicheProduit(*valeurs) for valeurs in
+                         Produit.objects.filter(code__in=manquants).values_list(*CHAMPS)]
+            self._ecrire(nouvelles)
+            fiches.update((f.code, f) for f in nouvelles)
+        return fiches
+
+    def par_code(self, code):
+        return self.par_codes([code]).get(code)
+
+    def par_pk(self, pk):
+        fiche = self._lire_pk(pk)
+        if fiche is not None:
+            self._compter(hits=1)
+            return fiche
+        self._compter(misses=1)
+        produit = Produit.objects.filter(pk=pk).values_list(*CHAMPS).first()
+        if produit is None:
+            return None
+        fiche = FicheProduit(*produit)
+        self._ecrire([fiche])
+        return fiche
+
+    # --- invalidation ---------------------------------------------------
+
+    def invalider(self, produit):
+        """Retire le produit, y compris sous son ancien code s'il a changé."""
+        if self.partage is not None:
+            ancienne = self.partage.get(f"produit:pk:{produit.pk}")
+            cles = [f"produit:pk:{produit.pk}", f"produit:code:{produit.code}"]
+            if ancienne is not None:
+                cles.append(f"produit:code:{ancienne.code}")
+            self.partage.delete_many(cles)
+            return
+        with self._verrou:
+            ancien_code = self._codes.pop(produit.pk, None)
+            for code in {ancien_code, produit.code} - {None}:
+                fiche = self._fiches.pop(code, None)
+                if fiche is not None and fiche.pk != produit.pk:
+                    self._codes.pop(fiche.pk, None)
+
+    def vider(self):
+        if self.partage is not None:
+            self.partage.clear()
+        with self._verrou:
+            self._fiches.clear()
+            self._codes.clear()
+            self.hits = self.misses = 0
+
+    def statistiques(self):
+        with self._verrou:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'taux': self.hits / total if total else 0.0,
+                'taille': len(self._fiches),
+                'partage': bool(self.alias),
+            }
+
+
+cache_produits = CacheProduits(
+    taille=getattr(settings, 'PRODUITS_CACHE_TAILLE', 1000),
+    alias=getattr(settings, 'PRODUITS_CACHE_ALIAS', None),
+)
@@ -2,9 +2,36 @@ from django import forms
 from .models import Produit
 
 class ProduitForm(forms.ModelForm):
+    cout_initial = forms.DecimalField(
+        label='Coût unitaire du stock initial', required=False, min_value=0, max_digits=14, decimal_places=4,
+        help_text="Valorise le stock initial (obligatoire si le stock est renseigné)",
+    )
+
     class Meta:
         model = Produit
         fields = ['nom', 'code', 'prix_vente', 'monnaie', 'stock', 'image']
         widgets = {
             'prix_vente': forms.NumberInput(attrs={'step': '0.01'}),
-        }
\ No newline at end of file
+        }
+
+    def clean(self):
+        cleaned = super().clean()
+        if cleaned.get('stock') and cleaned.get('cout_initial') is None:
+            self.add_error('cout_initial', "Indiquez le coût unitaire du stock initial.")
+        return cleaned
+
+    def save(self, commit=True):
+        # lu par stocks.signals.enregistrer_stock_initial à la création
+        self.instance.cout_initial = self.cleaned_data.get('cout_initial')
+        return super().save(commit)
+
+
+class ProduitModificationForm(ProduitForm):
+    """
+    Sans le stock : après la création, il ne varie que par des mouvements
+    de stock, pour que le journal reste aligné sur Produit.stock.
+    """
+    cout_initial = None
+
+    class Meta(ProduitForm.Meta):
+        fields = ['nom', 'code', 'prix_vente', 'monnaie', 'image']
@@ -0,0 +1,16 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import cache_produits
+from .models import Produit
+
+
+@receiver(post_save, sender=Produit)
+@receiver(post_delete, sender=Produit)
+def invalider_cache_produit(sender, instance, **kwargs):
+    # après le commit : invalidé plus tôt, un lecteur concurrent pourrait
+    # remettre l'ancienne ligne en cache jusqu'à son expiration
+    # (pk et code copiés : une suppression remet instance.pk à None)
+    produit = Produit(pk=instance.pk, code=instance.code)
+    transaction.on_commit(lambda: cache_produits.invalider(produit))
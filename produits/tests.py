@@ -1,3 +1,101 @@
+from decimal import Decimal
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.urls import reverse
+from .cache import CacheProduits, cache_produits
+from .forms import ProduitForm
+from .models import Produit
 
-# Create your tests here.
+
+class CacheProduitsTests(TestCase):
+    def setUp(self):
+        cache_produits.vider()
+        self.produit = Produit.objects.create(nom="Savon", code="3560070", prix_vente=Decimal('1.50'))
+
+    def test_hits_sans_requete(self):
+        self.assertEqual(cache_produits.par_code("3560070").prix_vente, Decimal('1.50'))
+        with self.assertNumQueries(0):
+            self.assertEqual(cache_produits.par_code("3560070").nom, "Savon")
+            self.assertEqual(cache_produits.par_pk(self.produit.pk).code, "3560070")
+        stats = cache_produits.statistiques()
+        self.assertEqual((stats['hits'], stats['misses']), (2, 1))
+
+    def test_invalidation_sur_modification(self):
+        cache_produits.par_code("3560070")
+        self.produit.prix_vente = Decimal('2.00')
+        self.produit.code = "3560071"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.produit.save()
+        self.assertIsNone(cache_produits.par_code("3560070"))
+        self.assertEqual(cache_produits.par_code("3560071").prix_vente, Decimal('2.00'))
+
+    def test_invalidation_sur_suppression(self):
+        cache_produits.par_code("3560070")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.produit.delete()
+        self.assertIsNone(cache_produits.par_code("3560070"))
+
+    def test_invalidation_au_commit(self):
+        cache_produits.par_code("3560070")
+        with self.captureOnCommitCallbacks() as rappels:
+            Produit.objects.filter(pk=self.produit.pk).update(prix_vente=Decimal('3.00'))
+            self.produit.refresh_from_db()
+            self.produit.save()
+            # transaction en cours : la fiche en cache reste celle déjà validée
+            self.assertEqual(cache_produits.par_code("3560070").prix_vente, Decimal('1.50'))
+        self.assertEqual(len(rappels), 1)
+        rappels[0]()
+        self.assertEqual(cache_produits.par_code("3560070").prix_vente, Decimal('3.00'))
+
+    def test_lru_borne(self):
+        cache = CacheProduits(taille=2)
+        for i in range(3):
+            Produit.objects.create(nom=f"P{i}", code=f"C{i}", prix_vente=Decimal('1.00'))
+        cache.par_codes(["C0", "C1"])
+        cache.par_code("C0")            # C0 devient le plus récent
+        cache.par_code("C2")            # évince C1
+        self.assertEqual(cache.statistiques()['taille'], 2)
+        with self.assertNumQueries(1):
+            cache.par_code("C1")
+
+    def test_cache_partage(self):
+        with self.settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+                                   'produits': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                                'LOCATION': 'produits-tests'}}):
+            worker_a, worker_b = CacheProduits(alias='produits'), CacheProduits(alias='produits')
+            worker_a.par_code("3560070")
+            with self.assertNumQueries(0):
+                self.assertEqual(worker_b.par_code("3560070").pk, self.produit.pk)
+            worker_a.invalider(self.produit)
+            with self.assertNumQueries(1):
+                worker_b.par_code("3560070")
+            worker_a.vider()
+
+    def test_api_par_code(self):
+        user = get_user_model().objects.create_user('caisse', password='x')
+        self.client.force_login(user)
+        response = self.client.get(reverse('produits:par_code', args=["3560070"]))
+        self.assertEqual(response.json()['prix_vente'], '1.50')
+        self.assertEqual(self.client.get(reverse('produits:par_code', args=["inconnu"])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('produits:cache')).json()['misses'], 2)
+
+
+class ProduitFormulaireTests(TestCase):
+    def test_modification_sans_stock(self):
+        user = get_user_model().objects.create_user('gerant', password='x')
+        self.client.force_login(user)
+        produit = Produit.objects.create(nom="Savon", code="S1", prix_vente=Decimal('1.50'), stock=4)
+        self.client.post(reverse('produits:modifier', args=[produit.pk]),
+                         {'nom': "Savon", 'code': "S1", 'prix_vente': '2.00', 'monnaie': 'CFA', 'stock': 99})
+        produit.refresh_from_db()
+        self.assertEqual((produit.prix_vente, produit.stock), (Decimal('2.00'), 4))
+
+    def test_creation_valorise_le_stock_initial(self):
+        from stocks.models import MouvementStock
+        user = get_user_model().objects.create_user('gerant', password='x')
+        self.client.force_login(user)
+        donnees = {'nom': "Savon", 'code': "S1", 'prix_vente': '2.00', 'monnaie': 'CFA', 'stock': 5}
+        self.assertIn('cout_initial', ProduitForm(donnees).errors)
+        self.client.post(reverse('produits:ajouter'), dict(donnees, cout_initial='1.20'))
+        ouverture = MouvementStock.objects.get(produit__code="S1")
+        self.assertEqual((ouverture.quantite, ouverture.cout_unitaire), (5, Decimal('1.2000')))
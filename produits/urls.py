@@ -1,7 +1,8 @@
 from django.urls import path
 from .views import (
     ProduitListView, ProduitDetailView,
-    ProduitCreateView, ProduitUpdateView, ProduitDeleteView
+    ProduitCreateView, ProduitUpdateView, ProduitDeleteView,
+    produit_par_code, statistiques_cache
 )
 
 app_name = 'produits'
@@ -11,4 +12,6 @@ urlpatterns = [
     path('<int:pk>/',       ProduitDetailView.as_view(), name='detail'),
     path('<int:pk>/modifier/', ProduitUpdateView.as_view(), name='modifier'),
     path('<int:pk>/supprimer/',ProduitDeleteView.as_view(), name='supprimer'),
+    path('api/code/<str:code>/', produit_par_code,     name='par_code'),
+    path('api/cache/',           statistiques_cache,   name='cache'),
 ]
\ No newline at end of file
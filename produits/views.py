@@ -1,7 +1,10 @@
+from dataclasses import asdict
+from django.http import JsonResponse
 from django.urls import reverse_lazy
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from .models import Produit
-from .forms import ProduitForm
+from .forms import ProduitForm, ProduitModificationForm
+from .cache import cache_produits
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 
@@ -25,11 +28,27 @@ class ProduitCreateView(LoginRequiredMixin, CreateView):
 
 class ProduitUpdateView(LoginRequiredMixin, UpdateView):
     model = Produit
-    form_class = ProduitForm
+    form_class = ProduitModificationForm
     template_name = 'produits/form.html'
     success_url = reverse_lazy('produits:liste')
 
 class ProduitDeleteView(LoginRequiredMixin, DeleteView):
     model = Produit
     template_name = 'produits/confirm_delete.html'
-    success_url = reverse_lazy('produits:liste')
\ No newline at end of file
+    success_url = reverse_lazy('produits:liste')
+
+
+@login_required
+def produit_par_code(request, code):
+    """Fiche produit pour la caisse (lecture de code-barres), servie par le cache."""
+    fiche = cache_produits.par_code(code)
+    if fiche is None:
+        return JsonResponse({'erreur': f"Produit inconnu : {code}"}, status=404)
+    data = asdict(fiche)
+    data['prix_vente'] = str(fiche.prix_vente)
+    return JsonResponse(data)
+
+
+@login_required
+def statistiques_cache(request):
+    return JsonResponse(cache_produits.statistiques())
@@ -0,0 +1,118 @@
+# services/export_factures.py
+
+"""
+Export groupé des factures de vente dans une archive ZIP.
+
+Les ventes sont lues par paquets (client + lignes + paiements en trois
+requêtes par paquet) et les PDF sont dessinés dans un pool de processus :
+le processus principal ne fait que préparer les données et écrire l'archive,
+le rendu ReportLab se répartit sur les cœurs. Une fenêtre bornée de tâches
+en vol limite la mémoire, et l'archive est produite au fil de l'eau
+(réponse HTTP en streaming ou fichier).
+"""
+
+import os
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from .pdf import PREFETCH_VENTE, dessiner_vente, donnees_vente, empreinte
+
+TAILLE_PAQUET = 200
+
+
+def _initialiser_worker():
+    import django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'GOYAVE.settings')
+    django.setup()
+
+
+def _rendre(nom: str, donnees: dict):
+    tampon = BytesIO()
+    dessiner_vente(donnees, tampon)
+    return nom, tampon.getvalue()
+
+
+def _documents(ventes):
+    """
+    (nom, données, contenu existant ou None) pour chaque vente : une facture
+    déjà générée avec la même empreinte est relue plutôt que redessinée.
+    """
+    qs = ventes.select_related('client').prefetch_related(*PREFETCH_VENTE).order_by('date', 'pk')
+    for vente in qs.iterator(chunk_size=TAILLE_PAQUET):
+        donnees = donnees_vente(vente)
+        nom = f"facture_vente_{vente.pk}.pdf"
+        contenu = None
+        if vente.facture_pdf and vente.facture_empreinte == empreinte(donnees):
+            try:
+                with open(vente.facture_pdf.path, 'rb') as f:
+                    contenu = f.read()
+            except OSError:
+                pass
+        yield nom, donnees, contenu
+
+
+def rendre_factures(ventes, workers=None):
+    """
+    Itère sur (nom, octets PDF) dans l'ordre des ventes. workers=1 rend dans
+    le processus courant (pas de pool).
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for nom, donnees, contenu in _documents(ventes):
+            yield (nom, contenu) if contenu is not None else _rendre(nom, donnees)
+        return
+
+    fenetre = deque()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_initialiser_worker) as pool:
+        for nom, donnees, contenu in _documents(ventes):
+            fenetre.append((nom, contenu) if contenu is not None else pool.submit(_rendre, nom, donnees))
+            if len(fenetre) >= workers * 4:
+                yield _resultat(fenetre.popleft())
+        while fenetre:
+            yield _resultat(fenetre.popleft())
+
+
+def _resultat(element):
+    return element if isinstance(element, tuple) else element.result()
+
+
+class _Flux:
+    """Destination non adressable pour ZipFile : les octets écrits sont récupérés par vider()."""
+
+    def __init__(self):
+        self._morceaux = []
+
+    def write(self, data):
+        self._morceaux.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def vider(self) -> bytes:
+        data, self._morceaux = b''.join(self._morceaux), []
+        return data
+
+
+def zip_factures(ventes, workers=None):
+    """
+    Produit l'archive ZIP par morceaux d'octets. Les PDF étant déjà
+    compressés par ReportLab, ils sont stockés sans recompression.
+    """
+    flux = _Flux()
+    with zipfile.ZipFile(flux, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for nom, contenu in rendre_factures(ventes, workers):
+            archive.writestr(nom, contenu)
+            yield flux.vider()
+    yield flux.vider()
+
+
+def exporter_factures(ventes, chemin: str, workers=None) -> int:
+    """Écrit l'archive dans chemin et renvoie le nombre de factures."""
+    with open(chemin, 'wb') as sortie:
+        for morceau in zip_factures(ventes, workers):
+            sortie.write(morceau)
+    with zipfile.ZipFile(chemin) as archive:
+        return len(archive.namelist())
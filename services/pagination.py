@@ -0,0 +1,103 @@
+# services/pagination.py
+
+import base64
+from datetime import datetime
+from django.db.models import Q
+
+# --------------------------------------------------
+#  Pagination par curseur (keyset) sur (champ date, id)
+#  Coût constant quelle que soit la profondeur de page,
+#  contrairement à OFFSET qui relit toutes les lignes précédentes.
+# --------------------------------------------------
+
+
+def encoder_curseur(valeur: datetime, pk: int) -> str:
+    brut = f"{valeur.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(brut).decode().rstrip('=')
+
+
+def decoder_curseur(curseur: str):
+    """Renvoie (datetime, pk) ou None si le curseur est invalide"""
+    try:
+        brut = base64.urlsafe_b64decode(curseur + '=' * (-len(curseur) % 4)).decode()
+        valeur, pk = brut.rsplit('|', 1)
+        return datetime.fromisoformat(valeur), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+class PageKeyset:
+    """Page de résultats, compatible avec `page_obj` des templates"""
+
+    def __init__(self, object_list, has_next, has_previous, champ):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.champ = champ
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    def _curseur(self, obj):
+        return encoder_curseur(getattr(obj, self.champ), obj.pk)
+
+    @property
+    def next_cursor(self):
+        return self._curseur(self.object_list[-1]) if self._has_next else None
+
+    @property
+    def previous_cursor(self):
+        return self._curseur(self.object_list[0]) if self._has_previous else None
+
+
+def paginer_keyset(queryset, curseur=None, sens='suivant', par_page=20, champ='date'):
+    """
+    Renvoie une PageKeyset triée par (champ, id) décroissants.
+    `curseur` désigne la dernière ligne de la page précédente (sens='suivant')
+    ou la première ligne de la page suivante (sens='precedent').
+    """
+    position = decoder_curseur(curseur) if curseur else None
+    if position is None:
+        lignes = list(queryset.order_by(f'-{champ}', '-pk')[:par_page + 1])
+        return PageKeyset(lignes[:par_page], len(lignes) > par_page, False, champ)
+
+    valeur, pk = position
+    if sens == 'precedent':
+        apres = Q(**{f'{champ}__gt': valeur}) | Q(**{champ: valeur, 'pk__gt': pk})
+        lignes = list(queryset.filter(apres).order_by(champ, 'pk')[:par_page + 1])
+        plus = len(lignes) > par_page
+        return PageKeyset(lignes[:par_page][::-1], True, plus, champ)
+
+    avant = Q(**{f'{champ}__lt': valeur}) | Q(**{champ: valeur, 'pk__lt': pk})
+    lignes = list(queryset.filter(avant).order_by(f'-{champ}', '-pk')[:par_page + 1])
+    return PageKeyset(lignes[:par_page], len(lignes) > par_page, True, champ)
+
+
+class KeysetPaginationMixin:
+    """
+    Remplace la pagination OFFSET d'une ListView par une pagination par curseur.
+    Paramètres GET : `curseur` et `sens` (suivant / precedent).
+    """
+    keyset_field = 'date'
+
+    def paginate_queryset(self, queryset, page_size):
+        page = paginer_keyset(
+            queryset,
+            curseur=self.request.GET.get('curseur'),
+            sens=self.request.GET.get('sens', 'suivant'),
+            par_page=page_size,
+            champ=self.keyset_field,
+        )
+        return (None, page, page.object_list, page.has_other_pages())
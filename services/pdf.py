@@ -1,13 +1,17 @@
 # services/pdf.py
 
+import hashlib
+import json
 import os
+from io import BytesIO
 from django.conf import settings
+from django.db.models import Prefetch, prefetch_related_objects
 from django.utils import timezone
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import mm
 from reportlab.pdfgen import canvas
 
-from ventes.models import Vente
+from ventes.models import PaiementVente, Vente, VenteDetail
 from fournisseurs.models import CommandeFournisseur
 
 # --------------------------------------------------
@@ -20,30 +24,102 @@ FACTURES_COMMANDES = os.path.join(BASE_FACTURES, 'factures_commandes')
 os.makedirs(FACTURES_VENTES, exist_ok=True)
 os.makedirs(FACTURES_COMMANDES, exist_ok=True)
 
+# à incrémenter quand la mise en page change : les empreintes existantes
+# ne correspondent plus et les documents sont redessinés
+VERSION_MISE_EN_PAGE = 1
 
-def generate_vente_pdf(vente: Vente) -> str:
+
+def empreinte(donnees: dict) -> str:
+    """Empreinte SHA-256 des données affichées sur le document."""
+    contenu = json.dumps([VERSION_MISE_EN_PAGE, donnees], sort_keys=True, default=str)
+    return hashlib.sha256(contenu.encode('utf-8')).hexdigest()
+
+
+def fichier_a_jour(obj, empreinte_donnees: str) -> bool:
+    return bool(
+        obj.facture_pdf and obj.facture_empreinte == empreinte_donnees
+        and os.path.exists(obj.facture_pdf.path)
+    )
+
+
+def _enregistrer(obj, dossier: str, prefixe: str, contenu: bytes, empreinte_donnees: str) -> str:
+    if obj.facture_pdf and os.path.exists(obj.facture_pdf.path):
+        os.remove(obj.facture_pdf.path)
+
+    ts       = timezone.now().strftime('%Y%m%d_%H%M%S')
+    filename = f"{prefixe}_{obj.pk}_{ts}.pdf"
+    with open(os.path.join(dossier, filename), 'wb') as f:
+        f.write(contenu)
+
+    rel_path = os.path.relpath(os.path.join(dossier, filename), settings.MEDIA_ROOT)
+    obj.facture_pdf.name = rel_path
+    obj.facture_empreinte = empreinte_donnees
+    obj.save(update_fields=['facture_pdf', 'facture_empreinte'])
+    return rel_path
+
+
+def _produire(obj, donnees: dict, dessiner, dossier: str, prefixe: str, persister: bool, en_memoire: bool):
     """
-    Génère la facture PDF d'une vente dans
-    MEDIA_ROOT/factures/factures_achat/
-    et renvoie son chemin relatif.
+    Rend (chemin relatif ou None, octets ou None). Le document est dessiné en
+    mémoire ; il n'est écrit sur disque que si persister est vrai. Un fichier
+    stocké dont l'empreinte correspond est réutilisé tel quel.
     """
-    vente.refresh_from_db()
-    if vente.facture_pdf and os.path.exists(vente.facture_pdf.path):
-        os.remove(vente.facture_pdf.path)
+    cle = empreinte(donnees)
+    if fichier_a_jour(obj, cle):
+        contenu = None
+        if en_memoire:
+            with open(obj.facture_pdf.path, 'rb') as f:
+                contenu = f.read()
+        return obj.facture_pdf.name, contenu
+
+    tampon = BytesIO()
+    dessiner(donnees, tampon)
+    contenu = tampon.getvalue()
+    chemin = _enregistrer(obj, dossier, prefixe, contenu, cle) if persister else None
+    return chemin, contenu
+
+
+# --------------------------------------------------
+#  Factures de vente
+# --------------------------------------------------
+
+# lignes et paiements d'un lot de ventes en deux requêtes
+PREFETCH_VENTE = (
+    Prefetch('lignes', queryset=VenteDetail.objects.select_related('produit').order_by('pk')),
+    Prefetch('paiements', queryset=PaiementVente.objects.order_by('date_paiement', 'pk')),
+)
 
-    ts       = timezone.now().strftime('%Y%m%d_%H%M%S')
-    filename = f"vente_{vente.pk}_{ts}.pdf"
-    path     = os.path.join(FACTURES_VENTES, filename)
 
-    c = canvas.Canvas(path, pagesize=A4)
+def donnees_vente(vente: Vente) -> dict:
+    """
+    Tout ce qui est affiché sur la facture, en valeurs simples.
+    La vente doit être chargée avec client et PREFETCH_VENTE.
+    """
+    paiements = vente.paiements.all()
+    return {
+        'numero':    vente.pk,
+        'client':    vente.client.nom,
+        'date':      vente.date.strftime('%d/%m/%Y %H:%M'),
+        'lignes':    [(lg.produit.nom, lg.quantite, str(lg.prix_unitaire), str(lg.montant_ligne))
+                      for lg in vente.lignes.all()],
+        'paiements': [(p.date_paiement.strftime('%d/%m/%Y %H:%M'), str(p.montant)) for p in paiements],
+        'total':     str(vente.montant_total),
+        'total_paye': str(sum((p.montant for p in paiements), 0)),
+        'reste_du':  str(vente.reste_du),
+    }
+
+
+def dessiner_vente(d: dict, destination) -> None:
+    """Dessine la facture dans destination (chemin ou fichier binaire)."""
+    c = canvas.Canvas(destination, pagesize=A4)
     w, h = A4
 
     # En-tête
     c.setFont('Helvetica-Bold', 16)
-    c.drawString(20*mm, h-20*mm, f"Facture Vente #{vente.pk}")
+    c.drawString(20*mm, h-20*mm, f"Facture Vente #{d['numero']}")
     c.setFont('Helvetica', 10)
-    c.drawString(20*mm, h-30*mm, f"Client: {vente.client.nom}")
-    c.drawString(20*mm, h-35*mm, f"Date: {vente.date.strftime('%d/%m/%Y %H:%M')}")
+    c.drawString(20*mm, h-30*mm, f"Client: {d['client']}")
+    c.drawString(20*mm, h-35*mm, f"Date: {d['date']}")
 
     # Colonnes
     y = h - 50*mm
@@ -54,11 +130,11 @@ def generate_vente_pdf(vente: Vente) -> str:
     y -= 5*mm
 
     # Lignes de vente
-    for lg in vente.lignes.all():
-        c.drawString(20*mm, y, lg.produit.nom)
-        c.drawString(60*mm, y, str(lg.quantite))
-        c.drawString(100*mm, y, f"{lg.prix_unitaire}")
-        c.drawString(140*mm, y, f"{lg.montant_ligne}")
+    for nom, quantite, prix, montant in d['lignes']:
+        c.drawString(20*mm, y, nom)
+        c.drawString(60*mm, y, str(quantite))
+        c.drawString(100*mm, y, prix)
+        c.drawString(140*mm, y, montant)
         y -= 5*mm
         if y < 40*mm:
             c.showPage()
@@ -70,10 +146,8 @@ def generate_vente_pdf(vente: Vente) -> str:
     c.drawString(20*mm, y, "Paiements")
     y -= 5*mm
     c.setFont('Helvetica', 9)
-    total_pay = 0
-    for p in vente.paiements.all():
-        c.drawString(20*mm, y, f"{p.date_paiement.strftime('%d/%m/%Y %H:%M')} : {p.montant}")
-        total_pay += p.montant
+    for date, montant in d['paiements']:
+        c.drawString(20*mm, y, f"{date} : {montant}")
         y -= 5*mm
         if y < 30*mm:
             c.showPage()
@@ -82,44 +156,68 @@ def generate_vente_pdf(vente: Vente) -> str:
     # Totaux
     y -= 10*mm
     c.setFont('Helvetica-Bold', 11)
-    c.drawString(20*mm, y, f"Montant total: {vente.montant_total}")
+    c.drawString(20*mm, y, f"Montant total: {d['total']}")
     y -= 5*mm
-    c.drawString(20*mm, y, f"Somme paiements: {total_pay}")
+    c.drawString(20*mm, y, f"Somme paiements: {d['total_paye']}")
     y -= 5*mm
-    c.drawString(20*mm, y, f"Reste dû: {vente.reste_du}")
+    c.drawString(20*mm, y, f"Reste dû: {d['reste_du']}")
 
     c.showPage()
     c.save()
 
-    rel_path = os.path.join('factures', 'factures_achat', filename)
-    vente.facture_pdf.name = rel_path
-    vente.save(update_fields=['facture_pdf'])
-    return rel_path
+
+def generate_vente_pdf(vente: Vente) -> str:
+    """
+    Génère la facture PDF d'une vente dans
+    MEDIA_ROOT/factures/factures_achat/
+    et renvoie son chemin relatif. Si l'empreinte des données n'a pas
+    changé depuis le dernier rendu, le fichier existant est réutilisé.
+    """
+    chemin, _ = _vente(vente, persister=True, en_memoire=False)
+    return chemin
 
 
-def generate_commande_pdf(cmd: CommandeFournisseur) -> str:
+def rendre_vente_pdf(vente: Vente, persister: bool = False) -> bytes:
     """
-    Génère le bon de commande fournisseur dans
-    MEDIA_ROOT/factures/factures_commandes/
-    et renvoie son chemin relatif.
+    Facture rendue en mémoire (aperçu, réponse directe). Avec persister,
+    le fichier est aussi enregistré comme par generate_vente_pdf.
     """
-    cmd.refresh_from_db()
-    if cmd.facture_pdf and os.path.exists(cmd.facture_pdf.path):
-        os.remove(cmd.facture_pdf.path)
+    _, contenu = _vente(vente, persister=persister, en_memoire=True)
+    return contenu
 
-    ts       = timezone.now().strftime('%Y%m%d_%H%M%S')
-    filename = f"commande_{cmd.pk}_{ts}.pdf"
-    path     = os.path.join(FACTURES_COMMANDES, filename)
 
-    c = canvas.Canvas(path, pagesize=A4)
+def _vente(vente: Vente, persister: bool, en_memoire: bool):
+    vente.refresh_from_db()
+    prefetch_related_objects([vente], *PREFETCH_VENTE)
+    return _produire(vente, donnees_vente(vente), dessiner_vente, FACTURES_VENTES, 'vente', persister, en_memoire)
+
+
+# --------------------------------------------------
+#  Bons de commande fournisseur
+# --------------------------------------------------
+
+def donnees_commande(cmd: CommandeFournisseur) -> dict:
+    lignes = list(cmd.lignes.select_related('produit').order_by('pk'))
+    return {
+        'numero':      cmd.pk,
+        'fournisseur': cmd.fournisseur.nom,
+        'date':        cmd.date_commande.strftime('%d/%m/%Y %H:%M'),
+        'lignes':      [(lg.produit.nom, lg.quantite, str(lg.prix_achat), str(lg.quantite * lg.prix_achat))
+                        for lg in lignes],
+        'total':       str(sum((lg.quantite * lg.prix_achat for lg in lignes), 0)),
+    }
+
+
+def dessiner_commande(d: dict, destination) -> None:
+    c = canvas.Canvas(destination, pagesize=A4)
     w, h = A4
 
     # En-tête
     c.setFont('Helvetica-Bold', 16)
-    c.drawString(20*mm, h-20*mm, f"Bon de commande #{cmd.pk}")
+    c.drawString(20*mm, h-20*mm, f"Bon de commande #{d['numero']}")
     c.setFont('Helvetica', 10)
-    c.drawString(20*mm, h-30*mm, f"Fournisseur: {cmd.fournisseur.nom}")
-    c.drawString(20*mm, h-35*mm, f"Date: {cmd.date_commande.strftime('%d/%m/%Y %H:%M')}")
+    c.drawString(20*mm, h-30*mm, f"Fournisseur: {d['fournisseur']}")
+    c.drawString(20*mm, h-35*mm, f"Date: {d['date']}")
 
     # Colonnes
     y = h - 50*mm
@@ -130,14 +228,11 @@ def generate_commande_pdf(cmd: CommandeFournisseur) -> str:
     y -= 5*mm
 
     # Lignes de commande
-    total = 0
-    for lg in cmd.lignes.all():
-        line = lg.quantite * lg.prix_achat
-        c.drawString(20*mm, y, lg.produit.nom)
-        c.drawString(65*mm, y, str(lg.quantite))
-        c.drawString(110*mm, y, f"{lg.prix_achat}")
-        c.drawString(150*mm, y, f"{line}")
-        total += line
+    for nom, quantite, prix, montant in d['lignes']:
+        c.drawString(20*mm, y, nom)
+        c.drawString(65*mm, y, str(quantite))
+        c.drawString(110*mm, y, prix)
+        c.drawString(150*mm, y, montant)
         y -= 5*mm
         if y < 30*mm:
             c.showPage()
@@ -146,12 +241,29 @@ def generate_commande_pdf(cmd: CommandeFournisseur) -> str:
     # Total général
     y -= 10*mm
     c.setFont('Helvetica-Bold', 11)
-    c.drawString(20*mm, y, f"Montant total: {total}")
+    c.drawString(20*mm, y, f"Montant total: {d['total']}")
 
     c.showPage()
     c.save()
 
-    rel_path = os.path.join('factures', 'factures_commandes', filename)
-    cmd.facture_pdf.name = rel_path
-    cmd.save(update_fields=['facture_pdf'])
-    return rel_path
+
+def generate_commande_pdf(cmd: CommandeFournisseur) -> str:
+    """
+    Génère le bon de commande fournisseur dans
+    MEDIA_ROOT/factures/factures_commandes/
+    et renvoie son chemin relatif (réutilisé si l'empreinte est inchangée).
+    """
+    chemin, _ = _commande(cmd, persister=True, en_memoire=False)
+    return chemin
+
+
+def rendre_commande_pdf(cmd: CommandeFournisseur, persister: bool = False) -> bytes:
+    """Bon de commande rendu en mémoire, enregistré en plus si persister."""
+    _, contenu = _commande(cmd, persister=persister, en_memoire=True)
+    return contenu
+
+
+def _commande(cmd: CommandeFournisseur, persister: bool, en_memoire: bool):
+    cmd.refresh_from_db()
+    return _produire(cmd, donnees_commande(cmd), dessiner_commande, FACTURES_COMMANDES, 'commande',
+                     persister, en_memoire)
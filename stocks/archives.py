@@ -0,0 +1,167 @@
+# stocks/archives.py
+
+import csv
+import gzip
+import os
+from datetime import datetime
+from decimal import Decimal
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from produits.models import Produit
+from .models import MouvementStock, ArchiveMouvements, ValeurStock
+from .services import debut_periode, periode_suivante, soldes_par_produit
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Parquet optionnel
+    pyarrow = None
+
+# --------------------------------------------------
+#  Archivage des mouvements anciens : un fichier par mois sous
+#  MEDIA_ROOT/archives/mouvements, puis un solde d'ouverture par produit
+# --------------------------------------------------
+DOSSIER_ARCHIVES = os.path.join('archives', 'mouvements')
+COLONNES = ['id', 'date', 'produit_id', 'produit_code', 'produit_nom',
+            'type', 'quantite', 'reference', 'source_type', 'source_id']
+FORMATS = ('csv', 'parquet')
+
+
+def date_limite_archives():
+    """Date avant laquelle les mouvements ne sont plus en base (ou None)"""
+    return ArchiveMouvements.objects.aggregate(fin=Max('fin'))['fin']
+
+
+def verifier_non_archive(date, message="Document archivé : son stock ne peut plus être modifié"):
+    limite = date_limite_archives()
+    if limite and date < limite:
+        raise ValidationError(message)
+
+
+def _lignes_du_mois(debut, fin):
+    # plus récents d'abord : le journal d'un mois archivé se pagine en flux
+    qs = (MouvementStock.objects
+          .filter(date__gte=debut, date__lt=fin)
+          .order_by('-date', '-pk')
+          .values_list('pk', 'date', 'produit_id', 'produit__code', 'produit__nom',
+                       'type', 'quantite', 'reference', 'source_type', 'source_id'))
+    return qs.iterator(chunk_size=5000)
+
+
+def _ecrire_csv(chemin, lignes) -> int:
+    n = 0
+    with gzip.open(chemin, 'wt', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(COLONNES)
+        for ligne in lignes:
+            writer.writerow([ligne[0], ligne[1].isoformat(), *ligne[2:]])
+            n += 1
+    return n
+
+
+def _ecrire_parquet(chemin, lignes) -> int:
+    colonnes = {c: [] for c in COLONNES}
+    for ligne in lignes:
+        for c, v in zip(COLONNES, ligne):
+            colonnes[c].append(v)
+    pyarrow.parquet.write_table(pyarrow.table(colonnes), chemin, compression='zstd')
+    return len(colonnes['id'])
+
+
+def archiver_mouvements(avant: datetime, format: str = 'csv') -> list:
+    """
+    Archive les mouvements antérieurs au début du mois de `avant` :
+    1) un fichier compressé par mois (CSV gzip, ou Parquet si pyarrow)
+    2) suppression des mouvements archivés
+    3) un mouvement OUVERTURE par produit, daté de la coupure, portant le
+       solde archivé : les soldes calculés sur le journal restent justes
+       (les snapshots antérieurs sont conservés pour l'historique, mais
+       stock_au et creer_snapshots les ignorent au-delà de la coupure)
+    Renvoie la liste des ArchiveMouvements créées.
+    """
+    if format == 'parquet' and pyarrow is None:
+        raise ValueError("Le format parquet nécessite pyarrow")
+    coupure = debut_periode(avant, 'MOIS')
+    anciens = MouvementStock.objects.filter(date__lt=coupure)
+    premier = anciens.order_by('date').values_list('date', flat=True).first()
+    if premier is None:
+        return []
+
+    dossier = os.path.join(settings.MEDIA_ROOT, DOSSIER_ARCHIVES)
+    os.makedirs(dossier, exist_ok=True)
+    archives = []
+    with transaction.atomic():
+        soldes = soldes_par_produit(anciens)
+
+        debut = debut_periode(premier, 'MOIS')
+        while debut < coupure:
+            fin = periode_suivante(debut, 'MOIS')
+            nom = f"mouvements_{debut:%Y-%m}.{'parquet' if format == 'parquet' else 'csv.gz'}"
+            chemin = os.path.join(dossier, nom)
+            ecrire = _ecrire_parquet if format == 'parquet' else _ecrire_csv
+            n = ecrire(chemin + '.tmp', _lignes_du_mois(debut, fin))
+            if n:
+                os.replace(chemin + '.tmp', chemin)
+                archives.append(ArchiveMouvements.objects.create(
+                    mois=timezone.localtime(debut).date(), fin=coupure,
+                    fichier=os.path.join(DOSSIER_ARCHIVES, nom), nb_lignes=n
+                ))
+            else:
+                os.remove(chemin + '.tmp')
+            debut = fin
+
+        anciens.delete()
+
+        # soldes d'ouverture (bulk_create : Produit.stock n'est pas modifié),
+        # au coût moyen pondéré courant pour qu'une revalorisation les garde
+        ref = f"Solde d'ouverture au {timezone.localtime(coupure):%d/%m/%Y}"
+        couts = {v.produit_id: v.cout_moyen for v in ValeurStock.objects.filter(produit__in=list(soldes))}
+        cree_depuis = timezone.now()
+        MouvementStock.objects.bulk_create([
+            MouvementStock(
+                produit_id=produit_id,
+                type=MouvementStock.ENTREE if solde > 0 else MouvementStock.SORTIE,
+                quantite=abs(solde),
+                reference=ref,
+                source_type=MouvementStock.OUVERTURE,
+                cout_unitaire=couts.get(produit_id, Decimal('0')),
+            )
+            for produit_id, solde in soldes.items() if solde
+        ], batch_size=2000)
+        # auto_now_add impose la date courante : on date les soldes de la coupure
+        MouvementStock.objects.filter(
+            source_type=MouvementStock.OUVERTURE, reference=ref, date__gte=cree_depuis
+        ).update(date=coupure)
+    return archives
+
+
+def lire_archive(archive: ArchiveMouvements):
+    """
+    Relit un mois archivé sous forme de MouvementStock non enregistrés
+    (produit partiellement renseigné : pk, code, nom), du plus récent au
+    plus ancien.
+    """
+    chemin = os.path.join(settings.MEDIA_ROOT, archive.fichier)
+    if chemin.endswith('.parquet'):
+        if pyarrow is None:
+            raise ValueError("La lecture des archives parquet nécessite pyarrow")
+        lignes = pyarrow.parquet.read_table(chemin).to_pylist()
+    else:
+        f = gzip.open(chemin, 'rt', encoding='utf-8', newline='')
+        lignes = _lignes_csv(f)
+    for l in lignes:
+        date = l['date'] if isinstance(l['date'], datetime) else datetime.fromisoformat(l['date'])
+        yield MouvementStock(
+            id=int(l['id']), date=date, type=l['type'], quantite=int(l['quantite']),
+            reference=l['reference'] or '', source_type=l['source_type'],
+            source_id=int(l['source_id']) if l['source_id'] not in (None, '') else None,
+            produit=Produit(pk=int(l['produit_id']), code=l['produit_code'], nom=l['produit_nom']),
+        )
+
+
+def _lignes_csv(f):
+    with f:
+        yield from csv.DictReader(f)
@@ -4,4 +4,18 @@ from .models import MouvementStock
 class MouvementStockForm(forms.ModelForm):
     class Meta:
         model = MouvementStock
-        fields = ['produit', 'type', 'quantite', 'reference']
\ No newline at end of file
+        fields = ['produit', 'type', 'quantite', 'reference', 'cout_unitaire']
+
+
+class MouvementFiltreForm(forms.Form):
+    produit = forms.CharField(label='Code produit', required=False)
+    type    = forms.ChoiceField(label='Type', required=False,
+                                choices=[('', 'Tous')] + MouvementStock.TYPE_CHOICES)
+    du      = forms.DateField(label='Du', required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    au      = forms.DateField(label='Au', required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+
+
+class MouvementImportForm(forms.Form):
+    fichier = forms.FileField(label='Fichier CSV ou JSONL',
+                              help_text='Colonnes : code, type (ENTREE/SORTIE), quantite, reference, cout_unitaire')
+    format  = forms.ChoiceField(label='Format', choices=[('csv', 'CSV'), ('jsonl', 'JSONL')])
@@ -0,0 +1,185 @@
+# stocks/imports.py
+
+import csv
+import json
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from django.core.exceptions import ValidationError
+from produits.models import Produit
+from .models import MouvementStock
+from .services import enregistrer_mouvements
+
+# --------------------------------------------------
+#  Import en masse de mouvements (CSV / JSONL)
+#  Colonnes / clés : code, type (ENTREE|SORTIE), quantite,
+#  reference et cout_unitaire (optionnels)
+# --------------------------------------------------
+
+FORMATS = ('csv', 'jsonl')
+
+
+def lire_lignes(fichier, format: str):
+    """
+    Itère sur (numéro de ligne, valeurs) d'un flux binaire ou texte, sans tout
+    charger en mémoire. Une ligne illisible (encodage, JSON invalide, valeur
+    qui n'est pas un objet) est rendue comme une ValueError à la place des
+    valeurs : elle est comptée en erreur sans interrompre l'import.
+    """
+    if format == 'csv':
+        return _lignes_csv(fichier)
+    if format == 'jsonl':
+        return _lignes_jsonl(fichier)
+    raise ValueError(f"Format inconnu : {format}")
+
+
+def _decoder(fichier):
+    """(numéro, texte) par ligne ; texte est None si la ligne n'est pas en UTF-8"""
+    for num, brut in enumerate(fichier, start=1):
+        if isinstance(brut, bytes):
+            try:
+                brut = brut.decode('utf-8-sig' if num == 1 else 'utf-8')
+            except UnicodeDecodeError:
+                brut = None
+        yield num, brut
+
+
+def _lignes_jsonl(fichier):
+    for num, brut in _decoder(fichier):
+        if brut is None:
+            yield num, ValueError("encodage invalide (UTF-8 attendu)")
+        elif brut.strip():
+            try:
+                valeurs = json.loads(brut)
+            except ValueError as e:
+                yield num, ValueError(f"JSON invalide : {e}")
+                continue
+            if not isinstance(valeurs, dict):
+                yield num, ValueError("objet JSON attendu")
+            else:
+                yield num, valeurs
+
+
+def _lignes_csv(fichier):
+    illisibles = set()
+
+    def textes():
+        for num, texte in _decoder(fichier):
+            if texte is None:
+                illisibles.add(num)
+                texte = '\n'  # ligne vide pour le lecteur CSV, signalée ci-dessous
+            yield texte
+
+    lecteur = csv.reader(textes())
+    entete = next(lecteur, None)
+    if entete is None:
+        return
+    if illisibles:
+        raise ValueError("en-tête illisible (UTF-8 attendu)")
+    for valeurs in lecteur:
+        if lecteur.line_num in illisibles:
+            yield lecteur.line_num, ValueError("encodage invalide (UTF-8 attendu)")
+        elif valeurs:
+            yield lecteur.line_num, dict(zip(entete, valeurs))
+
+
+def _quantite(valeur) -> int:
+    """Quantité entière : 1.9 ou true (JSON) sont refusés plutôt que tronqués"""
+    if isinstance(valeur, bool) or (isinstance(valeur, float) and not valeur.is_integer()):
+        raise ValueError(f"quantité non entière « {valeur} »")
+    try:
+        return int(valeur or 0)
+    except (TypeError, ValueError):
+        raise ValueError(f"quantité invalide « {valeur} »")
+
+
+def _lire_ligne(ligne: dict, produits: dict) -> MouvementStock:
+    code = str(ligne.get('code') or '').strip()
+    if code not in produits:
+        raise ValueError(f"produit inconnu « {code} »")
+    type_ = str(ligne.get('type') or '').strip().upper()
+    if type_ not in (MouvementStock.ENTREE, MouvementStock.SORTIE):
+        raise ValueError(f"type invalide « {type_} »")
+    quantite = _quantite(ligne.get('quantite'))
+    if quantite <= 0:
+        raise ValueError("la quantité doit être supérieure à 0")
+    cout = ligne.get('cout_unitaire')
+    try:
+        cout = Decimal(str(cout)) if cout not in (None, '') else None
+    except InvalidOperation:
+        raise ValueError(f"coût unitaire invalide « {cout} »")
+    return MouvementStock(
+        produit_id=produits[code],
+        type=type_,
+        quantite=quantite,
+        reference=str(ligne.get('reference') or '')[:100],
+        source_type=MouvementStock.IMPORT,
+        cout_unitaire=cout,
+    )
+
+
+def importer_mouvements(lignes, taille_lot: int = 5000) -> dict:
+    """
+    Importe des mouvements par lots à partir de (numéro, valeurs) : une
+    requête pour résoudre les codes produit du lot, un bulk_create, et un
+    UPDATE des stocks par lot de produits (deltas sommés). Aucun signal
+    post_save n'est émis.
+    Les lignes invalides sont écartées ; si le stock d'un produit deviendrait
+    négatif, seules les sorties en cause (dans l'ordre du fichier) sont
+    refusées. Chaque lot validé reste acquis : le rapport (lignes lues,
+    importées, erreurs par numéro de ligne, durée, débit) décrit toujours
+    ce qui a été enregistré.
+    """
+    debut = time.monotonic()
+    rapport = {'lues': 0, 'importees': 0, 'erreurs': []}
+    lignes = iter(lignes)
+    while True:
+        lot = list(islice(lignes, taille_lot))
+        if not lot:
+            break
+        rapport['lues'] += len(lot)
+        codes = {str(l.get('code') or '').strip() for _, l in lot if isinstance(l, dict)}
+        produits = dict(Produit.objects.filter(code__in=codes).values_list('code', 'pk'))
+
+        valides = []
+        for num, ligne in lot:
+            if isinstance(ligne, Exception):
+                rapport['erreurs'].append((num, str(ligne)))
+                continue
+            try:
+                valides.append((num, _lire_ligne(ligne, produits)))
+            except (ValueError, TypeError) as e:
+                rapport['erreurs'].append((num, str(e)))
+        try:
+            enregistrer_mouvements([m for _, m in valides])
+        except ValidationError:
+            valides = _ecarter_sorties_impossibles(valides, {pk: code for code, pk in produits.items()}, rapport)
+            try:
+                enregistrer_mouvements([m for _, m in valides])
+            except ValidationError as e:
+                # stock modifié entre-temps par une autre opération
+                rapport['erreurs'].append((valides[0][0], f"lot refusé : {' '.join(e.messages)}"))
+                continue
+        rapport['importees'] += len(valides)
+
+    rapport['duree'] = time.monotonic() - debut
+    rapport['debit'] = rapport['lues'] / rapport['duree'] if rapport['duree'] else 0
+    return rapport
+
+
+def _ecarter_sorties_impossibles(valides: list, codes: dict, rapport: dict) -> list:
+    """
+    Rejoue le lot dans l'ordre du fichier sur les stocks courants et écarte
+    les sorties qui rendraient un stock négatif. Renvoie les lignes gardées.
+    """
+    stocks = dict(Produit.objects.filter(pk__in={m.produit_id for _, m in valides}).values_list('pk', 'stock'))
+    gardees = []
+    for num, m in valides:
+        delta = m.quantite if m.type == MouvementStock.ENTREE else -m.quantite
+        if stocks[m.produit_id] + delta < 0:
+            rapport['erreurs'].append((num, f"stock insuffisant pour « {codes[m.produit_id]} » "
+                                            f"({stocks[m.produit_id]} disponible(s), {m.quantite} demandé(s))"))
+        else:
+            stocks[m.produit_id] += delta
+            gardees.append((num, m))
+    return gardees
@@ -0,0 +1,26 @@
+from datetime import datetime, time
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from stocks.archives import FORMATS, archiver_mouvements
+
+
+class Command(BaseCommand):
+    help = ("Archive les mouvements antérieurs au mois de --avant dans des fichiers "
+            "mensuels compressés et les remplace par un solde d'ouverture par produit")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--avant', required=True, type=lambda s: datetime.strptime(s, '%Y-%m-%d').date(),
+            help="AAAA-MM-JJ ; les mois entiers antérieurs sont archivés",
+        )
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+
+    def handle(self, *args, **options):
+        avant = timezone.make_aware(datetime.combine(options['avant'], time.min))
+        try:
+            archives = archiver_mouvements(avant, options['format'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        for a in archives:
+            self.stdout.write(f"{a.mois:%m/%Y} : {a.nb_lignes} mouvement(s) -> {a.fichier}")
+        self.stdout.write(self.style.SUCCESS(f"{len(archives)} mois archivé(s)"))
@@ -0,0 +1,31 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from stocks.imports import FORMATS, importer_mouvements, lire_lignes
+
+
+class Command(BaseCommand):
+    help = "Importe des mouvements de stock depuis un fichier CSV ou JSONL"
+
+    def add_arguments(self, parser):
+        parser.add_argument('chemin')
+        parser.add_argument('--format', choices=FORMATS, help="Déduit de l'extension par défaut")
+        parser.add_argument('--taille-lot', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        chemin = options['chemin']
+        format = options['format'] or os.path.splitext(chemin)[1].lstrip('.').lower()
+        if format not in FORMATS:
+            raise CommandError(f"Format non reconnu : {format} (--format {'|'.join(FORMATS)})")
+
+        with open(chemin, 'rb') as fichier:
+            try:
+                rapport = importer_mouvements(lire_lignes(fichier, format), options['taille_lot'])
+            except ValueError as e:
+                raise CommandError(f"Fichier illisible : {e}")
+
+        for num, erreur in rapport['erreurs'][:50]:
+            self.stderr.write(f"Ligne {num} : {erreur}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{rapport['importees']}/{rapport['lues']} ligne(s) importée(s) en "
+            f"{rapport['duree']:.2f}s ({rapport['debit']:.0f} lignes/s)"
+        ))
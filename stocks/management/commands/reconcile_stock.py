@@ -0,0 +1,43 @@
+import time
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from stocks.services import ecarts_stock, corriger_ecarts, sans_journal
+
+
+class Command(BaseCommand):
+    help = ("Compare Produit.stock au solde du journal des mouvements et corrige les écarts "
+            "(--fix, avec --produits ou --confirm)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help="Applique les corrections")
+        parser.add_argument('--produits', nargs='+', metavar='CODE',
+                            help="Limite la comparaison (et la correction) à ces codes produit")
+        parser.add_argument('--confirm', action='store_true',
+                            help="Avec --fix sans --produits : corrige tous les produits en écart")
+        parser.add_argument('--limite', type=int, default=50, help="Nombre d'écarts affichés")
+
+    def handle(self, *args, **options):
+        if options['fix'] and not (options['produits'] or options['confirm']):
+            raise CommandError("--fix écrase Produit.stock : précisez --produits CODE ... ou --confirm")
+
+        debut = time.monotonic()
+        ecarts = ecarts_stock(options['produits'])
+
+        for produit_id, code, stock, solde in ecarts[:options['limite']]:
+            self.stdout.write(f"#{produit_id} {code} : stock={stock} journal={solde} (écart {solde - stock:+d})")
+        if len(ecarts) > options['limite']:
+            self.stdout.write(f"... et {len(ecarts) - options['limite']} autre(s)")
+        negatifs = sum(1 for e in ecarts if e[3] < 0)
+        if negatifs:
+            self.stdout.write(self.style.WARNING(f"{negatifs} solde(s) de journal négatif(s), ramené(s) à 0"))
+        manquants = len(sans_journal(ecarts))
+        if manquants:
+            self.stdout.write(self.style.WARNING(f"{manquants} produit(s) sans aucun mouvement dans le journal"))
+
+        if options['fix'] and ecarts:
+            try:
+                corriges = corriger_ecarts(ecarts)
+            except ValidationError as e:
+                raise CommandError(' '.join(e.messages))
+            self.stdout.write(self.style.SUCCESS(f"{corriges} produit(s) corrigé(s)"))
+        self.stdout.write(f"{len(ecarts)} écart(s) en {time.monotonic() - debut:.2f}s")
@@ -0,0 +1,26 @@
+from datetime import datetime, time
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from stocks.models import SnapshotStock
+from stocks.services import creer_snapshots
+
+
+class Command(BaseCommand):
+    help = "Complète les snapshots de stock (soldes par produit) jusqu'à la dernière période écoulée"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--periodicite', choices=[p for p, _ in SnapshotStock.PERIODICITE_CHOICES],
+            default=SnapshotStock.JOUR,
+        )
+        parser.add_argument(
+            '--jusqua', type=lambda s: datetime.strptime(s, '%Y-%m-%d').date(),
+            help="Date limite AAAA-MM-JJ (par défaut : aujourd'hui)",
+        )
+
+    def handle(self, *args, **options):
+        jusqua = None
+        if options['jusqua']:
+            jusqua = timezone.make_aware(datetime.combine(options['jusqua'], time.min))
+        crees = creer_snapshots(options['periodicite'], jusqua)
+        self.stdout.write(self.style.SUCCESS(f"{crees} snapshot(s) créé(s)"))
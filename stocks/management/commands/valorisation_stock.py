@@ -0,0 +1,32 @@
+from datetime import datetime, time, timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from stocks.valorisation import cout_des_ventes, reinitialiser_valorisation, valeur_stock
+
+
+def _date(s):
+    return datetime.strptime(s, '%Y-%m-%d').date()
+
+
+class Command(BaseCommand):
+    help = "Affiche la valeur du stock (CMP) et le coût des ventes d'une période"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--du', type=_date, help="Début de période AAAA-MM-JJ (défaut : 1er du mois)")
+        parser.add_argument('--au', type=_date, help="Fin de période incluse AAAA-MM-JJ (défaut : aujourd'hui)")
+        parser.add_argument('--reinitialiser', action='store_true',
+                            help="Recalcule toute la valorisation en rejouant le journal")
+
+    def handle(self, *args, **options):
+        if options['reinitialiser']:
+            n = reinitialiser_valorisation()
+            self.stdout.write(f"{n} mouvement(s) revalorisé(s)")
+
+        aujourdhui = timezone.localdate()
+        du = options['du'] or aujourdhui.replace(day=1)
+        au = options['au'] or aujourdhui
+        debut = timezone.make_aware(datetime.combine(du, time.min))
+        fin = timezone.make_aware(datetime.combine(au + timedelta(days=1), time.min))
+
+        self.stdout.write(f"Valeur du stock : {valeur_stock():.2f}")
+        self.stdout.write(f"Coût des ventes du {du:%d/%m/%Y} au {au:%d/%m/%Y} : {cout_des_ventes(debut, fin):.2f}")
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:39
+
+import re
+from django.db import migrations, models
+
+# Références écrites jusqu'ici par ventes.services et ReceptionAppro.save
+REF_VENTE     = re.compile(r'^Vente #(\d+)$')
+REF_RECEPTION = re.compile(r'^Réception #(\d+)')
+
+
+def renseigner_sources(apps, schema_editor):
+    """Déduit source_type / source_id des références texte existantes"""
+    MouvementStock = apps.get_model('stocks', 'MouvementStock')
+    lot = []
+    qs = MouvementStock.objects.exclude(reference='').only('id', 'reference')
+    for m in qs.iterator(chunk_size=2000):
+        for regex, source_type in ((REF_VENTE, 'VENTE'), (REF_RECEPTION, 'RECEPTION')):
+            match = regex.match(m.reference)
+            if match:
+                m.source_type = source_type
+                m.source_id = int(match.group(1))
+                lot.append(m)
+                break
+        if len(lot) >= 2000:
+            MouvementStock.objects.bulk_update(lot, ['source_type', 'source_id'])
+            lot = []
+    if lot:
+        MouvementStock.objects.bulk_update(lot, ['source_type', 'source_id'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produits', '0001_initial'),
+        ('stocks', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mouvementstock',
+            name='source_id',
+            field=models.PositiveBigIntegerField(blank=True, null=True, verbose_name="N° du document d'origine"),
+        ),
+        migrations.AddField(
+            model_name='mouvementstock',
+            name='source_type',
+            field=models.CharField(choices=[('VENTE', 'Vente'), ('RECEPTION', 'Réception fournisseur'), ('AJUSTEMENT', 'Ajustement manuel')], default='AJUSTEMENT', max_length=10, verbose_name='Origine'),
+        ),
+        migrations.RunPython(renseigner_sources, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='mouvementstock',
+            index=models.Index(fields=['source_type', 'source_id', 'produit'], name='mouvement_source_idx'),
+        ),
+    ]
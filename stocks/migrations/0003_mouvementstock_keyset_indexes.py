@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produits', '0001_initial'),
+        ('stocks', '0002_mouvementstock_source'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='mouvementstock',
+            options={'ordering': ['-date', '-id'], 'verbose_name': 'Mouvement de stock', 'verbose_name_plural': 'Mouvements de stock'},
+        ),
+        migrations.AddIndex(
+            model_name='mouvementstock',
+            index=models.Index(fields=['-date', '-id'], name='mouvement_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mouvementstock',
+            index=models.Index(fields=['produit', '-date', '-id'], name='mouvement_produit_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mouvementstock',
+            index=models.Index(fields=['type', '-date', '-id'], name='mouvement_type_date_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produits', '0001_initial'),
+        ('stocks', '0003_mouvementstock_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mouvementstock',
+            name='source_type',
+            field=models.CharField(choices=[('VENTE', 'Vente'), ('RECEPTION', 'Réception fournisseur'), ('AJUSTEMENT', 'Ajustement manuel'), ('OUVERTURE', "Solde d'ouverture")], default='AJUSTEMENT', max_length=10, verbose_name='Origine'),
+        ),
+        migrations.CreateModel(
+            name='SnapshotStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('periodicite', models.CharField(choices=[('JOUR', 'Quotidien'), ('MOIS', 'Mensuel')], max_length=4, verbose_name='Périodicité')),
+                ('date', models.DateTimeField(verbose_name='Solde arrêté au')),
+                ('stock', models.IntegerField(verbose_name='Stock')),
+                ('produit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='produits.produit')),
+            ],
+            options={
+                'verbose_name': 'Snapshot de stock',
+                'verbose_name_plural': 'Snapshots de stock',
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['produit', '-date'], name='snapshot_produit_date_idx'), models.Index(fields=['periodicite', '-date'], name='snapshot_periodicite_idx')],
+                'constraints': [models.UniqueConstraint(fields=('produit', 'periodicite', 'date'), name='snapshot_unique')],
+            },
+        ),
+    ]
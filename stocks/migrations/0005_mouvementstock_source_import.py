@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0004_snapshotstock'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mouvementstock',
+            name='source_type',
+            field=models.CharField(choices=[('VENTE', 'Vente'), ('RECEPTION', 'Réception fournisseur'), ('AJUSTEMENT', 'Ajustement manuel'), ('OUVERTURE', "Solde d'ouverture"), ('IMPORT', 'Import en masse')], default='AJUSTEMENT', max_length=10, verbose_name='Origine'),
+        ),
+    ]
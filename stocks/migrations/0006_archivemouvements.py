@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0005_mouvementstock_source_import'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveMouvements',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mois', models.DateField(unique=True, verbose_name='Mois archivé')),
+                ('fin', models.DateTimeField(verbose_name="Archivé jusqu'au")),
+                ('fichier', models.CharField(max_length=255, verbose_name='Fichier')),
+                ('nb_lignes', models.PositiveIntegerField(verbose_name='Nombre de mouvements')),
+                ('cree_le', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Archive de mouvements',
+                'verbose_name_plural': 'Archives de mouvements',
+                'ordering': ['-mois'],
+            },
+        ),
+    ]
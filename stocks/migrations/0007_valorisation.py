@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:55
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produits', '0001_initial'),
+        ('stocks', '0006_archivemouvements'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ValeurStock',
+            fields=[
+                ('produit', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='valeur_stock', serialize=False, to='produits.produit')),
+                ('quantite', models.IntegerField(default=0, verbose_name='Quantité valorisée')),
+                ('valeur', models.DecimalField(decimal_places=4, default=Decimal('0'), max_digits=16, verbose_name='Valeur')),
+                ('maj_le', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Valeur de stock',
+                'verbose_name_plural': 'Valeurs de stock',
+            },
+        ),
+        migrations.AddField(
+            model_name='mouvementstock',
+            name='cout_unitaire',
+            field=models.DecimalField(blank=True, decimal_places=4, help_text="Entrée : prix d'achat s'il est connu ; sinon coût moyen pondéré", max_digits=14, null=True, verbose_name='Coût unitaire'),
+        ),
+        migrations.AddIndex(
+            model_name='mouvementstock',
+            index=models.Index(fields=['source_type', 'date'], name='mouvement_source_date_idx'),
+        ),
+    ]
@@ -0,0 +1,95 @@
+from decimal import Decimal
+from django.db import migrations
+from django.db.models import Case, F, IntegerField, Max, Min, Sum, When
+
+
+def creer_soldes_ouverture(apps, schema_editor):
+    """
+    Un mouvement OUVERTURE par produit dont le stock n'est pas couvert par le
+    journal (stock saisi avant la journalisation), pour l'écart stock - solde.
+    Daté de la création du produit (au plus tôt de la coupure d'archivage),
+    il est reporté sur les snapshots postérieurs et sur la valorisation.
+    """
+    Produit = apps.get_model('produits', 'Produit')
+    MouvementStock = apps.get_model('stocks', 'MouvementStock')
+    SnapshotStock = apps.get_model('stocks', 'SnapshotStock')
+    ArchiveMouvements = apps.get_model('stocks', 'ArchiveMouvements')
+    ValeurStock = apps.get_model('stocks', 'ValeurStock')
+    LigneCommande = apps.get_model('fournisseurs', 'LigneCommande')
+
+    journal = {
+        m['produit']: m for m in MouvementStock.objects.order_by().values('produit').annotate(
+            solde=Sum(Case(When(type='ENTREE', then=F('quantite')), default=-F('quantite'),
+                           output_field=IntegerField())),
+            premier=Min('date'),
+        )
+    }
+    coupure = ArchiveMouvements.objects.aggregate(fin=Max('fin'))['fin']
+
+    ecarts = {}
+    for pk, stock, cree_le in Produit.objects.values_list('pk', 'stock', 'created_at').iterator(chunk_size=5000):
+        m = journal.get(pk, {})
+        ecart = stock - (m.get('solde') or 0)
+        if ecart:
+            date = min(cree_le, m['premier']) if m.get('premier') else cree_le
+            if coupure and date < coupure:
+                date = coupure
+            ecarts[pk] = (ecart, date)
+    if not ecarts:
+        return
+
+    valeurs = ValeurStock.objects.in_bulk(list(ecarts))
+    # sans valorisation en cours : dernier prix d'achat connu
+    derniers_prix = {}
+    for produit_id, prix in (LigneCommande.objects.filter(produit__in=list(ecarts))
+                             .exclude(commande__statut='BROUILLON')
+                             .order_by('produit', 'commande__date_commande', 'pk')
+                             .values_list('produit', 'prix_achat')):
+        derniers_prix[produit_id] = prix
+
+    mouvements, nouvelles = [], set()
+    for pk, (ecart, date) in ecarts.items():
+        v = valeurs.get(pk)
+        if v is None:
+            v = valeurs[pk] = ValeurStock(produit_id=pk, quantite=0, valeur=Decimal('0'))
+            nouvelles.add(pk)
+        if v.quantite > 0:
+            cout = v.valeur / v.quantite
+        else:
+            cout = derniers_prix.get(pk) or Decimal('0')
+        cout = Decimal(cout).quantize(Decimal('0.0001'))
+        v.quantite += ecart
+        v.valeur = v.valeur + ecart * cout if v.quantite > 0 else Decimal('0')
+        mouvements.append(MouvementStock(
+            produit_id=pk, type='ENTREE' if ecart > 0 else 'SORTIE', quantite=abs(ecart),
+            reference="Stock initial (reprise)", source_type='OUVERTURE', cout_unitaire=cout,
+        ))
+
+    crees = MouvementStock.objects.bulk_create(mouvements, batch_size=2000)
+    # auto_now_add impose la date courante à l'insertion
+    for m in crees:
+        m.date = ecarts[m.produit_id][1]
+    MouvementStock.objects.bulk_update(crees, ['date'], batch_size=2000)
+
+    ValeurStock.objects.bulk_create([valeurs[pk] for pk in nouvelles], batch_size=2000)
+    ValeurStock.objects.bulk_update([v for pk, v in valeurs.items() if pk not in nouvelles],
+                                    ['quantite', 'valeur'], batch_size=2000)
+
+    avec_snapshots = set(SnapshotStock.objects.filter(produit__in=list(ecarts))
+                         .values_list('produit', flat=True).distinct())
+    for pk in avec_snapshots:
+        ecart, date = ecarts[pk]
+        SnapshotStock.objects.filter(produit_id=pk, date__gt=date).update(stock=F('stock') + ecart)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fournisseurs', '0001_initial'),
+        ('produits', '0001_initial'),
+        ('stocks', '0007_valorisation'),
+    ]
+
+    operations = [
+        migrations.RunPython(creer_soldes_ouverture, migrations.RunPython.noop),
+    ]
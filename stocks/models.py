@@ -1,4 +1,5 @@
-from django.db import models
+from decimal import Decimal
+from django.db import models, transaction
 from produits.models import Produit
 
 class MouvementStock(models.Model):
@@ -9,24 +10,130 @@ class MouvementStock(models.Model):
         (SORTIE, 'Sortie'),
     ]
 
+    # Document à l'origine du mouvement
+    VENTE      = 'VENTE'
+    RECEPTION  = 'RECEPTION'
+    AJUSTEMENT = 'AJUSTEMENT'
+    OUVERTURE  = 'OUVERTURE'
+    IMPORT     = 'IMPORT'
+    SOURCE_CHOICES = [
+        (VENTE, 'Vente'),
+        (RECEPTION, 'Réception fournisseur'),
+        (AJUSTEMENT, 'Ajustement manuel'),
+        (OUVERTURE, "Solde d'ouverture"),
+        (IMPORT, 'Import en masse'),
+    ]
+
     produit    = models.ForeignKey(Produit, on_delete=models.PROTECT, related_name='mouvements')
     type       = models.CharField('Type de mouvement', max_length=6, choices=TYPE_CHOICES)
     quantite   = models.PositiveIntegerField('Quantité')
     date       = models.DateTimeField('Date du mouvement', auto_now_add=True)
     reference  = models.CharField('Référence', max_length=100, blank=True,
                                   help_text='Ex: commande fournisseur ou vente')
+    source_type = models.CharField('Origine', max_length=10, choices=SOURCE_CHOICES, default=AJUSTEMENT)
+    source_id   = models.PositiveBigIntegerField("N° du document d'origine", blank=True, null=True)
+    cout_unitaire = models.DecimalField('Coût unitaire', max_digits=14, decimal_places=4, blank=True, null=True,
+                                        help_text="Entrée : prix d'achat s'il est connu ; sinon coût moyen pondéré")
 
     class Meta:
         verbose_name = 'Mouvement de stock'
         verbose_name_plural = 'Mouvements de stock'
-        ordering = ['-date']
+        ordering = ['-date', '-id']
+        indexes = [
+            # pagination par curseur (date, id) et filtres du journal
+            models.Index(fields=['-date', '-id'], name='mouvement_date_idx'),
+            models.Index(fields=['produit', '-date', '-id'], name='mouvement_produit_date_idx'),
+            models.Index(fields=['type', '-date', '-id'], name='mouvement_type_date_idx'),
+            models.Index(fields=['source_type', 'source_id', 'produit'], name='mouvement_source_idx'),
+            models.Index(fields=['source_type', 'date'], name='mouvement_source_date_idx'),
+        ]
 
     def save(self, *args, **kwargs):
-        # Ajuste le stock du produit
+        # Ajuste le stock du produit de façon atomique côté base :
+        # deux ventes simultanées ne peuvent plus écraser la mise à jour de l'autre
         if self.pk is None:
-            if self.type == self.ENTREE:
-                self.produit.stock += self.quantite
-            else:
-                self.produit.stock -= self.quantite
-            self.produit.save(update_fields=['stock'])
-        super().save(*args, **kwargs)
\ No newline at end of file
+            from .services import ajuster_stock
+            from .valorisation import valoriser
+            delta = self.quantite if self.type == self.ENTREE else -self.quantite
+            with transaction.atomic():
+                self.produit.stock = ajuster_stock(self.produit_id, delta)
+                valoriser([self])
+                super().save(*args, **kwargs)
+            return
+        super().save(*args, **kwargs)
+
+
+class SnapshotStock(models.Model):
+    """
+    Solde d'un produit arrêté à une date (mouvements strictement antérieurs).
+    Une ligne n'est écrite que si le produit a bougé pendant la période :
+    le dernier snapshot d'un produit reste donc valable jusqu'au suivant.
+    """
+    JOUR = 'JOUR'
+    MOIS = 'MOIS'
+    PERIODICITE_CHOICES = [
+        (JOUR, 'Quotidien'),
+        (MOIS, 'Mensuel'),
+    ]
+
+    produit     = models.ForeignKey(Produit, on_delete=models.CASCADE, related_name='snapshots')
+    periodicite = models.CharField('Périodicité', max_length=4, choices=PERIODICITE_CHOICES)
+    date        = models.DateTimeField('Solde arrêté au')
+    stock       = models.IntegerField('Stock')
+
+    class Meta:
+        verbose_name = 'Snapshot de stock'
+        verbose_name_plural = 'Snapshots de stock'
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['produit', 'periodicite', 'date'], name='snapshot_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['produit', '-date'], name='snapshot_produit_date_idx'),
+            models.Index(fields=['periodicite', '-date'], name='snapshot_periodicite_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.produit} : {self.stock} au {self.date:%d/%m/%Y}"
+
+
+class ArchiveMouvements(models.Model):
+    """Mois de mouvements déplacés vers un fichier compressé sous MEDIA_ROOT"""
+    mois      = models.DateField('Mois archivé', unique=True)
+    fin       = models.DateTimeField('Archivé jusqu\'au')
+    fichier   = models.CharField('Fichier', max_length=255)
+    nb_lignes = models.PositiveIntegerField('Nombre de mouvements')
+    cree_le   = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Archive de mouvements'
+        verbose_name_plural = 'Archives de mouvements'
+        ordering = ['-mois']
+
+    def __str__(self):
+        return f"Mouvements {self.mois:%m/%Y} ({self.nb_lignes})"
+
+
+class ValeurStock(models.Model):
+    """
+    Valorisation courante d'un produit au coût moyen pondéré (CMP),
+    tenue à jour à chaque mouvement par stocks.valorisation.
+    """
+    produit  = models.OneToOneField(Produit, on_delete=models.CASCADE, primary_key=True, related_name='valeur_stock')
+    quantite = models.IntegerField('Quantité valorisée', default=0)
+    valeur   = models.DecimalField('Valeur', max_digits=16, decimal_places=4, default=Decimal('0'))
+    maj_le   = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Valeur de stock'
+        verbose_name_plural = 'Valeurs de stock'
+
+    def __str__(self):
+        return f"{self.produit} : {self.valeur}"
+
+    @property
+    def cout_moyen(self):
+        """Coût moyen pondéré unitaire"""
+        if self.quantite <= 0:
+            return Decimal('0')
+        return (self.valeur / self.quantite).quantize(Decimal('0.0001'))
@@ -0,0 +1,299 @@
+# stocks/services.py
+
+from datetime import datetime, time, timedelta
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Max, OuterRef, Subquery, Sum, Value, When
+from django.utils import timezone
+from produits.models import Produit
+
+
+def ajuster_stock(produit_id: int, delta: int) -> int:
+    """
+    Applique `delta` au stock d'un produit en une seule requête UPDATE
+    conditionnelle, exécutée par la base (pas de lecture/écriture côté Python).
+    Renvoie le nouveau solde.
+    Lève une ValidationError si le stock deviendrait négatif.
+    """
+    qn = connection.ops.quote_name
+    table = qn(Produit._meta.db_table)
+    stock = qn(Produit._meta.get_field('stock').column)
+    pk = qn(Produit._meta.pk.column)
+
+    if _update_returning():
+        # UPDATE ... RETURNING : le nouveau solde sans SELECT supplémentaire
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET {stock} = {stock} + %s "
+                f"WHERE {pk} = %s AND {stock} + %s >= 0 RETURNING {stock}",
+                [delta, produit_id, delta]
+            )
+            row = cursor.fetchone()
+        nouveau = row[0] if row else None
+    else:
+        updated = Produit.objects.filter(pk=produit_id, stock__gte=-delta).update(stock=F('stock') + delta)
+        nouveau = Produit.objects.values_list('stock', flat=True).get(pk=produit_id) if updated else None
+
+    if nouveau is None:
+        raise ValidationError({
+            'quantite': f"Stock insuffisant pour le produit #{produit_id}"
+        })
+    return nouveau
+
+
+def _update_returning() -> bool:
+    """La base accepte-t-elle UPDATE ... RETURNING ? (PostgreSQL, SQLite >= 3.35)"""
+    if connection.vendor == 'postgresql':
+        return True
+    if connection.vendor == 'sqlite':
+        return connection.Database.sqlite_version_info >= (3, 35)
+    return False
+
+
+def appliquer_deltas(deltas: dict, taille_lot: int = 500) -> None:
+    """
+    Applique plusieurs deltas de stock {produit_id: delta} en bloc, refusés
+    en bloc si un des stocks deviendrait négatif.
+    SQLite / PostgreSQL : UPDATE ... FROM (VALUES ...), une requête par lot.
+    Autres bases : un UPDATE ... CASE WHEN.
+    """
+    deltas = [(pid, d) for pid, d in deltas.items() if d]
+    if not deltas:
+        return
+    with transaction.atomic():
+        for i in range(0, len(deltas), taille_lot):
+            lot = deltas[i:i + taille_lot]
+            if connection.vendor in ('postgresql', 'sqlite'):
+                updated = _update_depuis_valeurs(lot)
+            else:
+                updated = _update_case(lot)
+            if updated != len(lot):
+                # l'exception annule aussi les lots déjà appliqués
+                raise ValidationError("Stock insuffisant pour un ou plusieurs produits")
+
+
+def _update_depuis_valeurs(lot) -> int:
+    qn = connection.ops.quote_name
+    table = qn(Produit._meta.db_table)
+    stock = qn(Produit._meta.get_field('stock').column)
+    pk = qn(Produit._meta.pk.column)
+    valeurs = ', '.join(['(%s, %s)'] * len(lot))
+    with connection.cursor() as cursor:
+        # colonnes d'un VALUES anonyme : column1 (id), column2 (delta)
+        cursor.execute(
+            f"UPDATE {table} SET {stock} = {table}.{stock} + v.column2 "
+            f"FROM (VALUES {valeurs}) AS v "
+            f"WHERE {table}.{pk} = v.column1 AND {table}.{stock} + v.column2 >= 0",
+            [x for paire in lot for x in paire]
+        )
+        return cursor.rowcount
+
+
+def _update_case(lot) -> int:
+    nouveau = Case(
+        *[When(pk=pid, then=F('stock') + Value(d)) for pid, d in lot],
+        output_field=IntegerField()
+    )
+    minimum = Case(
+        *[When(pk=pid, then=Value(-d)) for pid, d in lot],
+        output_field=IntegerField()
+    )
+    return Produit.objects.filter(pk__in=[pid for pid, _ in lot], stock__gte=minimum).update(stock=nouveau)
+
+
+def enregistrer_mouvements(mouvements: list) -> list:
+    """
+    Enregistre une liste de MouvementStock en bloc :
+    un UPDATE pour les stocks (deltas sommés par produit), la valorisation
+    (coût moyen pondéré) puis un bulk_create.
+    Les signaux post_save ne sont pas émis.
+    """
+    from .models import MouvementStock
+    from .valorisation import valoriser
+    deltas = {}
+    for m in mouvements:
+        sens = 1 if m.type == MouvementStock.ENTREE else -1
+        deltas[m.produit_id] = deltas.get(m.produit_id, 0) + sens * m.quantite
+    with transaction.atomic():
+        appliquer_deltas(deltas)
+        valoriser(mouvements)
+        return MouvementStock.objects.bulk_create(mouvements)
+
+
+def solde_mouvements():
+    """Agrégat : somme des quantités signées (ENTREE +, SORTIE -)"""
+    from .models import MouvementStock
+    return Sum(Case(
+        When(type=MouvementStock.ENTREE, then=F('quantite')),
+        default=-F('quantite'),
+        output_field=IntegerField()
+    ))
+
+
+def soldes_par_produit(mouvements) -> dict:
+    """{produit_id: solde} pour un queryset de mouvements, en une requête groupée"""
+    return dict(
+        mouvements.order_by().values('produit')
+        .annotate(solde=solde_mouvements())
+        .values_list('produit', 'solde')
+    )
+
+
+# --------------------------------------------------
+#  Snapshots : bornes de périodes et stock à une date
+# --------------------------------------------------
+
+def debut_periode(dt: datetime, periodicite: str) -> datetime:
+    """Début (heure locale) de la période contenant dt"""
+    from .models import SnapshotStock
+    jour = timezone.localtime(dt).date()
+    if periodicite == SnapshotStock.MOIS:
+        jour = jour.replace(day=1)
+    return timezone.make_aware(datetime.combine(jour, time.min))
+
+
+def periode_suivante(debut: datetime, periodicite: str) -> datetime:
+    """Début de la période qui suit celle commençant à `debut`"""
+    from .models import SnapshotStock
+    if periodicite == SnapshotStock.MOIS:
+        return debut_periode(debut.replace(day=28) + timedelta(days=4), periodicite)
+    return debut_periode(debut + timedelta(days=1, hours=12), periodicite)
+
+
+def creer_snapshots(periodicite: str, jusqua: datetime = None) -> int:
+    """
+    Complète les snapshots de la périodicité donnée jusqu'à la dernière borne
+    de période passée (ou `jusqua`). Incrémental : reprend après le dernier
+    snapshot existant, une requête groupée par période.
+    Renvoie le nombre de lignes créées.
+    """
+    from .models import MouvementStock, SnapshotStock
+    limite = debut_periode(jusqua or timezone.now(), periodicite)
+
+    from .archives import date_limite_archives
+    derniere = SnapshotStock.objects.filter(periodicite=periodicite).aggregate(d=Max('date'))['d']
+    limite_archives = date_limite_archives()
+    if derniere is not None and limite_archives and derniere <= limite_archives:
+        # mouvements archivés depuis : on repart des soldes d'ouverture
+        derniere = None
+    if derniere is None:
+        premier = MouvementStock.objects.order_by('date').values_list('date', flat=True).first()
+        if premier is None:
+            return 0
+        debut = debut_periode(premier, periodicite)
+        soldes = {}
+    else:
+        debut = derniere
+        soldes = stock_au(debut)
+
+    crees = 0
+    while debut < limite:
+        fin = periode_suivante(debut, periodicite)
+        ecarts = soldes_par_produit(MouvementStock.objects.filter(date__gte=debut, date__lt=fin))
+        lignes = []
+        for produit_id, ecart in ecarts.items():
+            soldes[produit_id] = soldes.get(produit_id, 0) + ecart
+            lignes.append(SnapshotStock(
+                produit_id=produit_id, periodicite=periodicite, date=fin, stock=soldes[produit_id]
+            ))
+        SnapshotStock.objects.bulk_create(lignes, batch_size=2000, ignore_conflicts=True)
+        crees += len(lignes)
+        debut = fin
+    return crees
+
+
+def stock_au(date: datetime, produits=None) -> dict:
+    """
+    Stock de chaque produit à `date` (mouvements strictement antérieurs) :
+    part du snapshot le plus proche (quelle que soit sa périodicité) et
+    n'ajoute que les mouvements postérieurs à ce snapshot.
+    Renvoie {produit_id: stock} pour les produits ayant un historique.
+    Après la coupure d'archivage, les snapshots qui la précèdent sont ignorés :
+    le solde d'ouverture daté de la coupure les remplace.
+    """
+    from .archives import date_limite_archives
+    from .models import MouvementStock, SnapshotStock
+    snapshots = SnapshotStock.objects.filter(date__lte=date)
+    mouvements = MouvementStock.objects.filter(date__lt=date)
+    limite_archives = date_limite_archives()
+    if limite_archives and date > limite_archives:
+        snapshots = snapshots.filter(date__gt=limite_archives)
+    if produits is not None:
+        snapshots = snapshots.filter(produit__in=produits)
+        mouvements = mouvements.filter(produit__in=produits)
+
+    plus_recent = snapshots.filter(produit=OuterRef('produit')).order_by('-date').values('pk')[:1]
+    soldes, par_date = {}, {}
+    for produit_id, snap_date, stock in (snapshots.filter(pk=Subquery(plus_recent))
+                                         .values_list('produit', 'date', 'stock')):
+        soldes[produit_id] = stock
+        par_date.setdefault(snap_date, []).append(produit_id)
+
+    # mouvements postérieurs au snapshot, une requête par date de snapshot
+    for snap_date, ids in par_date.items():
+        for produit_id, ecart in soldes_par_produit(
+            mouvements.filter(date__gte=snap_date, produit__in=ids)
+        ).items():
+            soldes[produit_id] += ecart
+
+    # produits sans snapshot : tout l'historique
+    sans_snapshot = mouvements.exclude(produit__in=snapshots.values('produit'))
+    for produit_id, solde in soldes_par_produit(sans_snapshot).items():
+        soldes[produit_id] = solde
+    return soldes
+
+
+# --------------------------------------------------
+#  Réconciliation Produit.stock / journal des mouvements
+# --------------------------------------------------
+
+def ecarts_stock(codes=None) -> list:
+    """
+    Compare Produit.stock au solde du journal : une requête groupée sur les
+    mouvements et une lecture des stocks (restreinte à `codes` si fourni).
+    Renvoie [(produit_id, code, stock, solde_journal), ...] pour les écarts.
+    """
+    from .models import MouvementStock
+    mouvements = MouvementStock.objects.all()
+    produits = Produit.objects.order_by()
+    if codes is not None:
+        mouvements = mouvements.filter(produit__code__in=codes)
+        produits = produits.filter(code__in=codes)
+    soldes = soldes_par_produit(mouvements)
+    ecarts = []
+    for produit_id, code, stock in produits.values_list('pk', 'code', 'stock').iterator(chunk_size=5000):
+        solde = soldes.get(produit_id) or 0
+        if solde != stock:
+            ecarts.append((produit_id, code, stock, solde))
+    return ecarts
+
+
+def sans_journal(ecarts: list) -> list:
+    """
+    Écarts des produits qui n'ont aucun mouvement : leur stock n'a jamais été
+    journalisé (solde d'ouverture manquant), le journal ne fait pas foi.
+    """
+    from .models import MouvementStock
+    ids = [e[0] for e in ecarts]
+    avec_mouvements = set(MouvementStock.objects.filter(produit__in=ids)
+                          .values_list('produit', flat=True).distinct())
+    return [e for e in ecarts if e[0] not in avec_mouvements]
+
+
+def corriger_ecarts(ecarts: list) -> int:
+    """
+    Ramène Produit.stock au solde du journal (borné à 0).
+    La correction est appliquée comme un delta (stock + solde - stock lu) pour
+    ne pas écraser une vente passée entre la lecture et l'écriture.
+    Refusée si un des produits n'a aucun mouvement : son stock serait remis
+    à 0 faute de solde d'ouverture.
+    """
+    manquants = sans_journal(ecarts)
+    if manquants:
+        raise ValidationError(
+            f"{len(manquants)} produit(s) sans solde d'ouverture dans le journal "
+            f"({', '.join(e[1] for e in manquants[:10])}) : appliquez d'abord la migration stocks 0008"
+        )
+    deltas = {pid: max(solde, 0) - stock for pid, _, stock, solde in ecarts}
+    appliquer_deltas(deltas)
+    return sum(1 for d in deltas.values() if d)
@@ -0,0 +1,29 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from produits.models import Produit
+from stocks.models import MouvementStock
+from stocks.valorisation import valoriser
+
+
+@receiver(post_save, sender=Produit)
+def enregistrer_stock_initial(sender, instance, created, **kwargs):
+    """
+    Le stock saisi à la création d'un produit entre dans le journal comme
+    solde d'ouverture, sans modifier à nouveau Produit.stock (bulk_create
+    n'appelle pas MouvementStock.save) : snapshots et stock_au restent justes.
+    Il est valorisé au `cout_initial` saisi avec le produit s'il est fourni
+    (ProduitForm), sinon au dernier prix d'achat connu.
+    """
+    if not created or not instance.stock:
+        return
+    mouvement = MouvementStock(
+        produit=instance,
+        type=MouvementStock.ENTREE,
+        quantite=instance.stock,
+        reference="Stock initial",
+        source_type=MouvementStock.OUVERTURE,
+        cout_unitaire=getattr(instance, 'cout_initial', None),
+    )
+    valoriser([mouvement])
+    MouvementStock.objects.bulk_create([mouvement])
@@ -1,3 +1,406 @@
-from django.test import TestCase
+import importlib
+import io
+import shutil
+import tempfile
+import threading
+from unittest import mock
+from decimal import Decimal
+from datetime import datetime, timedelta
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.apps import apps
+from django.core.management import CommandError, call_command
+from django.urls import reverse
+from services.pagination import paginer_keyset
+from produits.models import Produit
+from .models import MouvementStock, SnapshotStock, ValeurStock
+from .archives import archiver_mouvements, lire_archive
+from .imports import importer_mouvements, lire_lignes
+from .valorisation import cout_des_ventes, reinitialiser_valorisation, valeur_stock
+from .services import ajuster_stock, creer_snapshots, stock_au, ecarts_stock, corriger_ecarts
 
-# Create your tests here.
+
+class AjusterStockTests(TestCase):
+    def setUp(self):
+        self.produit = Produit.objects.create(
+            nom="Test Produit", code="P1", prix_vente=Decimal('10.00'), stock=5
+        )
+
+    def test_renvoie_nouveau_solde(self):
+        self.assertEqual(ajuster_stock(self.produit.pk, 3), 8)
+        self.assertEqual(ajuster_stock(self.produit.pk, -8), 0)
+
+    def test_sans_update_returning(self):
+        with mock.patch('stocks.services._update_returning', return_value=False):
+            self.assertEqual(ajuster_stock(self.produit.pk, 2), 7)
+            with self.assertRaises(ValidationError):
+                ajuster_stock(self.produit.pk, -8)
+
+    def test_refuse_stock_negatif(self):
+        with self.assertRaises(ValidationError):
+            ajuster_stock(self.produit.pk, -6)
+        self.produit.refresh_from_db()
+        self.assertEqual(self.produit.stock, 5)
+
+    def test_mouvement_met_a_jour_instance(self):
+        m = MouvementStock.objects.create(produit=self.produit, type=MouvementStock.SORTIE, quantite=2)
+        self.assertEqual(m.produit.stock, 3)
+
+
+class ConcurrenceStockTests(TransactionTestCase):
+    """Ventes simultanées sur une base fichier : aucune mise à jour perdue."""
+
+    def test_sorties_paralleles(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest("Nécessite une base de test sur fichier")
+        produit = Produit.objects.create(
+            nom="Test Produit", code="P1", prix_vente=Decimal('10.00'), stock=50
+        )
+        nb_threads, ventes_par_thread = 8, 10
+        refus = []
+        lock = threading.Lock()
+
+        def vendre():
+            try:
+                for _ in range(ventes_par_thread):
+                    try:
+                        MouvementStock.objects.create(
+                            produit=Produit.objects.get(pk=produit.pk),
+                            type=MouvementStock.SORTIE,
+                            quantite=1
+                        )
+                    except ValidationError:
+                        with lock:
+                            refus.append(1)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=vendre) for _ in range(nb_threads)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        produit.refresh_from_db()
+        self.assertEqual(produit.stock, 0)
+        self.assertEqual(MouvementStock.objects.filter(produit=produit, type=MouvementStock.SORTIE).count(), 50)
+        self.assertEqual(len(refus), nb_threads * ventes_par_thread - 50)
+
+
+class SourceMouvementTests(TestCase):
+    def test_ajustement_par_defaut(self):
+        produit = Produit.objects.create(nom="Test Produit", code="P1", prix_vente=Decimal('10.00'))
+        m = MouvementStock.objects.create(produit=produit, type=MouvementStock.ENTREE, quantite=4)
+        self.assertEqual(m.source_type, MouvementStock.AJUSTEMENT)
+        self.assertIsNone(m.source_id)
+
+
+class JournalKeysetTests(TestCase):
+    def setUp(self):
+        self.produit = Produit.objects.create(nom="Test Produit", code="P1", prix_vente=Decimal('10.00'))
+        for _ in range(45):
+            MouvementStock.objects.create(produit=self.produit, type=MouvementStock.ENTREE, quantite=1)
+        self.ids = list(MouvementStock.objects.order_by('-date', '-id').values_list('pk', flat=True))
+
+    def test_parcours_complet(self):
+        vus, curseur, page = [], None, None
+        while page is None or page.has_next():
+            page = paginer_keyset(MouvementStock.objects.all(), curseur=curseur, par_page=20)
+            vus += [m.pk for m in page]
+            curseur = page.next_cursor
+        self.assertEqual(vus, self.ids)
+
+    def test_page_precedente(self):
+        p1 = paginer_keyset(MouvementStock.objects.all(), par_page=20)
+        p2 = paginer_keyset(MouvementStock.objects.all(), curseur=p1.next_cursor, par_page=20)
+        retour = paginer_keyset(MouvementStock.objects.all(), curseur=p2.previous_cursor,
+                                sens='precedent', par_page=20)
+        self.assertEqual([m.pk for m in retour], self.ids[:20])
+        self.assertFalse(retour.has_previous())
+
+    def test_vue_requetes_constantes(self):
+        page = paginer_keyset(MouvementStock.objects.all(), par_page=20)
+        url = reverse('stocks:mouvements')
+        # journal (jointure produit), liste des archives, context processor des alertes
+        with self.assertNumQueries(3):
+            response = self.client.get(url, {'curseur': page.next_cursor, 'type': 'ENTREE'})
+        self.assertEqual(len(response.context['mouvements']), 20)
+
+
+class SnapshotTests(TestCase):
+    def setUp(self):
+        self.produit = Produit.objects.create(nom="Test Produit", code="P1", prix_vente=Decimal('10.00'))
+        for jour, type_, qte in [((2025, 1, 10), 'ENTREE', 10), ((2025, 1, 20), 'SORTIE', 3),
+                                 ((2025, 3, 5), 'SORTIE', 2), ((2025, 4, 2), 'ENTREE', 5)]:
+            m = MouvementStock.objects.create(produit=self.produit, type=type_, quantite=qte)
+            MouvementStock.objects.filter(pk=m.pk).update(date=self.date(*jour))
+
+    def date(self, *jour):
+        return timezone.make_aware(datetime(*jour))
+
+    def test_snapshots_mensuels_et_stock_au(self):
+        self.assertEqual(creer_snapshots(SnapshotStock.MOIS, self.date(2025, 4, 15)), 2)
+        self.assertEqual(
+            list(SnapshotStock.objects.order_by('date').values_list('stock', flat=True)), [7, 5]
+        )
+        self.assertEqual(stock_au(self.date(2025, 2, 15))[self.produit.pk], 7)
+        self.assertEqual(stock_au(self.date(2025, 3, 31))[self.produit.pk], 5)
+        self.assertEqual(stock_au(self.date(2025, 4, 3))[self.produit.pk], 10)
+        self.assertEqual(stock_au(self.date(2025, 1, 15))[self.produit.pk], 10)
+
+    def test_incremental(self):
+        creer_snapshots(SnapshotStock.MOIS, self.date(2025, 3, 15))
+        self.assertEqual(creer_snapshots(SnapshotStock.MOIS, self.date(2025, 3, 20)), 0)
+        self.assertEqual(creer_snapshots(SnapshotStock.MOIS, self.date(2025, 5, 1)), 2)
+        self.assertEqual(stock_au(self.date(2025, 5, 1))[self.produit.pk], 10)
+
+    def test_stock_initial_journalise(self):
+        produit = Produit.objects.create(nom="Autre", code="P2", prix_vente=Decimal('1.00'), stock=8)
+        self.assertEqual(stock_au(timezone.now() + timedelta(seconds=1), [produit.pk]), {produit.pk: 8})
+        produit.refresh_from_db()
+        self.assertEqual(produit.stock, 8)
+
+
+class RepriseOuvertureTests(TestCase):
+    def test_migration_cree_les_soldes_ouverture(self):
+        produit = Produit.objects.create(nom="Ancien", code="P1", prix_vente=Decimal('1.00'))
+        m = MouvementStock.objects.create(produit=produit, type=MouvementStock.ENTREE, quantite=2,
+                                          cout_unitaire=Decimal('3.00'))
+        MouvementStock.objects.filter(pk=m.pk).update(date=timezone.make_aware(datetime(2025, 2, 10)))
+        creer_snapshots(SnapshotStock.MOIS, timezone.make_aware(datetime(2025, 4, 1)))
+        # stock saisi hors journal, comme avant la journalisation
+        Produit.objects.filter(pk=produit.pk).update(stock=12, created_at=timezone.make_aware(datetime(2025, 1, 5)))
+
+        migration = importlib.import_module('stocks.migrations.0008_soldes_ouverture')
+        migration.creer_soldes_ouverture(apps, None)
+
+        ouverture = MouvementStock.objects.get(source_type=MouvementStock.OUVERTURE)
+        self.assertEqual((ouverture.type, ouverture.quantite, ouverture.cout_unitaire), ('ENTREE', 10, Decimal('3')))
+        self.assertEqual(ouverture.date, timezone.make_aware(datetime(2025, 1, 5)))
+        self.assertEqual(ecarts_stock(), [])
+        self.assertEqual(stock_au(timezone.make_aware(datetime(2025, 2, 1)))[produit.pk], 10)
+        self.assertEqual(stock_au(timezone.make_aware(datetime(2025, 5, 1)))[produit.pk], 12)
+        self.assertEqual(ValeurStock.objects.get(produit=produit).valeur, Decimal('36'))
+
+
+class ReconciliationTests(TestCase):
+    def test_detecte_et_corrige(self):
+        ok = Produit.objects.create(nom="OK", code="P1", prix_vente=Decimal('1.00'), stock=4)
+        derive = Produit.objects.create(nom="Dérive", code="P2", prix_vente=Decimal('1.00'), stock=4)
+        MouvementStock.objects.create(produit=derive, type=MouvementStock.SORTIE, quantite=1)
+        Produit.objects.filter(pk=derive.pk).update(stock=9)
+
+        ecarts = ecarts_stock()
+        self.assertEqual(ecarts, [(derive.pk, "P2", 9, 3)])
+        self.assertEqual(corriger_ecarts(ecarts), 1)
+        derive.refresh_from_db()
+        ok.refresh_from_db()
+        self.assertEqual((derive.stock, ok.stock), (3, 4))
+        self.assertEqual(ecarts_stock(), [])
+
+    def test_fix_protege(self):
+        derive = Produit.objects.create(nom="Dérive", code="P2", prix_vente=Decimal('1.00'), stock=4)
+        Produit.objects.filter(pk=derive.pk).update(stock=9)
+        jamais = Produit.objects.create(nom="Hors journal", code="P3", prix_vente=Decimal('1.00'))
+        Produit.objects.filter(pk=jamais.pk).update(stock=7)
+
+        with self.assertRaises(CommandError):
+            call_command('reconcile_stock', fix=True, stdout=io.StringIO())
+        with self.assertRaises(CommandError):
+            call_command('reconcile_stock', fix=True, confirm=True, stdout=io.StringIO())
+        call_command('reconcile_stock', fix=True, produits=['P2'], stdout=io.StringIO())
+        derive.refresh_from_db()
+        jamais.refresh_from_db()
+        self.assertEqual((derive.stock, jamais.stock), (4, 7))
+
+
+class ImportMouvementsTests(TestCase):
+    def setUp(self):
+        self.p1 = Produit.objects.create(nom="P1", code="P1", prix_vente=Decimal('1.00'), stock=10)
+        self.p2 = Produit.objects.create(nom="P2", code="P2", prix_vente=Decimal('1.00'))
+
+    def test_import_csv(self):
+        fichier = io.StringIO(
+            "code,type,quantite,reference\n"
+            "P1,SORTIE,3,inv\nP2,entree,5,\nP1,ENTREE,1,\nINCONNU,ENTREE,1,\n"
+        )
+        rapport = importer_mouvements(lire_lignes(fichier, 'csv'), taille_lot=2)
+        self.assertEqual((rapport['lues'], rapport['importees']), (4, 3))
+        # numéro de ligne du fichier (en-tête compris)
+        self.assertEqual(rapport['erreurs'][0][0], 5)
+        self.p1.refresh_from_db()
+        self.p2.refresh_from_db()
+        self.assertEqual((self.p1.stock, self.p2.stock), (8, 5))
+        self.assertEqual(MouvementStock.objects.filter(source_type=MouvementStock.IMPORT).count(), 3)
+
+    def test_sortie_refusee_si_stock_insuffisant(self):
+        fichier = io.StringIO(
+            '{"code": "P1", "type": "SORTIE", "quantite": 4}\n'
+            '{"code": "P2", "type": "SORTIE", "quantite": 1}\n'
+            '{"code": "P1", "type": "ENTREE", "quantite": 2}\n'
+        )
+        rapport = importer_mouvements(lire_lignes(fichier, 'jsonl'))
+        self.assertEqual(rapport['importees'], 2)
+        self.assertEqual(len(rapport['erreurs']), 1)
+        self.assertEqual(rapport['erreurs'][0][0], 2)
+        self.assertIn("P2", rapport['erreurs'][0][1])
+        self.p1.refresh_from_db()
+        self.p2.refresh_from_db()
+        self.assertEqual((self.p1.stock, self.p2.stock), (8, 0))
+
+    def test_lignes_illisibles(self):
+        fichier = io.BytesIO(
+            b'{"code": "P1", "type": "SORTIE", "quantite": 1}\n'
+            b'{"code": "P1", \n'
+            b'[1]\n'
+            b'"x"\n'
+            b'{"code": "P\xe9", "type": "ENTREE", "quantite": 1}\n'
+            b'{"code": "P2", "type": "ENTREE", "quantite": 3}\n'
+        )
+        rapport = importer_mouvements(lire_lignes(fichier, 'jsonl'), taille_lot=2)
+        self.assertEqual((rapport['lues'], rapport['importees']), (6, 2))
+        self.assertEqual([num for num, _ in rapport['erreurs']], [2, 3, 4, 5])
+        self.p2.refresh_from_db()
+        self.assertEqual(self.p2.stock, 3)
+
+    def test_quantites_entieres_seulement(self):
+        fichier = io.StringIO(
+            '{"code": "P2", "type": "ENTREE", "quantite": 1.9}\n'
+            '{"code": "P2", "type": "ENTREE", "quantite": true}\n'
+            '{"code": "P2", "type": "ENTREE", "quantite": 2.0}\n'
+        )
+        rapport = importer_mouvements(lire_lignes(fichier, 'jsonl'))
+        self.assertEqual(rapport['importees'], 1)
+        self.assertEqual([num for num, _ in rapport['erreurs']], [1, 2])
+        self.p2.refresh_from_db()
+        self.assertEqual(self.p2.stock, 2)
+
+    def test_csv_encodage_invalide(self):
+        fichier = io.BytesIO(b"code,type,quantite\nP\xe9,ENTREE,1\nP2,ENTREE,2\n")
+        rapport = importer_mouvements(lire_lignes(fichier, 'csv'))
+        self.assertEqual(rapport['importees'], 1)
+        self.assertEqual(rapport['erreurs'][0][0], 2)
+
+    def test_vue_import(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        fichier = SimpleUploadedFile("m.jsonl", b'[1]\n{"code": "P2", "type": "ENTREE", "quantite": 1}\n')
+        response = self.client.post(reverse('stocks:mouvement_import'), {'fichier': fichier, 'format': 'jsonl'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['rapport']['importees'], 1)
+        self.assertContains(response, "Ligne 1")
+
+
+class ArchivageTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        self.produit = Produit.objects.create(nom="Test Produit", code="P1", prix_vente=Decimal('1.00'))
+        for jour, type_, qte in [((2025, 1, 10), 'ENTREE', 10), ((2025, 2, 3), 'SORTIE', 4)]:
+            m = MouvementStock.objects.create(produit=self.produit, type=type_, quantite=qte)
+            MouvementStock.objects.filter(pk=m.pk).update(date=timezone.make_aware(datetime(*jour)))
+        MouvementStock.objects.create(produit=self.produit, type=MouvementStock.SORTIE, quantite=1)
+
+    def test_archive_et_relecture(self):
+        coupure = timezone.make_aware(datetime(2025, 3, 1))
+        with override_settings(MEDIA_ROOT=self.media):
+            archives = archiver_mouvements(coupure)
+            self.assertEqual([a.nb_lignes for a in archives], [1, 1])
+            relus = list(lire_archive(archives[1]))
+            self.assertEqual((relus[0].type, relus[0].quantite, relus[0].produit.code), ('SORTIE', 4, 'P1'))
+
+            response = self.client.get(reverse('stocks:mouvements'), {'archive': archives[0].pk})
+            self.assertEqual([m.quantite for m in response.context['mouvements']], [10])
+            export = self.client.get(reverse('stocks:mouvement_export'), {'archive': archives[0].pk})
+            self.assertEqual(len(b''.join(export.streaming_content).splitlines()), 2)
+
+        self.assertFalse(MouvementStock.objects.filter(date__lt=coupure).exists())
+        ouverture = MouvementStock.objects.get(source_type=MouvementStock.OUVERTURE)
+        self.assertEqual((ouverture.date, ouverture.type, ouverture.quantite), (coupure, 'ENTREE', 6))
+        self.produit.refresh_from_db()
+        self.assertEqual(self.produit.stock, 5)
+        self.assertEqual(ecarts_stock(), [])
+
+    def test_archive_paginee_en_flux(self):
+        for jour in range(1, 26):
+            m = MouvementStock.objects.create(produit=self.produit, type=MouvementStock.ENTREE, quantite=jour)
+            MouvementStock.objects.filter(pk=m.pk).update(date=timezone.make_aware(datetime(2025, 1, jour, 12)))
+        with override_settings(MEDIA_ROOT=self.media):
+            archive = archiver_mouvements(timezone.make_aware(datetime(2025, 3, 1)))[0]
+            url = reverse('stocks:mouvements')
+            premiere = self.client.get(url, {'archive': archive.pk}).context['page_obj']
+            seconde = self.client.get(url, {'archive': archive.pk, 'page': 2}).context['page_obj']
+        self.assertEqual([m.quantite for m in premiere][:3], [25, 24, 23])
+        self.assertTrue(premiere.has_next())
+        self.assertEqual([m.quantite for m in seconde], [6, 5, 4, 3, 2, 1])
+        self.assertFalse(seconde.has_next())
+
+
+    def test_archive_apres_snapshots(self):
+        date = lambda *jour: timezone.make_aware(datetime(*jour))
+        produit = Produit.objects.create(nom="Snap", code="P2", prix_vente=Decimal('1.00'))
+        m = MouvementStock.objects.create(produit=produit, type=MouvementStock.ENTREE, quantite=10)
+        MouvementStock.objects.filter(pk=m.pk).update(date=date(2025, 1, 10))
+        creer_snapshots(SnapshotStock.MOIS, date(2025, 4, 15))
+        self.assertEqual(stock_au(date(2025, 5, 1), [produit.pk]), {produit.pk: 10})
+
+        with override_settings(MEDIA_ROOT=self.media):
+            archiver_mouvements(date(2025, 3, 1))
+        self.assertEqual(stock_au(date(2025, 5, 1), [produit.pk]), {produit.pk: 10})
+        self.assertEqual(stock_au(date(2025, 2, 1), [produit.pk]), {produit.pk: 10})
+        creer_snapshots(SnapshotStock.MOIS, date(2025, 6, 15))
+        self.assertEqual(stock_au(date(2025, 6, 15), [produit.pk]), {produit.pk: 10})
+        produit.refresh_from_db()
+        self.assertEqual(produit.stock, 10)
+
+class ValorisationTests(TestCase):
+    def setUp(self):
+        self.produit = Produit.objects.create(nom="Test Produit", code="P1", prix_vente=Decimal('10.00'))
+
+    def entree(self, quantite, cout):
+        return MouvementStock.objects.create(produit=self.produit, type=MouvementStock.ENTREE,
+                                             quantite=quantite, cout_unitaire=Decimal(cout))
+
+    def test_cout_moyen_pondere(self):
+        self.entree(10, '4.00')
+        self.entree(10, '6.00')
+        vente = MouvementStock.objects.create(produit=self.produit, type=MouvementStock.SORTIE, quantite=5,
+                                              source_type=MouvementStock.VENTE, source_id=1)
+        self.assertEqual(vente.cout_unitaire, Decimal('5.0000'))
+        valeur = ValeurStock.objects.get(produit=self.produit)
+        self.assertEqual((valeur.quantite, valeur.valeur), (15, Decimal('75')))
+        self.assertEqual(valeur_stock(), Decimal('75'))
+        debut = timezone.now() - timedelta(days=1)
+        self.assertEqual(cout_des_ventes(debut, timezone.now() + timedelta(days=1)), Decimal('25'))
+
+    def test_reinitialisation_identique(self):
+        self.entree(4, '2.50')
+        MouvementStock.objects.create(produit=self.produit, type=MouvementStock.SORTIE, quantite=1)
+        avant = ValeurStock.objects.get(produit=self.produit).valeur
+        reinitialiser_valorisation()
+        self.assertEqual(ValeurStock.objects.get(produit=self.produit).valeur, avant)
+
+    def test_entree_sans_cout_au_dernier_prix_achat(self):
+        from fournisseurs.models import Fournisseur, HistoriquePrixAchat
+        fournisseur = Fournisseur.objects.create(nom="F")
+        HistoriquePrixAchat.objects.create(
+            produit=self.produit, fournisseur=fournisseur, dernier_prix=Decimal('3.00'), dernier_achat=timezone.now(),
+            prix_min=Decimal('3.00'), montant_total=Decimal('3.00'), quantite_totale=1, nb_lignes=1,
+        )
+        m = MouvementStock.objects.create(produit=self.produit, type=MouvementStock.ENTREE, quantite=2)
+        self.assertEqual(m.cout_unitaire, Decimal('3.0000'))
+        self.assertEqual(ValeurStock.objects.get(produit=self.produit).valeur, Decimal('6'))
+
+    def test_archive_garde_la_valeur(self):
+        self.entree(10, '4.00')
+        MouvementStock.objects.create(produit=self.produit, type=MouvementStock.SORTIE, quantite=4)
+        MouvementStock.objects.update(date=timezone.make_aware(datetime(2025, 1, 10)))
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        with override_settings(MEDIA_ROOT=media):
+            archiver_mouvements(timezone.make_aware(datetime(2025, 3, 1)))
+        ouverture = MouvementStock.objects.get(source_type=MouvementStock.OUVERTURE)
+        self.assertEqual(ouverture.cout_unitaire, Decimal('4.0000'))
+        reinitialiser_valorisation()
+        self.assertEqual(ValeurStock.objects.get(produit=self.produit).valeur, Decimal('24'))
@@ -1,8 +1,10 @@
 from django.urls import path
-from .views import MouvementListView, MouvementCreateView
+from .views import MouvementListView, MouvementCreateView, MouvementImportView, MouvementExportView
 
 app_name = 'stocks'
 urlpatterns = [
     path('',           MouvementListView.as_view(), name='mouvements'),
     path('nouveau/',   MouvementCreateView.as_view(), name='mouvement_create'),
+    path('import/',    MouvementImportView.as_view(), name='mouvement_import'),
+    path('export/',    MouvementExportView.as_view(), name='mouvement_export'),
 ]
\ No newline at end of file
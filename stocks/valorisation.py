@@ -0,0 +1,134 @@
+# stocks/valorisation.py
+
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, Sum, When
+from django.utils import timezone
+from .models import MouvementStock, ValeurStock
+
+# --------------------------------------------------
+#  Valorisation au coût moyen pondéré (CMP), incrémentale :
+#  chaque mouvement met à jour la valeur du produit et porte son coût
+#  unitaire, ce qui rend valeur du stock et coût des ventes
+#  calculables par simple agrégat indexé.
+# --------------------------------------------------
+QUATRE_DECIMALES = Decimal('0.0001')
+
+
+def valoriser(mouvements: list) -> None:
+    """
+    Renseigne `cout_unitaire` sur des mouvements (avant insertion) et met à
+    jour la ValeurStock de leurs produits, dans l'ordre de la liste :
+    - ENTREE : au coût fourni (prix d'achat) ou, à défaut, au CMP courant ;
+      sans stock valorisé, au dernier prix d'achat connu du produit
+    - SORTIE : au CMP courant
+    À appeler dans la transaction qui modifie le stock.
+    """
+    if not mouvements:
+        return
+    ids = {m.produit_id for m in mouvements}
+    with transaction.atomic():
+        valeurs = {v.produit_id: v for v in ValeurStock.objects.select_for_update().filter(produit__in=ids)}
+        manquantes = ids - set(valeurs)
+        if manquantes:
+            # ignore_conflicts : une transaction concurrente a pu créer la même ligne
+            ValeurStock.objects.bulk_create([ValeurStock(produit_id=pid) for pid in manquantes],
+                                            ignore_conflicts=True)
+            valeurs.update((v.produit_id, v) for v in
+                           ValeurStock.objects.select_for_update().filter(produit__in=manquantes))
+
+        derniers_prix = None
+        for m in mouvements:
+            v = valeurs[m.produit_id]
+            if m.type == MouvementStock.ENTREE:
+                if m.cout_unitaire is None and v.quantite > 0:
+                    m.cout_unitaire = v.cout_moyen
+                elif m.cout_unitaire is None:
+                    if derniers_prix is None:
+                        derniers_prix = derniers_prix_achat(ids)
+                    m.cout_unitaire = derniers_prix.get(m.produit_id, Decimal('0'))
+                v.quantite += m.quantite
+                v.valeur += m.quantite * m.cout_unitaire
+            else:
+                m.cout_unitaire = v.cout_moyen
+                v.quantite -= m.quantite
+                v.valeur -= m.quantite * m.cout_unitaire
+                if v.quantite <= 0:
+                    # plus rien en stock : pas de reliquat d'arrondi
+                    v.valeur = Decimal('0')
+            m.cout_unitaire = Decimal(m.cout_unitaire).quantize(QUATRE_DECIMALES)
+
+        maintenant = timezone.now()
+        for v in valeurs.values():
+            v.maj_le = maintenant  # bulk_update ne gère pas auto_now
+        ValeurStock.objects.bulk_update(list(valeurs.values()), ['quantite', 'valeur', 'maj_le'])
+
+
+def derniers_prix_achat(produits) -> dict:
+    """{produit_id: prix} : dernier prix d'achat connu, tous fournisseurs confondus"""
+    from fournisseurs.models import HistoriquePrixAchat
+    prix = {}
+    for produit_id, dernier_prix in (HistoriquePrixAchat.objects.filter(produit__in=produits)
+                                     .order_by('produit', 'dernier_achat')
+                                     .values_list('produit', 'dernier_prix')):
+        prix[produit_id] = dernier_prix
+    return prix
+
+
+def valeur_stock(produits=None) -> Decimal:
+    """Valeur totale du stock (ou d'une sélection de produits) au CMP"""
+    qs = ValeurStock.objects.all()
+    if produits is not None:
+        qs = qs.filter(produit__in=produits)
+    return qs.aggregate(total=Sum('valeur'))['total'] or Decimal('0')
+
+
+def cout_des_ventes(debut, fin) -> Decimal:
+    """Coût des marchandises vendues sur [debut, fin[ : sorties des ventes moins retours"""
+    montant = ExpressionWrapper(F('quantite') * F('cout_unitaire'),
+                                output_field=DecimalField(max_digits=20, decimal_places=4))
+    return MouvementStock.objects.filter(
+        source_type=MouvementStock.VENTE, date__gte=debut, date__lt=fin
+    ).aggregate(total=Sum(Case(
+        When(type=MouvementStock.SORTIE, then=montant),
+        default=-montant,
+    )))['total'] or Decimal('0')
+
+
+def reinitialiser_valorisation(taille_lot: int = 5000) -> int:
+    """
+    Recalcule toute la valorisation en rejouant le journal dans l'ordre.
+    À n'utiliser qu'une fois (reprise de l'existant) ou après correction :
+    l'exploitation courante est incrémentale.
+    Les entrées de réception sont valorisées au prix d'achat de la commande,
+    les autres entrées (dont les soldes d'ouverture) gardent leur coût
+    enregistré (CMP ou dernier prix d'achat si absent) ;
+    les sorties sont toutes revalorisées.
+    """
+    from fournisseurs.models import LigneCommande, ReceptionAppro
+    with transaction.atomic():
+        ValeurStock.objects.all().delete()
+        receptions = dict(
+            (r['pk'], (r['commande_id'], r['produit_id']))
+            for r in ReceptionAppro.objects.values('pk', 'commande_id', 'produit_id')
+        )
+        prix = {
+            (l['commande_id'], l['produit_id']): l['prix_achat']
+            for l in LigneCommande.objects.values('commande_id', 'produit_id', 'prix_achat')
+        }
+
+        n, lot = 0, []
+        for m in MouvementStock.objects.order_by('date', 'pk').iterator(chunk_size=taille_lot):
+            if m.type == MouvementStock.SORTIE:
+                m.cout_unitaire = None
+            elif m.source_type == MouvementStock.RECEPTION:
+                m.cout_unitaire = prix.get(receptions.get(m.source_id), m.cout_unitaire)
+            lot.append(m)
+            if len(lot) >= taille_lot:
+                valoriser(lot)
+                MouvementStock.objects.bulk_update(lot, ['cout_unitaire'])
+                n += len(lot)
+                lot = []
+        valoriser(lot)
+        MouvementStock.objects.bulk_update(lot, ['cout_unitaire'])
+        return n + len(lot)
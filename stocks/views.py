@@ -1,16 +1,191 @@
-from django.views.generic import ListView, CreateView
+import csv
+from datetime import datetime, time, timedelta
+from itertools import islice
+from django.http import StreamingHttpResponse
+from django.views.generic import ListView, CreateView, FormView, View
 from django.urls import reverse_lazy
-from .models import MouvementStock
-from .forms import MouvementStockForm
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+from services.pagination import KeysetPaginationMixin
+from .archives import lire_archive
+from .models import MouvementStock, ArchiveMouvements
+from .forms import MouvementStockForm, MouvementFiltreForm, MouvementImportForm
+from .imports import importer_mouvements, lire_lignes
 
-class MouvementListView(ListView):
+def _filtrer_archive(mouvements, data):
+    """Applique les filtres du journal aux mouvements relus d'une archive"""
+    for m in mouvements:
+        if data.get('produit') and m.produit.code != data['produit']:
+            continue
+        if data.get('type') and m.type != data['type']:
+            continue
+        jour = timezone.localtime(m.date).date()
+        if (data.get('du') and jour < data['du']) or (data.get('au') and jour > data['au']):
+            continue
+        yield m
+
+
+class MouvementFiltresMixin:
+    """Filtres communs au journal et à l'export ; `archive=<pk>` lit un mois archivé"""
+
+    def get_filtres(self):
+        if not hasattr(self, 'filtres'):
+            self.filtres = MouvementFiltreForm(self.request.GET or None)
+            self.filtres.is_valid()
+        return self.filtres
+
+    def get_archive(self):
+        pk = self.request.GET.get('archive')
+        return ArchiveMouvements.objects.filter(pk=pk).first() if pk and pk.isdigit() else None
+
+    def get_queryset(self):
+        qs = (MouvementStock.objects
+              .select_related('produit')
+              .only('date', 'type', 'quantite', 'reference', 'produit__nom', 'produit__code'))
+        filtres = self.get_filtres()
+        if filtres.is_bound and filtres.is_valid():
+            data = filtres.cleaned_data
+            if data['produit']:
+                qs = qs.filter(produit__code=data['produit'])
+            if data['type']:
+                qs = qs.filter(type=data['type'])
+            if data['du']:
+                qs = qs.filter(date__gte=timezone.make_aware(datetime.combine(data['du'], time.min)))
+            if data['au']:
+                qs = qs.filter(date__lt=timezone.make_aware(datetime.combine(data['au'] + timedelta(days=1), time.min)))
+        return qs
+
+    def get_mouvements_archives(self, archive):
+        filtres = self.get_filtres()
+        data = filtres.cleaned_data if filtres.is_bound and filtres.is_valid() else {}
+        return _filtrer_archive(lire_archive(archive), data)
+
+
+class PageArchive:
+    """
+    Page d'un mois archivé, compatible avec `page_obj` des templates. Le
+    fichier est lu en flux jusqu'à la page demandée (une ligne de plus pour
+    savoir s'il y a une suite) : rien n'est trié ni compté en mémoire.
+    """
+
+    def __init__(self, object_list, number, has_next):
+        self.object_list = object_list
+        self.number = number
+        self._has_next = has_next
+
+    @classmethod
+    def lire(cls, mouvements, numero, par_page):
+        try:
+            numero = max(int(numero), 1)
+        except (TypeError, ValueError):
+            numero = 1
+        debut = (numero - 1) * par_page
+        lignes = list(islice(mouvements, debut, debut + par_page + 1))
+        return cls(lignes[:par_page], numero, len(lignes) > par_page)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self.number > 1
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+
+class MouvementListView(MouvementFiltresMixin, KeysetPaginationMixin, ListView):
     model = MouvementStock
     template_name = 'stocks/mouvement_list.html'
     context_object_name = 'mouvements'
     paginate_by = 20
 
+    def get(self, request, *args, **kwargs):
+        archive = self.get_archive()
+        if archive is None:
+            return super().get(request, *args, **kwargs)
+        # mois archivé : relu en flux depuis le fichier (déjà trié, plus récents d'abord)
+        page = PageArchive.lire(self.get_mouvements_archives(archive), request.GET.get('page'), self.paginate_by)
+        self.object_list = page.object_list
+        return self.render_to_response(self.get_context_data(
+            object_list=page.object_list, archive=archive, page_obj=page,
+            is_paginated=page.has_other_pages(),
+        ))
+
+    def paginate_queryset(self, queryset, page_size):
+        # mois archivé : déjà paginé dans get()
+        if not hasattr(queryset, 'filter'):
+            return (None, None, queryset, False)
+        return super().paginate_queryset(queryset, page_size)
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx['filtres'] = self.get_filtres()
+        ctx['archives'] = ArchiveMouvements.objects.all()
+        return ctx
+
+
+class MouvementExportView(MouvementFiltresMixin, View):
+    """Export CSV en flux du journal filtré (ou d'un mois archivé)"""
+
+    class _Tampon:
+        def write(self, valeur):
+            return valeur
+
+    def get(self, request):
+        archive = self.get_archive()
+        if archive is not None:
+            mouvements = self.get_mouvements_archives(archive)
+        else:
+            mouvements = self.get_queryset().order_by('-date', '-pk').iterator(chunk_size=2000)
+        writer = csv.writer(self._Tampon())
+
+        def lignes():
+            yield writer.writerow(['date', 'code', 'produit', 'type', 'quantite', 'reference'])
+            for m in mouvements:
+                yield writer.writerow([m.date.isoformat(), m.produit.code, m.produit.nom,
+                                       m.type, m.quantite, m.reference])
+
+        nom = f"mouvements_{archive.mois:%Y-%m}.csv" if archive else "mouvements.csv"
+        response = StreamingHttpResponse(lignes(), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="{nom}"'
+        return response
+
 class MouvementCreateView(CreateView):
     model = MouvementStock
     form_class = MouvementStockForm
     template_name = 'stocks/mouvement_form.html'
-    success_url = reverse_lazy('stocks:mouvements')
\ No newline at end of file
+    success_url = reverse_lazy('stocks:mouvements')
+
+    def form_valid(self, form):
+        try:
+            return super().form_valid(form)
+        except ValidationError as e:
+            # stock insuffisant : refusé par l'UPDATE conditionnel
+            form.add_error(None, e.messages)
+            return self.form_invalid(form)
+
+
+class MouvementImportView(FormView):
+    form_class = MouvementImportForm
+    template_name = 'stocks/mouvement_import.html'
+
+    def form_valid(self, form):
+        # lecture en flux du fichier téléversé, ligne à ligne et par lots
+        try:
+            rapport = importer_mouvements(lire_lignes(form.cleaned_data['fichier'], form.cleaned_data['format']))
+        except ValueError as e:
+            form.add_error('fichier', f"Fichier illisible : {e}")
+            return self.form_invalid(form)
+        return self.render_to_response(self.get_context_data(form=form, rapport=rapport))
@@ -1,8 +1,11 @@
 
 ### `ventes/forms.py`
+from datetime import datetime, time, timedelta
 from decimal import Decimal
 from django import forms
+from django.utils import timezone
 from django.forms import inlineformset_factory
+from clients.models import Client
 from .models import Vente, VenteDetail, PaiementVente
 
 class VenteForm(forms.ModelForm):
@@ -34,4 +37,34 @@ VenteDetailFormSet = inlineformset_factory(
 class PaiementVenteForm(forms.ModelForm):
     class Meta:
         model = PaiementVente
-        fields = ['montant']
\ No newline at end of file
+        fields = ['montant']
+
+class VenteFiltreForm(forms.Form):
+    client   = forms.ModelChoiceField(label='Client', required=False, queryset=Client.objects.only('nom'))
+    du       = forms.DateField(label='Du', required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    au       = forms.DateField(label='Au', required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    impayees = forms.BooleanField(label='Impayées seulement', required=False)
+
+    @classmethod
+    def periode_par_defaut(cls, data) -> dict:
+        """Filtres avec la période du mois en cours pour du / au manquants (export des factures)"""
+        data = data.dict() if hasattr(data, 'dict') else dict(data)
+        aujourdhui = timezone.localdate()
+        data['du'] = data.get('du') or aujourdhui.replace(day=1).isoformat()
+        data['au'] = data.get('au') or aujourdhui.isoformat()
+        return data
+
+    def filtrer(self, qs):
+        """Applique les filtres saisis (liste des ventes, export des factures)."""
+        if not self.is_valid():
+            return qs
+        data = self.cleaned_data
+        if data['client']:
+            qs = qs.filter(client=data['client'])
+        if data['du']:
+            qs = qs.filter(date__gte=timezone.make_aware(datetime.combine(data['du'], time.min)))
+        if data['au']:
+            qs = qs.filter(date__lt=timezone.make_aware(datetime.combine(data['au'] + timedelta(days=1), time.min)))
+        if data['impayees']:
+            qs = qs.filter(reste_du__gt=0)
+        return qs
@@ -0,0 +1,55 @@
+import json
+import statistics
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+from django.urls import reverse
+from clients.models import Client
+from produits.models import Produit
+from ventes.views import checkout
+
+
+class Command(BaseCommand):
+    help = "Mesure la latence de l'API de caisse (p50/p99) sur des données jetables"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requetes', type=int, default=500)
+        parser.add_argument('--articles', type=int, default=5, help="Articles par panier")
+        parser.add_argument('--produits', type=int, default=200)
+
+    def handle(self, *args, **options):
+        n, articles = options['requetes'], options['articles']
+        factory = RequestFactory()
+        url = reverse('ventes:checkout')
+        durees = []
+
+        # tout est annulé en fin de mesure : la base n'est pas modifiée
+        with transaction.atomic():
+            client = Client.objects.create(nom="Bench caisse", email="bench@caisse.local")
+            Produit.objects.bulk_create([
+                Produit(nom=f"Bench {i}", code=f"BENCH-{i:05d}", prix_vente=Decimal('1.50'), stock=10 ** 9)
+                for i in range(options['produits'])
+            ])
+            for r in range(n):
+                corps = json.dumps({
+                    'client': client.pk,
+                    'paiement': '1.00',
+                    'lignes': [{'code': f"BENCH-{(r + j) % options['produits']:05d}", 'quantite': 1}
+                               for j in range(articles)],
+                })
+                request = factory.post(url, corps, content_type='application/json')
+                request._dont_enforce_csrf_checks = True
+                debut = time.perf_counter()
+                response = checkout(request)
+                durees.append(time.perf_counter() - debut)
+                if response.status_code != 201:
+                    self.stderr.write(response.content.decode())
+            transaction.set_rollback(True)
+
+        centiles = statistics.quantiles(durees, n=100)
+        self.stdout.write(self.style.SUCCESS(
+            f"{n} vente(s) de {articles} article(s) : p50 {centiles[49] * 1000:.2f} ms, "
+            f"p99 {centiles[98] * 1000:.2f} ms, max {max(durees) * 1000:.2f} ms"
+        ))
@@ -0,0 +1,29 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from services.export_factures import exporter_factures
+from ventes.forms import VenteFiltreForm
+from ventes.models import Vente
+
+
+class Command(BaseCommand):
+    help = "Exporte les factures des ventes d'une période dans une archive ZIP"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--du', help="Début de période AAAA-MM-JJ (défaut : 1er du mois)")
+        parser.add_argument('--au', help="Fin de période incluse AAAA-MM-JJ (défaut : aujourd'hui)")
+        parser.add_argument('--sortie', help="Fichier ZIP (défaut : factures_<du>_<au>.zip)")
+        parser.add_argument('--workers', type=int, help="Processus de rendu (défaut : nombre de cœurs)")
+
+    def handle(self, *args, **options):
+        filtres = VenteFiltreForm(VenteFiltreForm.periode_par_defaut({'du': options['du'], 'au': options['au']}))
+        if not filtres.is_valid():
+            raise CommandError(f"Période invalide : {filtres.errors.as_text()}")
+        du, au = filtres.cleaned_data['du'], filtres.cleaned_data['au']
+        chemin = options['sortie'] or f"factures_{du:%Y%m%d}_{au:%Y%m%d}.zip"
+
+        debut = time.perf_counter()
+        nb = exporter_factures(filtres.filtrer(Vente.objects.all()), chemin, options['workers'])
+        duree = time.perf_counter() - debut
+        self.stdout.write(self.style.SUCCESS(
+            f"{nb} facture(s) exportée(s) dans {chemin} en {duree:.2f}s ({nb / duree if duree else 0:.0f}/s)"
+        ))
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:56
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0001_initial'),
+        ('produits', '0001_initial'),
+        ('ventes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='vente',
+            options={'ordering': ['-date', '-id'], 'verbose_name': 'Vente', 'verbose_name_plural': 'Ventes'},
+        ),
+        migrations.AddField(
+            model_name='vente',
+            name='produits',
+            field=models.ManyToManyField(related_name='ventes', through='ventes.VenteDetail', to='produits.produit'),
+        ),
+        migrations.AlterField(
+            model_name='vente',
+            name='date',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Date de vente'),
+        ),
+        migrations.AlterField(
+            model_name='ventedetail',
+            name='produit',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='produits.produit'),
+        ),
+        migrations.AddIndex(
+            model_name='vente',
+            index=models.Index(fields=['-date', '-id'], name='vente_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vente',
+            index=models.Index(fields=['client', '-date', '-id'], name='vente_client_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vente',
+            index=models.Index(condition=models.Q(('reste_du__gt', 0)), fields=['-date', '-id'], name='vente_impayee_date_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventes', '0002_vente_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vente',
+            name='facture_empreinte',
+            field=models.CharField(blank=True, editable=False, max_length=64, verbose_name='Empreinte facture'),
+        ),
+    ]
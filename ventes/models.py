@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Q
 from django.urls import reverse
 from django.utils import timezone
 from clients.models import Client
@@ -10,11 +11,18 @@ class Vente(models.Model):
     montant_total = models.DecimalField('Montant total', max_digits=12, decimal_places=2, default=0)
     reste_du      = models.DecimalField('Reste dû',     max_digits=12, decimal_places=2, default=0)
     facture_pdf   = models.FileField('Facture PDF', upload_to='factures/', blank=True, null=True)
+    facture_empreinte = models.CharField('Empreinte facture', max_length=64, blank=True, editable=False)
     produits = models.ManyToManyField(Produit, through='VenteDetail', related_name='ventes')
     class Meta:
         verbose_name = 'Vente'
         verbose_name_plural = 'Ventes'
-        ordering = ['-date']
+        ordering = ['-date', '-id']
+        indexes = [
+            # pagination par curseur (date, id) et filtres de la liste
+            models.Index(fields=['-date', '-id'], name='vente_date_idx'),
+            models.Index(fields=['client', '-date', '-id'], name='vente_client_date_idx'),
+            models.Index(fields=['-date', '-id'], condition=Q(reste_du__gt=0), name='vente_impayee_date_idx'),
+        ]
 
     def __str__(self):
         return f"Vente #{self.pk} - {self.client}"
@@ -1,47 +1,175 @@
 # ventes/services.py
 
 from decimal import Decimal
-from django.db.models import Sum
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest
 from stocks.models import MouvementStock
+from stocks.archives import verifier_non_archive
+from stocks.services import enregistrer_mouvements
+
+
+def recalc_vente_totaux(vente):
+    """
+    Recalcule montant_total et reste_du d'une vente en un seul UPDATE
+    (sous-requêtes d'agrégat sur lignes et paiements), sans toucher au stock.
+    Suffit pour un simple paiement.
+    """
+    from .models import Vente, VenteDetail, PaiementVente
+    zero = Value(Decimal('0.00'), output_field=DecimalField(max_digits=12, decimal_places=2))
+
+    def somme(qs, champ):
+        return Coalesce(Subquery(
+            qs.filter(vente=OuterRef('pk')).order_by().values('vente').annotate(s=Sum(champ)).values('s')
+        ), zero)
+
+    total = somme(VenteDetail.objects, 'montant_ligne')
+    Vente.objects.filter(pk=vente.pk).update(
+        montant_total=total,
+        reste_du=Greatest(total - somme(PaiementVente.objects, 'montant'), zero),
+    )
+    vente.refresh_from_db(fields=['montant_total', 'reste_du'])
+
+
+def enregistrer_lignes_vente(formset):
+    """
+    Enregistre un VenteDetailFormSet en bloc : montant_ligne calculé en
+    mémoire, un bulk_create pour les nouvelles lignes, un bulk_update pour
+    les lignes modifiées, un DELETE pour les lignes supprimées.
+    """
+    from .models import VenteDetail
+    lignes = formset.save(commit=False)
+    nouvelles, modifiees = [], []
+    for ligne in lignes:
+        ligne.vente = formset.instance
+        ligne.montant_ligne = ligne.quantite * ligne.prix_unitaire
+        (modifiees if ligne.pk else nouvelles).append(ligne)
+    VenteDetail.objects.bulk_create(nouvelles)
+    VenteDetail.objects.bulk_update(modifiees, ['produit', 'quantite', 'prix_unitaire', 'montant_ligne'])
+    supprimees = [l.pk for l in formset.deleted_objects if l.pk]
+    if supprimees:
+        VenteDetail.objects.filter(pk__in=supprimees).delete()
+
 
 def recalc_vente_et_stock(vente):
     """
-    1) Rétablit le stock en inversant les anciens mouvements SORTIE
-    2) Supprime ces anciens mouvements
-    3) Recalcule les montant_ligne (via VenteDetail.save())
-    4) Crée de nouveaux mouvements SORTIE
-    5) Recalcule montant_total et reste_du
+    Recalcul incrémental d'une vente :
+    1) Recalcule tous les montant_ligne en un seul UPDATE
+    2) Compare les quantités déjà sorties (mouvements de la vente) aux
+       quantités des lignes, toutes deux agrégées par produit en SQL
+    3) N'émet que les écarts nets : SORTIE si la quantité augmente,
+       ENTREE (retour) si elle diminue ; rien si les lignes sont inchangées
+    4) Recalcule montant_total et reste_du (un UPDATE)
+    """
+    # 1) Montants de ligne
+    vente.lignes.update(montant_ligne=F('quantite') * F('prix_unitaire'))
+
+    # 2 & 3) Mouvements de stock : écarts nets uniquement
+    quantites = dict(
+        vente.lignes.order_by().values('produit').annotate(q=Sum('quantite')).values_list('produit', 'q')
+    )
+    synchroniser_stock_vente(vente, quantites)
+
+    # 4) Totaux
+    recalc_vente_totaux(vente)
+
+
+def synchroniser_stock_vente(vente, voulu: dict):
+    """
+    Aligne les sorties de stock d'une vente sur les quantités `voulu`
+    {produit_id: quantité} en n'émettant que les écarts nets par produit
+    ({} remet en stock toute la vente).
     """
-    vente.refresh_from_db()
     ref = f"Vente #{vente.pk}"
+    # les sorties d'une vente archivée ne sont plus dans le journal
+    verifier_non_archive(vente.date, "Vente archivée : son stock ne peut plus être modifié")
 
-    # 1) Inversion des anciens mouvements
-    old_ms = list(MouvementStock.objects.filter(reference=ref))
-    for ms in old_ms:
-        # si on avait sorti du stock, on le remet
-        if ms.type == MouvementStock.SORTIE:
-            ms.produit.stock += ms.quantite
-        else:
-            ms.produit.stock -= ms.quantite
-        ms.produit.save(update_fields=['stock'])
-
-    # 2) Suppression des anciens mouvements
-    MouvementStock.objects.filter(reference=ref).delete()
-
-    # 3 & 4) Enregistrement des lignes (save() recalcule montant_ligne)
-    #      puis création des nouvelles sorties
-    for ligne in vente.lignes.all():
-        ligne.save()  # mise à jour de montant_ligne
-        MouvementStock.objects.create(
-            produit=ligne.produit,
-            type=MouvementStock.SORTIE,
-            quantite=ligne.quantite,
-            reference=ref
-        )
+    # Quantités nettes déjà sorties vs quantités voulues
+    deja_sorti = dict(
+        MouvementStock.objects.filter(source_type=MouvementStock.VENTE, source_id=vente.pk)
+        .values('produit')
+        .annotate(net=Sum(Case(
+            When(type=MouvementStock.SORTIE, then=F('quantite')),
+            default=-F('quantite')
+        )))
+        .values_list('produit', 'net')
+    )
 
-    # 5) Mise à jour des totaux
-    total = vente.lignes.aggregate(s=Sum('montant_ligne'))['s'] or Decimal('0.00')
-    deja_paye = vente.paiements.aggregate(s=Sum('montant'))['s'] or Decimal('0.00')
-    vente.montant_total = total
-    vente.reste_du      = max(Decimal('0.00'), total - deja_paye)
-    vente.save(update_fields=['montant_total', 'reste_du'])
+    # Écarts nets uniquement
+    mouvements = []
+    for produit_id in set(deja_sorti) | set(voulu):
+        ecart = voulu.get(produit_id, 0) - (deja_sorti.get(produit_id) or 0)
+        if ecart:
+            mouvements.append(MouvementStock(
+                produit_id=produit_id,
+                type=MouvementStock.SORTIE if ecart > 0 else MouvementStock.ENTREE,
+                quantite=abs(ecart),
+                reference=ref,
+                source_type=MouvementStock.VENTE,
+                source_id=vente.pk
+            ))
+    if mouvements:
+        enregistrer_mouvements(mouvements)
+
+
+def encaisser_panier(client_id: int, panier: list, paiement=Decimal('0.00')):
+    """
+    Vente de caisse en un nombre fixe de requêtes :
+    - produits du panier [{code, quantite}] résolus en une requête : le prix
+      est lu en base, jamais dans le cache produits (LRU local à chaque
+      processus, il peut garder un ancien prix modifié par un autre worker)
+    - stock décrémenté de façon atomique (UPDATE conditionnel groupé)
+    - vente, lignes, paiement et mouvements créés en bloc
+    Lève une ValidationError (panier invalide, stock insuffisant).
+    """
+    from clients.models import Client
+    from produits.models import Produit
+    from .models import Vente, VenteDetail, PaiementVente
+
+    quantites = {}
+    for article in panier:
+        try:
+            code, quantite = str(article['code']), int(article['quantite'])
+        except (KeyError, TypeError, ValueError):
+            raise ValidationError("Chaque article doit avoir un code et une quantité entière")
+        if quantite <= 0:
+            raise ValidationError(f"Quantité invalide pour « {code} »")
+        quantites[code] = quantites.get(code, 0) + quantite
+    if not quantites:
+        raise ValidationError("Le panier est vide")
+    paiement = Decimal(paiement)
+    if paiement < 0:
+        raise ValidationError("Le paiement ne peut pas être négatif")
+
+    produits = {p.code: p for p in Produit.objects.filter(code__in=quantites).only('pk', 'code', 'prix_vente')}
+    inconnus = set(quantites) - set(produits)
+    if inconnus:
+        raise ValidationError(f"Produit(s) inconnu(s) : {', '.join(sorted(inconnus))}")
+    if not Client.objects.filter(pk=client_id).exists():
+        raise ValidationError("Client inconnu")
+
+    lignes = [
+        VenteDetail(produit_id=produits[code].pk, quantite=q, prix_unitaire=produits[code].prix_vente,
+                    montant_ligne=q * produits[code].prix_vente)
+        for code, q in quantites.items()
+    ]
+    total = sum((l.montant_ligne for l in lignes), Decimal('0.00'))
+
+    with transaction.atomic():
+        vente = Vente.objects.create(
+            client_id=client_id, montant_total=total, reste_du=max(Decimal('0.00'), total - paiement)
+        )
+        for ligne in lignes:
+            ligne.vente = vente
+        VenteDetail.objects.bulk_create(lignes)
+        if paiement:
+            PaiementVente.objects.create(vente=vente, montant=paiement)
+        enregistrer_mouvements([
+            MouvementStock(
+                produit_id=l.produit_id, type=MouvementStock.SORTIE, quantite=l.quantite,
+                reference=f"Vente #{vente.pk}", source_type=MouvementStock.VENTE, source_id=vente.pk
+            )
+            for l in lignes
+        ])
+    return vente
@@ -1,3 +1,218 @@
-from django.test import TestCase
+from decimal import Decimal
+from io import BytesIO, StringIO
+import json
+import os
+import tempfile
+import zipfile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from clients.models import Client
+from produits.models import Produit
+from stocks.models import MouvementStock
+from .models import Vente, VenteDetail, PaiementVente
+from services.export_factures import exporter_factures, rendre_factures
+from .services import recalc_vente_et_stock, recalc_vente_totaux
 
-# Create your tests here.
+
+class RecalcVenteTests(TestCase):
+    def setUp(self):
+        self.client_vente = Client.objects.create(nom="Client", email="client@test.com")
+        self.p1 = Produit.objects.create(nom="P1", code="P1", prix_vente=Decimal('10.00'), stock=20)
+        self.p2 = Produit.objects.create(nom="P2", code="P2", prix_vente=Decimal('5.00'), stock=20)
+        self.vente = Vente.objects.create(client=self.client_vente)
+        self.l1 = VenteDetail.objects.create(vente=self.vente, produit=self.p1, quantite=3, prix_unitaire=Decimal('10.00'))
+        VenteDetail.objects.create(vente=self.vente, produit=self.p2, quantite=2, prix_unitaire=Decimal('5.00'))
+        recalc_vente_et_stock(self.vente)
+
+    def stock(self, produit):
+        produit.refresh_from_db()
+        return produit.stock
+
+    def test_creation(self):
+        self.assertEqual(self.stock(self.p1), 17)
+        self.assertEqual(self.stock(self.p2), 18)
+        self.assertEqual(self.vente.montant_total, Decimal('40.00'))
+
+    def test_modification_emet_ecart_net(self):
+        nb = MouvementStock.objects.count()
+        self.l1.quantite = 1
+        self.l1.save()
+        recalc_vente_et_stock(self.vente)
+        self.assertEqual(self.stock(self.p1), 19)
+        self.assertEqual(self.stock(self.p2), 18)
+        # un seul mouvement de retour pour P1, rien pour P2
+        self.assertEqual(MouvementStock.objects.count(), nb + 1)
+        retour = MouvementStock.objects.latest('pk')
+        self.assertEqual((retour.type, retour.quantite), (MouvementStock.ENTREE, 2))
+        self.assertEqual(self.vente.montant_total, Decimal('20.00'))
+
+    def test_lignes_inchangees_sans_mouvement(self):
+        nb = MouvementStock.objects.count()
+        recalc_vente_et_stock(self.vente)
+        self.assertEqual(MouvementStock.objects.count(), nb)
+
+    def test_modification_par_formulaire(self):
+        data = {
+            'client': self.client_vente.pk,
+            'lignes-TOTAL_FORMS': 3, 'lignes-INITIAL_FORMS': 2,
+            'lignes-MIN_NUM_FORMS': 0, 'lignes-MAX_NUM_FORMS': 1000,
+        }
+        for i, ligne in enumerate(self.vente.lignes.order_by('pk')):
+            data.update({f'lignes-{i}-id': ligne.pk, f'lignes-{i}-produit': ligne.produit_id,
+                         f'lignes-{i}-quantite': ligne.quantite, f'lignes-{i}-prix_unitaire': ligne.prix_unitaire})
+        data['lignes-0-quantite'] = 5      # P1 : 3 -> 5
+        data['lignes-1-DELETE'] = 'on'     # P2 supprimé
+        data.update({'lignes-2-produit': self.p2.pk, 'lignes-2-quantite': 1, 'lignes-2-prix_unitaire': '4.00'})
+        response = self.client.post(reverse('ventes:modifier', args=[self.vente.pk]), data)
+        self.assertEqual(response.status_code, 302)
+        self.vente.refresh_from_db()
+        self.assertEqual(self.vente.montant_total, Decimal('54.00'))
+        self.assertEqual(self.stock(self.p1), 15)
+        self.assertEqual(self.stock(self.p2), 19)
+
+    def test_suppression_remet_en_stock(self):
+        self.client.post(reverse('ventes:delete', args=[self.vente.pk]))
+        self.assertFalse(Vente.objects.exists())
+        self.assertEqual(self.stock(self.p1), 20)
+        self.assertEqual(self.stock(self.p2), 20)
+
+    def test_paiement_sans_stock(self):
+        PaiementVente.objects.create(vente=self.vente, montant=Decimal('15.00'))
+        # un UPDATE (sous-requêtes d'agrégat) + relecture des totaux
+        with self.assertNumQueries(2):
+            recalc_vente_totaux(self.vente)
+        self.assertEqual(self.vente.reste_du, Decimal('25.00'))
+
+
+class VenteListTests(TestCase):
+    def setUp(self):
+        clients = [Client.objects.create(nom=f"Client {i}", email=f"c{i}@test.com") for i in range(3)]
+        for i in range(30):
+            Vente.objects.create(client=clients[i % 3], montant_total=Decimal('10.00'),
+                                 reste_du=Decimal('5.00') if i % 2 else Decimal('0.00'))
+
+    def test_requetes_constantes(self):
+        url = reverse('ventes:list')
+        # ventes (jointure client), clients du filtre, context processor des alertes
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual(len(response.context['ventes']), 25)
+        suite = self.client.get(url, {'curseur': response.context['page_obj'].next_cursor})
+        self.assertEqual(len(suite.context['ventes']), 5)
+
+    def test_filtre_impayees(self):
+        response = self.client.get(reverse('ventes:list'), {'impayees': 'on'})
+        self.assertEqual(len(response.context['ventes']), 15)
+        self.assertTrue(all(v.reste_du > 0 for v in response.context['ventes']))
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        self.client_vente = Client.objects.create(nom="Caisse", email="caisse@test.com")
+        self.p1 = Produit.objects.create(nom="P1", code="P1", prix_vente=Decimal('10.00'), stock=5)
+        self.p2 = Produit.objects.create(nom="P2", code="P2", prix_vente=Decimal('2.50'), stock=5)
+        self.url = reverse('ventes:checkout')
+
+    def post(self, data):
+        return self.client.post(self.url, json.dumps(data), content_type='application/json')
+
+    def test_vente_complete(self):
+        nb = MouvementStock.objects.count()
+        response = self.post({'client': self.client_vente.pk, 'paiement': '10.00',
+                              'lignes': [{'code': 'P1', 'quantite': 2}, {'code': 'P2', 'quantite': 1},
+                                         {'code': 'P1', 'quantite': 1}]})
+        self.assertEqual(response.status_code, 201)
+        vente = Vente.objects.get(pk=response.json()['vente'])
+        self.assertEqual(vente.montant_total, Decimal('32.50'))
+        self.assertEqual(vente.reste_du, Decimal('22.50'))
+        self.assertEqual(vente.lignes.count(), 2)
+        self.p1.refresh_from_db()
+        self.assertEqual(self.p1.stock, 2)
+        self.assertEqual(MouvementStock.objects.count(), nb + 2)
+
+    def test_requetes_constantes(self):
+        def panier(n):
+            return {'client': self.client_vente.pk, 'paiement': '1.00',
+                    'lignes': [{'code': c, 'quantite': 1} for c in ['P1', 'P2'][:n]]}
+        self.post(panier(2))
+        # le nombre de requêtes ne dépend pas de la taille du panier
+        with CaptureQueriesContext(connection) as un:
+            self.post(panier(1))
+        with CaptureQueriesContext(connection) as deux:
+            self.post(panier(2))
+        self.assertEqual(len(un), len(deux))
+
+    def test_prix_lu_en_base(self):
+        from produits.cache import cache_produits
+        cache_produits.vider()
+        cache_produits.par_code('P1')
+        # prix modifié par un autre processus : ce cache local n'est pas invalidé
+        Produit.objects.filter(pk=self.p1.pk).update(prix_vente=Decimal('12.00'))
+        response = self.post({'client': self.client_vente.pk, 'lignes': [{'code': 'P1', 'quantite': 1}]})
+        self.assertEqual(Vente.objects.get(pk=response.json()['vente']).montant_total, Decimal('12.00'))
+        cache_produits.vider()
+
+    def test_stock_insuffisant(self):
+        response = self.post({'client': self.client_vente.pk, 'lignes': [{'code': 'P1', 'quantite': 6}]})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Vente.objects.exists())
+        self.p1.refresh_from_db()
+        self.assertEqual(self.p1.stock, 5)
+
+    def test_produit_inconnu(self):
+        response = self.post({'client': self.client_vente.pk, 'lignes': [{'code': 'XX', 'quantite': 1}]})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('XX', response.json()['erreur'])
+
+    def test_benchmark(self):
+        out = StringIO()
+        call_command('bench_checkout', requetes=20, produits=10, stdout=out)
+        self.assertIn('p99', out.getvalue())
+        self.assertFalse(Produit.objects.filter(code__startswith='BENCH-').exists())
+
+
+class ExportFacturesTests(TestCase):
+    def setUp(self):
+        client = Client.objects.create(nom="Client", email="client@test.com")
+        produit = Produit.objects.create(nom="P1", code="P1", prix_vente=Decimal('10.00'))
+        for i in range(5):
+            vente = Vente.objects.create(client=client, montant_total=Decimal('10.00'))
+            VenteDetail.objects.create(vente=vente, produit=produit, quantite=1, prix_unitaire=Decimal('10.00'))
+            PaiementVente.objects.create(vente=vente, montant=Decimal('10.00'))
+
+    def test_requetes_par_paquet(self):
+        # ventes + clients, lignes + produits, paiements : indépendant du nombre de ventes
+        with self.assertNumQueries(3):
+            factures = list(rendre_factures(Vente.objects.all(), workers=1))
+        self.assertEqual(len(factures), 5)
+        self.assertTrue(all(contenu.startswith(b'%PDF') for _, contenu in factures))
+
+    def test_zip_streame(self):
+        response = self.client.get(reverse('ventes:export_factures'))
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        archive = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(len(archive.namelist()), 5)
+        self.assertIsNone(archive.testzip())
+
+    def test_export_borne(self):
+        ancienne = Vente.objects.order_by('pk').first()
+        Vente.objects.filter(pk=ancienne.pk).update(date=ancienne.date.replace(year=ancienne.date.year - 1))
+        response = self.client.get(reverse('ventes:export_factures'))
+        # sans filtre : mois en cours seulement
+        archive = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(len(archive.namelist()), 4)
+        with override_settings(EXPORT_FACTURES_MAX=3):
+            response = self.client.get(reverse('ventes:export_factures'))
+        self.assertRedirects(response, reverse('ventes:list'), fetch_redirect_response=False)
+
+    def test_pool_de_processus(self):
+        with tempfile.TemporaryDirectory() as dossier:
+            chemin = os.path.join(dossier, 'factures.zip')
+            self.assertEqual(exporter_factures(Vente.objects.all(), chemin, workers=2), 5)
+            with zipfile.ZipFile(chemin) as archive:
+                noms = archive.namelist()
+        self.assertEqual(noms, [f"facture_vente_{pk}.pdf" for pk in Vente.objects.order_by('date', 'pk')
+                                .values_list('pk', flat=True)])
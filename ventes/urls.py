@@ -3,16 +3,21 @@ from .views import (
     VenteListView, VenteDetailView,
     vente_create, vente_update,
     paiement_create, facture_generate,
-    VenteDeleteView
+    VenteDeleteView, checkout, telecharger_facture, export_factures,
+    apercu_facture
 )
 
 app_name = 'ventes'
 urlpatterns = [
     path('',          VenteListView.as_view(),  name='list'),
     path('new/',      vente_create,             name='nouvelle'),
+    path('export/factures.zip', export_factures, name='export_factures'),
     path('<int:pk>/', VenteDetailView.as_view(), name='detail'),
     path('<int:pk>/edit/',   vente_update,       name='modifier'),
     path('<int:pk>/delete/', VenteDeleteView.as_view(), name='delete'),
     path('<int:pk>/paiement/', paiement_create,    name='paiement'),
     path('<int:pk>/facture/',  facture_generate,    name='facture'),
+    path('<int:pk>/facture.pdf', telecharger_facture, name='facture_pdf'),
+    path('<int:pk>/facture/apercu/', apercu_facture, name='facture_apercu'),
+    path('api/checkout/', checkout,               name='checkout'),
 ]
\ No newline at end of file
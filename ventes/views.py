@@ -1,17 +1,45 @@
-from decimal import Decimal
+import json
+from decimal import Decimal, InvalidOperation
 from django.shortcuts import render, redirect, get_object_or_404
-from django.urls import reverse_lazy
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_POST
+from django.conf import settings
+from django.urls import reverse, reverse_lazy
 from django.views.generic import ListView, DetailView, DeleteView
 from django.db import transaction
+from django.core.exceptions import ValidationError
+from django.contrib import messages
+from services.export_factures import zip_factures
+from services.pdf import rendre_vente_pdf
+from services.pagination import KeysetPaginationMixin
+from documents.models import TachePDF
+from documents.services import demander_pdf, derniere_tache
+from documents.views import apercu_pdf, telechargement_pdf
 
 from .models import Vente
-from .forms import VenteForm, VenteDetailFormSet, PaiementVenteForm
-from .services import recalc_vente_et_stock
+from .forms import VenteForm, VenteDetailFormSet, PaiementVenteForm, VenteFiltreForm
+from .services import (
+    recalc_vente_et_stock, recalc_vente_totaux, synchroniser_stock_vente, enregistrer_lignes_vente,
+    encaisser_panier
+)
 
-class VenteListView(ListView):
+class VenteListView(KeysetPaginationMixin, ListView):
     model = Vente
     template_name = 'ventes/list.html'
     context_object_name = 'ventes'
+    paginate_by = 25
+
+    def get_queryset(self):
+        qs = (Vente.objects
+              .select_related('client')
+              .only('date', 'montant_total', 'reste_du', 'client__nom'))
+        self.filtres = VenteFiltreForm(self.request.GET or None)
+        return self.filtres.filtrer(qs)
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx['filtres'] = self.filtres
+        return ctx
 
 class VenteDetailView(DetailView):
     model = Vente
@@ -20,24 +48,29 @@ class VenteDetailView(DetailView):
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
         ctx['paiement_form'] = PaiementVenteForm()
+        ctx['tache_pdf'] = derniere_tache(TachePDF.VENTE, self.object.pk)
         return ctx
 
 
 def vente_create(request):
     form, formset = VenteForm(request.POST or None), VenteDetailFormSet(request.POST or None)
     if request.method=='POST' and form.is_valid() and formset.is_valid():
-        with transaction.atomic():
-            montant_paye = form.cleaned_data['paiement']
-            vente = form.save(commit=False)
-            vente.montant_total = vente.reste_du = 0
-            vente.save()
-            formset.instance = vente
-            formset.save()
-            # paiement initial
-            from .models import PaiementVente
-            PaiementVente.objects.create(vente=vente, montant=montant_paye)
-            recalc_vente_et_stock(vente)
-        return redirect('ventes:detail', vente.pk)
+        try:
+            with transaction.atomic():
+                montant_paye = form.cleaned_data['paiement']
+                vente = form.save(commit=False)
+                vente.montant_total = vente.reste_du = 0
+                vente.save()
+                formset.instance = vente
+                enregistrer_lignes_vente(formset)
+                # paiement initial
+                from .models import PaiementVente
+                PaiementVente.objects.create(vente=vente, montant=montant_paye)
+                recalc_vente_et_stock(vente)
+        except ValidationError as e:
+            form.add_error(None, e.messages)
+        else:
+            return redirect('ventes:detail', vente.pk)
     return render(request,'ventes/form.html', {'form':form,'formset':formset})
 
 
@@ -47,11 +80,15 @@ def vente_update(request, pk):
     form.fields.pop('paiement')  # on ne gère plus paiement ici
     formset = VenteDetailFormSet(request.POST or None, instance=vente)
     if request.method=='POST' and form.is_valid() and formset.is_valid():
-        with transaction.atomic():
-            form.save()
-            formset.save()
-            recalc_vente_et_stock(vente)
-        return redirect('ventes:detail', vente.pk)
+        try:
+            with transaction.atomic():
+                form.save()
+                enregistrer_lignes_vente(formset)
+                recalc_vente_et_stock(vente)
+        except ValidationError as e:
+            form.add_error(None, e.messages)
+        else:
+            return redirect('ventes:detail', vente.pk)
     return render(request,'ventes/form.html', {'form':form,'formset':formset,'vente':vente,'update':True})
 
 
@@ -61,7 +98,8 @@ def paiement_create(request, pk):
     if request.method=='POST' and form.is_valid():
         pay = form.save(commit=False)
         pay.vente = vente; pay.save()
-        recalc_vente_et_stock(vente)
+        # un paiement ne change pas le stock
+        recalc_vente_totaux(vente)
     return redirect('ventes:detail', pk)
 
 class VenteDeleteView(DeleteView):
@@ -69,8 +107,68 @@ class VenteDeleteView(DeleteView):
     template_name = 'ventes/confirm_delete.html'
     success_url = reverse_lazy('ventes:list')
 
+    def form_valid(self, form):
+        # remet en stock les quantités de la vente avant de la supprimer
+        try:
+            with transaction.atomic():
+                synchroniser_stock_vente(self.object, {})
+                return super().form_valid(form)
+        except ValidationError as e:
+            messages.error(self.request, ' '.join(e.messages))
+            return redirect('ventes:detail', self.object.pk)
+
 
 def facture_generate(request, pk):
     vente = get_object_or_404(Vente, pk=pk)
-    vente.generate_facture()
-    return redirect('ventes:detail', pk)
\ No newline at end of file
+    # rendu hors requête : run_pdf_worker
+    demander_pdf(TachePDF.VENTE, vente.pk)
+    messages.info(request, "La facture est en cours de génération.")
+    return redirect('ventes:detail', pk)
+
+
+telecharger_facture = telechargement_pdf(Vente)
+apercu_facture = apercu_pdf(Vente, rendre_vente_pdf)
+
+
+def export_factures(request):
+    """
+    Factures des ventes filtrées (mêmes filtres que la liste, mois en cours
+    par défaut), en ZIP streamé. Rendu dans le processus de la requête et
+    borné à EXPORT_FACTURES_MAX ventes : au-delà, commande export_factures.
+    """
+    filtres = VenteFiltreForm(VenteFiltreForm.periode_par_defaut(request.GET))
+    if not filtres.is_valid():
+        messages.error(request, "Période d'export invalide.")
+        return redirect('ventes:list')
+    ventes = filtres.filtrer(Vente.objects.all())
+    maximum = getattr(settings, 'EXPORT_FACTURES_MAX', 500)
+    nombre = ventes.count()
+    if nombre > maximum:
+        messages.error(request, f"{nombre} factures sur la période (maximum {maximum}) : "
+                                f"réduisez la période ou utilisez la commande export_factures.")
+        url = reverse('ventes:list')
+        return redirect(f"{url}?{request.GET.urlencode()}" if request.GET else url)
+    response = StreamingHttpResponse(zip_factures(ventes, workers=1), content_type='application/zip')
+    response['Content-Disposition'] = 'attachment; filename="factures.zip"'
+    return response
+
+
+@require_POST
+def checkout(request):
+    """
+    API de caisse (JSON) :
+    {"client": 1, "paiement": "20.00", "lignes": [{"code": "ABC", "quantite": 2}, ...]}
+    """
+    try:
+        data = json.loads(request.body)
+        vente = encaisser_panier(data['client'], data.get('lignes') or [], Decimal(str(data.get('paiement') or '0')))
+    except (ValueError, KeyError, TypeError, InvalidOperation):
+        return JsonResponse({'erreur': "Requête JSON invalide"}, status=400)
+    except ValidationError as e:
+        return JsonResponse({'erreur': ' '.join(e.messages)}, status=400)
+    return JsonResponse({
+        'vente': vente.pk,
+        'montant_total': str(vente.montant_total),
+        'reste_du': str(vente.reste_du),
+        'url': vente.get_absolute_url(),
+    }, status=201)